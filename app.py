@@ -1,28 +1,35 @@
 import streamlit as st
-import arxiv
-import google.generativeai as genai
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from datetime import datetime
+import json
 import os
-import time
 import re
-from database import init_db, get_session, Schedule, EmailHistory
-from scheduler import get_scheduler
-
-# 환경 변수 로드
-load_dotenv()
-
-# Gemini API 설정 (Lite 모델로 변경)
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-
-# 데이터베이스 초기화
-engine = init_db()
-
-# 스케줄러 초기화
-scheduler = get_scheduler()
+from database import (get_session, get_email_content, get_email_stats, get_job_start_offsets, get_prepare_progress,
+                      query_email_history, Schedule, EmailHistory)
+from scheduler import (planned_start, planned_start_histogram, actual_start_histogram, get_prepare_hour,
+                       get_spread_minutes, get_lease_status, is_prepare_enabled)
+from dispatch_queue import current_run_key, get_dispatch_progress, is_sharded_dispatch_enabled
+from digest import engine, is_consolidated_digest_enabled, schedule_dispatch_job_id
+from instant_jobs import FINISHED_STATUSES, get_instant_job, submit_instant_job
+from email_templates import parse_unsubscribe_value, verify_unsubscribe_token
+
+# 환경 변수 로드, Gemini 설정, DB/요약 엔진 초기화는 digest 모듈에서 수행
+# (모듈 임포트는 프로세스당 한 번이므로 Streamlit이 스크립트를 다시 실행해도 반복되지 않음)
+# 자동 발송 작업은 별도 워커 프로세스(worker.py)가 실행
+
+# 발송 이력 화면 페이지당 행 수
+HISTORY_PAGE_SIZE = 50
+
+# 단발성 발송 작업 상태 조회 간격 (초)
+JOB_POLL_INTERVAL = 1
+
+# 발송 이력 단계별 소요 시간 표시 순서/이름
+STAGE_LABELS = {
+    'search': 'arXiv 검색',
+    'summarize': 'Gemini 요약',
+    'format': '포맷팅',
+    'queue_wait': '대기열 대기',
+    'send': 'SMTP 발송'
+}
 
 # 페이지 설정
 st.set_page_config(
@@ -32,8 +39,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 커스텀 CSS
-st.markdown("""
+# 커스텀 CSS (스크립트가 다시 실행될 때마다 새로 만들지 않도록 상수로 보관)
+APP_CSS = """
     <style>
     /* 전체 배경 그라데이션 */
     .stApp {
@@ -124,218 +131,144 @@ st.markdown("""
         margin-bottom: 1rem;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 
-def validate_email(email):
-    """이메일 형식 검증"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+# 읽기 전용 패널 데이터 캐시 (초, 화면에서 쓰기가 일어나면 즉시 무효화)
+DATA_CACHE_TTL = int(os.getenv('APP_CACHE_TTL', '30'))
 
 
-def search_arxiv(keyword, max_results=10):
-    """arXiv에서 최근 7일 이내 논문 검색"""
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def load_schedules():
+    """스케줄 목록 (비활성 포함, 최근 등록순)"""
+    session = get_session(engine)
     try:
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        
-        client = arxiv.Client()
-        search = arxiv.Search(
-            query=f"all:{keyword}",
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.SubmittedDate,
-            sort_order=arxiv.SortOrder.Descending
-        )
-        
-        papers = []
-        for result in client.results(search):
-            if result.published.replace(tzinfo=None) >= seven_days_ago:
-                papers.append({
-                    'title': result.title,
-                    'authors': [author.name for author in result.authors],
-                    'abstract': result.summary,
-                    'pdf_url': result.pdf_url,
-                    'published': result.published
-                })
-                
-                if len(papers) >= 5:
-                    break
-        
-        return papers
-    except Exception as e:
-        st.error(f"논문 검색 중 오류가 발생했습니다: {str(e)}")
-        return []
+        return [
+            {
+                'id': schedule.id,
+                'keyword': schedule.keyword,
+                'email': schedule.email,
+                'is_active': schedule.is_active,
+                'last_sent': schedule.last_sent
+            }
+            for schedule in session.query(Schedule).order_by(Schedule.created_at.desc())
+        ]
+    finally:
+        session.close()
 
 
-def summarize_with_gemini(abstract):
-    """Gemini Lite 모델을 사용하여 초록을 한국어로 요약"""
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def load_email_stats():
+    """발송 통계"""
+    session = get_session(engine)
     try:
-        # gemini-1.5-flash-8b (Lite 모델)로 변경
-        model = genai.GenerativeModel('gemini-1.5-flash-8b')
-        
-        prompt = f"""You are a helpful research assistant.
-Summarize the given academic paper abstract into Korean.
-
-Requirements:
-- Summarize in exactly 3 bullet points
-- Maintain technical terms in English if the Korean translation is awkward
-- Use professional yet easy-to-read tone (해요체)
-- Each bullet point should be concise but informative
-
-Abstract:
-{abstract}
-
-Provide only the 3 bullet points in Korean, starting each with "• ":
-"""
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"• 요약 생성 중 오류가 발생했습니다: {str(e)}"
-
+        return get_email_stats(session)
+    finally:
+        session.close()
 
-def format_email_content(papers, keyword):
-    """이메일 본문 포맷팅"""
-    today = datetime.now().strftime('%Y년 %m월 %d일')
-    
-    email_body = f"""
-스터디레터 - '{keyword}' 관련 최신 논문 ({today})
-{'=' * 70}
 
-안녕하세요!
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def load_history_page(filters, cursor):
+    """발송 이력 한 페이지 (본문 제외)"""
+    session = get_session(engine)
+    try:
+        histories, next_cursor = query_email_history(
+            session, cursor=cursor, page_size=HISTORY_PAGE_SIZE, **filters
+        )
+        return [
+            {
+                'id': history.id,
+                'schedule_id': history.schedule_id,
+                'keyword': history.keyword,
+                'recipient': history.recipient,
+                'paper_count': history.paper_count,
+                'status': history.status,
+                'error_message': history.error_message,
+                'sent_at': history.sent_at,
+                'timings': json.loads(history.timings) if history.timings else None
+            }
+            for history in histories
+        ], next_cursor
+    finally:
+        session.close()
 
-'{keyword}' 키워드로 검색된 최근 7일 이내 논문 {len(papers)}편을 요약해드립니다.
 
-{'=' * 70}
+@st.cache_data(max_entries=100, show_spinner=False)
+def load_email_content(history_id):
+    """발송 이력의 이메일 본문 (저장된 본문은 바뀌지 않으므로 만료 없음)"""
+    session = get_session(engine)
+    try:
+        history = session.get(EmailHistory, history_id)
+        return get_email_content(session, history) if history else None
+    finally:
+        session.close()
 
-"""
-    
-    for idx, paper in enumerate(papers, 1):
-        authors = paper['authors'][:3]
-        author_str = ', '.join(authors)
-        if len(paper['authors']) > 3:
-            author_str += f" 외 {len(paper['authors']) - 3}명"
-        
-        email_body += f"""
-[논문 {idx}]
-제목: {paper['title']}
-저자: {author_str}
-링크: {paper['pdf_url']}
-발표일: {paper['published'].strftime('%Y-%m-%d')}
 
-📝 Gemini 요약:
-{paper['summary']}
+@st.cache_data(ttl=10, show_spinner=False)
+def load_lease_status():
+    """스케줄러 워커 임대 상태"""
+    lease = get_lease_status(engine)
+    if lease is None:
+        return None
+    return {'holder': lease.holder, 'expires_at': lease.expires_at}
 
-{'-' * 70}
 
-"""
-    
-    email_body += f"""
+@st.cache_data(ttl=10, show_spinner=False)
+def load_prepare_progress(run_key):
+    """발송 회차 다이제스트 준비 상황 {상태: 키워드 수}"""
+    session = get_session(engine)
+    try:
+        return get_prepare_progress(session, run_key)
+    finally:
+        session.close()
 
-이 이메일은 스터디레터 서비스를 통해 자동으로 생성되었습니다.
-Powered by arXiv & Google Gemini
 
-"""
-    
-    return email_body
+@st.cache_data(ttl=10, show_spinner=False)
+def load_dispatch_progress(run_key):
+    """분산 발송 회차 진행 상황 {상태: 키워드 수}"""
+    session = get_session(engine)
+    try:
+        return get_dispatch_progress(session, run_key)
+    finally:
+        session.close()
 
 
-def send_email(recipient, subject, body):
-    """SMTP를 통해 이메일 전송"""
-    try:
-        sender_email = os.getenv('SENDER_EMAIL')
-        sender_password = os.getenv('SENDER_PASSWORD')
-        
-        if not sender_email or not sender_password:
-            raise ValueError("이메일 설정이 .env 파일에 없습니다.")
-        
-        message = MIMEMultipart()
-        message['From'] = sender_email
-        message['To'] = recipient
-        message['Subject'] = subject
-        
-        message.attach(MIMEText(body, 'plain', 'utf-8'))
-        
-        # SMTP_SSL을 사용하여 포트 465로 연결 (더 안정적)
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=30) as server:
-            server.login(sender_email, sender_password)
-            server.send_message(message)
-        
-        return True, None
-    except Exception as e:
-        return False, str(e)
-
-
-def save_email_history(session, schedule_id, keyword, recipient, papers, status, error_msg, email_content):
-    """이메일 발송 이력 저장"""
-    history = EmailHistory(
-        schedule_id=schedule_id,
-        keyword=keyword,
-        recipient=recipient,
-        paper_count=len(papers),
-        status=status,
-        error_message=error_msg,
-        email_content=email_content,
-        sent_at=datetime.now()
-    )
-    session.add(history)
-    session.commit()
-
-
-def process_and_send(keyword, email, schedule_id=None):
-    """논문 검색, 요약, 이메일 발송 프로세스"""
+@st.cache_data(ttl=10, show_spinner=False)
+def load_start_offsets():
+    """가장 최근 회차의 작업 실제 시작 시각 (워커가 DB에 저장한 기록)"""
     session = get_session(engine)
-    
     try:
-        # 1. arXiv 검색
-        papers = search_arxiv(keyword)
-        
-        if not papers:
-            save_email_history(session, schedule_id, keyword, email, [], 'failed', 
-                             '최근 7일 이내 논문을 찾지 못했습니다.', None)
-            return False, "논문을 찾지 못했습니다."
-        
-        # 2. Gemini로 요약
-        for paper in papers:
-            paper['summary'] = summarize_with_gemini(paper['abstract'])
-            time.sleep(1)  # API 호출 간격
-        
-        # 3. 이메일 포맷팅
-        subject = f"[스터디레터] '{keyword}' 관련 최신 논문 ({datetime.now().strftime('%y/%m/%d')})"
-        email_body = format_email_content(papers, keyword)
-        
-        # 4. 이메일 전송
-        success, error_msg = send_email(email, subject, email_body)
-        
-        # 5. 이력 저장
-        status = 'success' if success else 'failed'
-        save_email_history(session, schedule_id, keyword, email, papers, status, error_msg, email_body)
-        
-        # 6. 스케줄 업데이트 (자동화인 경우)
-        if schedule_id and success:
-            schedule = session.query(Schedule).filter_by(id=schedule_id).first()
-            if schedule:
-                schedule.last_sent = datetime.now()
-                session.commit()
-        
-        return success, error_msg
-        
+        return get_job_start_offsets(session)
     finally:
         session.close()
 
 
-def scheduled_job(schedule_id, keyword, email):
-    """스케줄러에서 실행될 작업"""
-    print(f"[{datetime.now()}] 자동 발송 시작: {keyword} → {email}")
-    success, error = process_and_send(keyword, email, schedule_id)
-    if success:
-        print(f"[{datetime.now()}] 자동 발송 성공!")
-    else:
-        print(f"[{datetime.now()}] 자동 발송 실패: {error}")
+def invalidate_schedule_cache():
+    """스케줄 추가/삭제 후 캐시 무효화"""
+    load_schedules.clear()
+
+
+def invalidate_history_cache():
+    """발송 이력 저장 후 캐시 무효화"""
+    load_email_stats.clear()
+    load_history_page.clear()
+
+
+def validate_email(email):
+    """이메일 형식 검증"""
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
 
 
 def main():
     """메인 애플리케이션"""
     
+    # 이메일의 구독 해지 링크로 접속한 경우
+    if 'unsubscribe' in st.query_params:
+        show_unsubscribe()
+        return
+    
     # 사이드바 - 메뉴
     with st.sidebar:
         st.markdown("## 📚 스터디레터")
@@ -366,6 +299,41 @@ def main():
         show_email_history()
 
 
+def show_unsubscribe():
+    """구독 해지 화면 (?unsubscribe=<스케줄 ID 목록, 쉼표 구분>&token=<서명>)"""
+    st.title("📭 구독 해지")
+    
+    value = st.query_params.get('unsubscribe', '')
+    schedule_ids = parse_unsubscribe_value(value)
+    if schedule_ids is None or not verify_unsubscribe_token(value, st.query_params.get('token')):
+        st.error("유효하지 않은 구독 해지 링크입니다.")
+        return
+    
+    session = get_session(engine)
+    try:
+        schedules = session.query(Schedule).filter(Schedule.id.in_(schedule_ids)).all()
+        if not schedules:
+            st.error("자동화를 찾을 수 없습니다.")
+            return
+        
+        keywords = ", ".join(f"'{schedule.keyword}'" for schedule in schedules)
+        if not any(schedule.is_active for schedule in schedules):
+            st.info(f"{keywords} 키워드 자동 발송은 이미 해지되었습니다. ({schedules[0].email})")
+            return
+        
+        # 메일 보안 검사기/링크 미리 열기가 링크만 열어도 해지되지 않도록 버튼을 눌러야 해지
+        st.markdown(f"**{schedules[0].email}** 주소로 받는 {keywords} 키워드 자동 발송을 해지할까요?")
+        if st.button("구독 해지", type="primary"):
+            # 통합 다이제스트 링크면 메일에 포함된 자동화를 모두 비활성화
+            for schedule in schedules:
+                schedule.is_active = False
+            session.commit()
+            invalidate_schedule_cache()
+            st.success(f"{keywords} 키워드 자동 발송이 해지되었습니다. ({schedules[0].email})")
+    finally:
+        session.close()
+
+
 def show_instant_send():
     """단발성 발송 화면"""
     st.markdown("""
@@ -412,39 +380,92 @@ def show_instant_send():
             st.error("⚠️ GOOGLE_API_KEY가 설정되지 않았습니다.")
             return
         
-        with st.spinner('📖 논문을 찾고 Gemini가 읽고 있습니다...'):
-            papers = search_arxiv(keyword)
-            
-            if not papers:
-                st.warning(f"'{keyword}' 키워드로 최근 7일 이내 논문을 찾지 못했습니다.")
-                return
-            
-            st.info(f"✅ {len(papers)}편의 논문을 찾았습니다!")
-            
-            progress_bar = st.progress(0)
-            for idx, paper in enumerate(papers):
-                with st.spinner(f'논문 {idx + 1}/{len(papers)} 요약 중...'):
-                    paper['summary'] = summarize_with_gemini(paper['abstract'])
-                    time.sleep(1)
-                    progress_bar.progress((idx + 1) / len(papers))
-            
-            subject = f"[스터디레터] '{keyword}' 관련 최신 논문 ({datetime.now().strftime('%y/%m/%d')})"
-            email_body = format_email_content(papers, keyword)
-            
-            with st.spinner('📨 이메일 전송 중...'):
-                success, error = send_email(email, subject, email_body)
-                
-                # 이력 저장
-                session = get_session(engine)
-                status = 'success' if success else 'failed'
-                save_email_history(session, None, keyword, email, papers, status, error, email_body)
-                session.close()
-                
-                if success:
-                    st.success("✨ 이메일 발송 완료! 받은 편지함을 확인해주세요.")
-                    st.balloons()
-                else:
-                    st.error(f"이메일 전송 실패: {error}")
+        # 워커 프로세스가 실행하도록 작업만 등록하고 바로 반환
+        session = get_session(engine)
+        job_id = submit_instant_job(session, keyword, email)
+        session.close()
+        
+        st.session_state.instant_job_id = job_id
+        st.query_params['job'] = str(job_id)
+    
+    # 다른 메뉴에 다녀오거나 새로고침해도 진행 중인 작업 상태를 계속 표시
+    job_id = st.session_state.get('instant_job_id')
+    if job_id is None and st.query_params.get('job', '').isdigit():
+        job_id = int(st.query_params['job'])
+    
+    if job_id is not None:
+        show_instant_job(job_id)
+
+
+def load_instant_job(job_id):
+    """단발성 발송 작업 상태 조회 (진행 상황 폴링용, 캐시하지 않음)"""
+    session = get_session(engine)
+    try:
+        return get_instant_job(session, job_id)
+    finally:
+        session.close()
+
+
+def forget_instant_job():
+    """세션/주소에 남은 단발성 발송 작업 ID 삭제 (작업이 정리되어 더는 없는 경우)"""
+    st.session_state.pop('instant_job_id', None)
+    if 'job' in st.query_params:
+        del st.query_params['job']
+
+
+def show_instant_job(job_id):
+    """단발성 발송 작업 상태 표시 (진행 중이면 주기적으로 다시 조회)"""
+    job = load_instant_job(job_id)
+    if job is None:
+        forget_instant_job()
+        return
+    
+    active = job['status'] not in FINISHED_STATUSES
+    st.fragment(render_instant_job, run_every=JOB_POLL_INTERVAL if active else None)(job_id, active)
+
+
+def render_instant_job(job_id, was_active):
+    """단발성 발송 작업 진행 상황"""
+    job = load_instant_job(job_id)
+    if job is None:
+        # 폴링 중에 작업이 삭제된 경우: 작업 ID를 지우고 전체 화면을 다시 그려 폴링 종료
+        forget_instant_job()
+        if was_active:
+            st.rerun()
+        return
+    
+    st.markdown(f"### 📬 '{job['keyword']}' → {job['recipient']}")
+    
+    if job['status'] == 'queued':
+        st.info(f"⏳ 발송 대기 중입니다... (작업 ID: {job['id']})")
+        lease = load_lease_status()
+        if not lease or lease['expires_at'] < datetime.now():
+            st.warning("실행 중인 워커가 없습니다. `python worker.py`로 워커를 실행해주세요.")
+    elif job['status'] == 'running' and job['total'] == 0:
+        st.info("📖 논문을 찾고 있습니다...")
+    elif job['status'] == 'running':
+        if job['done'] < job['total']:
+            st.info(f"✅ {job['total']}편의 논문을 찾았습니다! Gemini가 읽고 있습니다...")
+        else:
+            st.info("📨 이메일 전송 중...")
+        st.progress(job['done'] / job['total'])
+    elif job['status'] == 'success':
+        st.success("✨ 이메일 발송 완료! 받은 편지함을 확인해주세요.")
+    elif job['total'] == 0:
+        st.warning(f"'{job['keyword']}' 키워드로 최근 7일 이내 논문을 찾지 못했습니다.")
+    else:
+        st.error(f"이메일 전송 실패: {job['error_message']}")
+    
+    # 요약이 끝난 논문부터 표시
+    for paper in sorted(job['papers'], key=lambda paper: paper['index']):
+        st.markdown(f"**[논문 {paper['index'] + 1}] {paper['title']}**")
+        st.markdown(paper['summary'])
+        st.caption(paper['pdf_url'])
+    
+    # 폴링 중에 작업이 끝나면 전체 화면을 다시 그려 폴링 종료
+    if was_active and job['status'] in FINISHED_STATUSES:
+        invalidate_history_cache()
+        st.rerun()
 
 
 def show_automation_management():
@@ -492,11 +513,12 @@ def show_automation_management():
                     )
                     session.add(schedule)
                     session.commit()
+                    invalidate_schedule_cache()
                     
-                    # 스케줄러에 작업 추가
-                    scheduler.add_weekly_job(scheduled_job, schedule.id, new_keyword, new_email)
+                    # 발송 작업은 워커가 DB에서 주기적으로 동기화
+                    planned = planned_start(schedule_dispatch_job_id(new_keyword, new_email))
                     
-                    st.success(f"✅ 자동화가 추가되었습니다! (매주 월요일 09:00)")
+                    st.success(f"✅ 자동화가 추가되었습니다! (매주 월요일 {planned[:5]})")
                     st.rerun()
                 
                 session.close()
@@ -506,8 +528,7 @@ def show_automation_management():
     # 현재 자동화 목록
     st.markdown("### 📋 활성 자동화 목록")
     
-    session = get_session(engine)
-    schedules = session.query(Schedule).filter_by(is_active=True).order_by(Schedule.created_at.desc()).all()
+    schedules = [schedule for schedule in load_schedules() if schedule['is_active']]
     
     if not schedules:
         st.info("등록된 자동화가 없습니다.")
@@ -517,48 +538,98 @@ def show_automation_management():
                 col1, col2, col3, col4, col5 = st.columns([2, 2, 2, 1, 1])
                 
                 with col1:
-                    st.markdown(f"**🔑 키워드:** {schedule.keyword}")
+                    st.markdown(f"**🔑 키워드:** {schedule['keyword']}")
                 
                 with col2:
-                    st.markdown(f"**📧 이메일:** {schedule.email}")
+                    st.markdown(f"**📧 이메일:** {schedule['email']}")
                 
                 with col3:
-                    if schedule.last_sent:
-                        st.markdown(f"**📅 마지막 발송:** {schedule.last_sent.strftime('%Y-%m-%d %H:%M')}")
+                    if schedule['last_sent']:
+                        st.markdown(f"**📅 마지막 발송:** {schedule['last_sent'].strftime('%Y-%m-%d %H:%M')}")
                     else:
                         st.markdown("**📅 마지막 발송:** 없음")
                 
                 with col4:
-                    st.markdown(f"**⏰ 다음 발송:** 월요일 09:00")
+                    planned = planned_start(schedule_dispatch_job_id(schedule['keyword'], schedule['email']))
+                    st.markdown(f"**⏰ 다음 발송:** 월요일 {planned[:5]}")
                 
                 with col5:
-                    if st.button("🗑️", key=f"delete_{schedule.id}"):
-                        schedule.is_active = False
+                    if st.button("🗑️", key=f"delete_{schedule['id']}"):
+                        session = get_session(engine)
+                        session.query(Schedule).filter_by(id=schedule['id']).update({'is_active': False})
                         session.commit()
-                        scheduler.remove_job(schedule.id)
+                        session.close()
+                        invalidate_schedule_cache()
                         st.success("자동화가 비활성화되었습니다.")
                         st.rerun()
                 
                 st.markdown("---")
     
-    session.close()
-    
-    # 스케줄러 상태
+    # 스케줄러 상태 (워커 프로세스가 DB 임대를 갱신)
     st.markdown("### 🔧 스케줄러 상태")
-    jobs = scheduler.get_jobs()
-    st.info(f"현재 {len(jobs)}개의 작업이 스케줄러에 등록되어 있습니다.")
+    job_ids = {schedule_dispatch_job_id(schedule['keyword'], schedule['email']) for schedule in schedules}
+    unit = "수신자" if is_consolidated_digest_enabled() else "키워드"
+    lease = load_lease_status()
+    if lease and lease['expires_at'] >= datetime.now():
+        st.info(f"스케줄러 워커 실행 중: {lease['holder']} "
+                f"(활성 자동화 {len(schedules)}개 → {unit} {len(job_ids)}개로 묶어 발송)")
+    else:
+        st.warning("실행 중인 스케줄러 워커가 없습니다. `python worker.py`로 워커를 실행해주세요.")
+    st.caption(f"월요일 09:00부터 {get_spread_minutes()}분에 걸쳐 분산 실행")
+    if is_prepare_enabled():
+        progress = load_prepare_progress(current_run_key())
+        summary = ", ".join(f"{status} {count}개" for status, count in sorted(progress.items())) or "아직 없음"
+        st.caption(f"다이제스트 준비: 월요일 {get_prepare_hour():02d}:00 (오늘 회차 준비 결과: {summary})")
+    if is_sharded_dispatch_enabled():
+        progress = load_dispatch_progress(current_run_key())
+        summary = ", ".join(f"{status} {count}개" for status, count in sorted(progress.items())) or "아직 없음"
+        st.caption(f"분산 발송: 모든 워커가 키워드 작업 항목을 나눠 처리 (오늘 회차 진행: {summary})")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**예정 시작 시각 분포**")
+        histogram = planned_start_histogram(list(job_ids))
+        if histogram:
+            st.bar_chart(histogram)
+        else:
+            st.caption("등록된 작업이 없습니다.")
+    with col2:
+        run_key, offsets = load_start_offsets()
+        st.markdown(f"**실제 시작 시각 분포** ({run_key} 회차)" if run_key else "**실제 시작 시각 분포**")
+        histogram = actual_start_histogram(offsets)
+        if histogram:
+            st.bar_chart(histogram)
+        else:
+            st.caption("아직 실행 기록이 없습니다.")
+
+
+def show_timing_breakdown(timings):
+    """발송 이력 한 건의 단계별 소요 시간"""
+    stages = timings.get('stages', {})
+    parts = [
+        f"{label} {stages[stage]:.2f}초"
+        for stage, label in STAGE_LABELS.items() if stage in stages
+    ]
+    st.markdown("**단계별 소요 시간:** " + " · ".join(parts))
+    
+    calls = timings.get('gemini_calls', [])
+    if calls:
+        st.caption(
+            f"Gemini 호출 {len(calls)}회 (평균 {sum(calls) / len(calls):.2f}초, 최대 {max(calls):.2f}초) · "
+            f"토큰 입력 {timings.get('prompt_tokens', 0):,} / 출력 {timings.get('output_tokens', 0):,} "
+            f"(다이제스트 기준)"
+        )
 
 
 def show_email_history():
     """발송 이력 화면"""
     st.markdown("## 📊 발송 이력")
     
-    session = get_session(engine)
-    
     # 통계
-    total_count = session.query(EmailHistory).count()
-    success_count = session.query(EmailHistory).filter_by(status='success').count()
-    failed_count = session.query(EmailHistory).filter_by(status='failed').count()
+    stats = load_email_stats()
+    total_count = stats['total']
+    success_count = stats['success']
+    failed_count = stats['failed']
     
     col1, col2, col3 = st.columns(3)
     
@@ -574,56 +645,98 @@ def show_email_history():
     st.markdown("---")
     
     # 필터
-    col1, col2 = st.columns([1, 3])
+    col1, col2, col3 = st.columns(3)
     
     with col1:
         filter_status = st.selectbox(
             "상태 필터",
             ["전체", "성공", "실패"]
         )
+        filter_keyword = st.text_input("키워드", placeholder="정확히 일치")
+    
+    with col2:
+        schedule_options = {"전체": None, "단발성": 0}
+        for schedule in sorted(load_schedules(), key=lambda schedule: schedule['id']):
+            schedule_options[f"#{schedule['id']} {schedule['keyword']} → {schedule['email']}"] = schedule['id']
+        filter_schedule = st.selectbox("유형", list(schedule_options))
+        filter_recipient = st.text_input("수신자", placeholder="정확히 일치")
+    
+    with col3:
+        date_from = st.date_input("시작일", value=None)
+        date_to = st.date_input("종료일", value=None)
+    
+    filters = {
+        'status': {"성공": 'success', "실패": 'failed'}.get(filter_status),
+        'keyword': filter_keyword.strip() or None,
+        'recipient': filter_recipient.strip() or None,
+        'schedule_id': schedule_options[filter_schedule],
+        'date_from': date_from,
+        'date_to': date_to
+    }
     
-    # 이력 조회
-    query = session.query(EmailHistory).order_by(EmailHistory.sent_at.desc())
+    # 필터가 바뀌면 첫 페이지로
+    if st.session_state.get('history_filters') != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_cursors = [None]
     
-    if filter_status == "성공":
-        query = query.filter_by(status='success')
-    elif filter_status == "실패":
-        query = query.filter_by(status='failed')
+    cursors = st.session_state.history_cursors
     
-    histories = query.limit(50).all()
+    # 이력 조회 (키셋 페이지네이션)
+    histories, next_cursor = load_history_page(filters, cursors[-1])
     
     if not histories:
         st.info("발송 이력이 없습니다.")
     else:
         for history in histories:
             with st.expander(
-                f"{'✅' if history.status == 'success' else '❌'} "
-                f"{history.keyword} → {history.recipient} "
-                f"({history.sent_at.strftime('%Y-%m-%d %H:%M')})"
+                f"{'✅' if history['status'] == 'success' else '❌'} "
+                f"{history['keyword']} → {history['recipient']} "
+                f"({history['sent_at'].strftime('%Y-%m-%d %H:%M')})"
             ):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    st.markdown(f"**키워드:** {history.keyword}")
-                    st.markdown(f"**수신자:** {history.recipient}")
-                    st.markdown(f"**논문 수:** {history.paper_count}편")
+                    st.markdown(f"**키워드:** {history['keyword']}")
+                    st.markdown(f"**수신자:** {history['recipient']}")
+                    st.markdown(f"**논문 수:** {history['paper_count']}편")
                 
                 with col2:
-                    st.markdown(f"**상태:** {history.status}")
-                    st.markdown(f"**발송 시각:** {history.sent_at.strftime('%Y-%m-%d %H:%M:%S')}")
-                    if history.schedule_id:
-                        st.markdown(f"**유형:** 자동화 (ID: {history.schedule_id})")
+                    st.markdown(f"**상태:** {history['status']}")
+                    st.markdown(f"**발송 시각:** {history['sent_at'].strftime('%Y-%m-%d %H:%M:%S')}")
+                    if history['schedule_id']:
+                        st.markdown(f"**유형:** 자동화 (ID: {history['schedule_id']})")
                     else:
                         st.markdown(f"**유형:** 단발성")
                 
-                if history.error_message:
-                    st.error(f"**오류:** {history.error_message}")
+                if history['error_message']:
+                    st.error(f"**오류:** {history['error_message']}")
                 
-                if history.email_content:
-                    st.markdown("**이메일 내용:**")
-                    st.code(history.email_content, language="text")
+                if history['timings']:
+                    show_timing_breakdown(history['timings'])
+                
+                # 본문은 펼쳐 볼 때만 조회/압축 해제
+                if st.toggle("이메일 내용 보기", key=f"content_{history['id']}"):
+                    content = load_email_content(history['id'])
+                    if content:
+                        st.code(content, language="text")
+                    else:
+                        st.caption("저장된 이메일 내용이 없습니다.")
+    
+    # 페이지 이동
+    col1, col2, col3 = st.columns([1, 2, 1])
+    
+    with col1:
+        if st.button("◀ 이전", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    
+    with col2:
+        st.markdown(f"<div style='text-align: center'>{len(cursors)} 페이지</div>", unsafe_allow_html=True)
     
-    session.close()
+    with col3:
+        if st.button("다음 ▶", disabled=next_cursor is None, use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,465 @@
+"""
+arXiv 검색
+- 프로세스 전체가 공유하는 arXiv 클라이언트 (요청 간 최소 간격을 중앙에서 보장)
+- 키워드 검색 결과 TTL 캐시 (정규화 키워드, limit 기준, 더 넓은 구간의 결과로 좁은 구간 조회도 처리)
+- 여러 키워드를 OR로 묶고 submittedDate 구간으로 제한한 질의 + 키워드별 분할 (ARXIV_QUERY_BATCH)
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import arxiv
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# arXiv API 이용 정책: 요청 간 최소 3초
+ARXIV_REQUEST_DELAY = 3.0
+
+
+def normalize_keyword(keyword):
+    """키워드 정규화 (대소문자/공백 차이를 동일 키워드로 취급)"""
+    return ' '.join(keyword.split()).lower()
+
+
+class RequestThrottle:
+    """
+    요청 시각 배정기
+
+    호출마다 직전 요청으로부터 delay초 이후의 시각을 배정하고 그때까지 대기합니다.
+    락은 시각 배정에만 쓰므로 HTTP 요청 중에는 다른 스레드를 막지 않습니다.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """다음 요청 차례까지 대기"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class _ThrottledClient(arxiv.Client):
+    """모든 페이지 요청(재시도 포함)이 공유 RequestThrottle을 거치는 arXiv 클라이언트"""
+
+    def __init__(self, throttle, page_size=100, num_retries=3):
+        # 요청 간격은 throttle이 프로세스 전체 기준으로 보장
+        super().__init__(page_size=page_size, delay_seconds=0, num_retries=num_retries)
+        self.throttle = throttle
+
+    def _parse_feed(self, url, first_page=True, _try_index=0):
+        self.throttle.wait()
+        return super()._parse_feed(url, first_page=first_page, _try_index=_try_index)
+
+
+# 전역 arXiv 클라이언트 (페이지 크기별로 하나, 요청 간격은 모두 공유)
+_throttle = RequestThrottle(ARXIV_REQUEST_DELAY)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_arxiv_client(page_size=100):
+    """공유 arXiv 클라이언트 반환"""
+    with _clients_lock:
+        if page_size not in _clients:
+            _clients[page_size] = _ThrottledClient(_throttle, page_size=page_size)
+        return _clients[page_size]
+
+
+class TTLCache:
+    """스레드 안전 TTL 캐시"""
+
+    def __init__(self, ttl, max_entries=1000):
+        """
+        Args:
+            ttl: 기본 유효 시간 (초)
+            max_entries: 최대 항목 수 (초과 시 만료가 가장 이른 항목부터 삭제)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """캐시 조회 (없거나 만료되면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl=None):
+        """캐시 저장 (ttl을 주면 이 항목만 해당 시간 동안 유효)"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            if len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+
+    def clear(self):
+        """캐시 비우기"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 키워드 검색 결과 캐시 {(정규화 키워드, limit): (검색 구간 시작 시각, 논문 목록)}
+search_cache = TTLCache(ttl=int(os.getenv('ARXIV_CACHE_TTL', '900')))
+
+# 다른 키워드 검색에 묶여 미리 받은 결과의 유효 시간 (키워드별 발송 시각 분산 구간을 덮도록)
+BATCH_CACHE_TTL = int(os.getenv('ARXIV_BATCH_CACHE_TTL', '3600'))
+
+
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def _key_lock(key):
+    """캐시 키별 락"""
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _copy_papers(papers):
+    """호출 측에서 'summary' 등을 추가해도 캐시가 바뀌지 않도록 복사"""
+    return [dict(paper) for paper in papers]
+
+
+def published_at(paper):
+    """논문 제출 시각 (since 등과 비교할 수 있도록 로컬 시각, 시간대 정보 제거)"""
+    published = paper['published']
+    if published.tzinfo is not None:
+        published = published.astimezone().replace(tzinfo=None)
+    return published
+
+
+def _cached_papers(key, since):
+    """
+    캐시에서 since 이후 논문 조회 (없으면 None)
+
+    더 이른 시각부터 검색해 둔 결과가 있으면 since 이후만 걸러서 사용합니다.
+    결과는 최신순 상위 limit개이므로 since 이후 논문도 모두 포함되어 있습니다.
+    """
+    cached = search_cache.get(key)
+    if cached is None or cached[0] > since:
+        return None
+    return _copy_papers([paper for paper in cached[1] if published_at(paper) >= since])
+
+
+def search_recent(keyword, max_results=10, days=7, limit=5, since=None, batch_with=None):
+    """
+    arXiv에서 최근 days일 이내 논문 검색 (TTL 캐시 적용)
+
+    batch_with로 곧 검색할 다른 키워드를 주면 캐시에 없는 키워드를 최대
+    ARXIV_QUERY_BATCH개까지 OR로 묶어 한 번에 질의하고, 결과를 키워드별로 나눠 캐시에 저장합니다.
+
+    Args:
+        keyword: 검색 키워드
+        max_results: arXiv에서 받을 최대 결과 수 (키워드 하나만 질의할 때)
+        days: 검색 구간 (일)
+        limit: 반환할 최대 논문 수
+        since: 검색 구간 시작 시각 (주면 days 대신 사용)
+        batch_with: 함께 묶어 질의할 수 있는 키워드 목록
+
+    Returns:
+        논문 목록 (오류 시 예외 발생)
+    """
+    window_start = datetime.now() - timedelta(days=days)
+    since = since or window_start
+    normalized = normalize_keyword(keyword)
+    key = (normalized, limit)
+
+    cached = _cached_papers(key, since)
+    if cached is not None:
+        return cached
+
+    # 같은 키를 동시에 검색하면 한 스레드만 arXiv에 요청하고 나머지는 결과를 기다림
+    with _key_lock(key):
+        cached = _cached_papers(key, since)
+        if cached is not None:
+            return cached
+
+        partners = _claim_partners(normalized, batch_with or [], limit, window_start)
+        if not partners:
+            papers = _fetch_recent(keyword, max_results, since, limit)
+            search_cache.put(key, (since, papers))
+            return _copy_papers(papers)
+
+        try:
+            results = _fetch_batch([normalized] + [partner for partner, _ in partners],
+                                   min(since, window_start), limit)
+        except Exception as e:
+            logger.warning(f"arXiv 묶음 검색 실패, 키워드별로 검색합니다: {e}")
+            papers = _fetch_recent(keyword, max_results, since, limit)
+            search_cache.put(key, (since, papers))
+            return _copy_papers(papers)
+        finally:
+            for _, lock in partners:
+                lock.release()
+
+        for batch_keyword, (covered_since, papers) in results.items():
+            if covered_since is None:
+                # 분할 결과를 믿을 수 없는 키워드는 캐시하지 않음 (자기 차례에 단독 검색)
+                continue
+            search_cache.put((batch_keyword, limit), (covered_since, papers),
+                             ttl=None if batch_keyword == normalized else BATCH_CACHE_TTL)
+
+        covered_since, papers = results[normalized]
+        if covered_since is None or covered_since > since:
+            # 결과 상한에 걸려 요청 구간을 다 덮지 못했거나 분할 결과를 믿을 수 없는 경우
+            papers = _fetch_recent(keyword, max_results, since, limit)
+            search_cache.put(key, (since, papers))
+        return _copy_papers([paper for paper in papers if published_at(paper) >= since])
+
+
+def _claim_partners(normalized, candidates, limit, since):
+    """
+    함께 질의할 키워드 선택 (캐시에 없고 다른 스레드가 검색 중이 아닌 키워드)
+
+    키별 락을 기다리지 않고 잡을 수 있는 키워드만 고르므로 교착 상태가 생기지 않습니다.
+    반환된 락은 호출 측에서 해제합니다.
+
+    Returns:
+        [(정규화 키워드, 락), ...]
+    """
+    planner = get_query_planner()
+    partners = []
+    for candidate in dict.fromkeys(normalize_keyword(keyword) for keyword in candidates):
+        if len(partners) + 1 >= planner.batch_size:
+            break
+        if candidate == normalized or not build_match_terms(candidate):
+            continue
+        if _cached_papers((candidate, limit), since) is not None:
+            continue
+        lock = _key_lock((candidate, limit))
+        if not lock.acquire(blocking=False):
+            continue
+        if not planner.fits([normalized] + [partner for partner, _ in partners] + [candidate]):
+            lock.release()
+            break
+        partners.append((candidate, lock))
+    return partners
+
+
+def build_match_terms(keyword):
+    """키워드를 단어 목록으로 변환 (arXiv 질의/로컬 매칭 공통, 특수문자 제거)"""
+    return [token for token in re.findall(r'[\w.+-]+', keyword.lower()) if any(ch.isalnum() for ch in token)]
+
+
+def build_keyword_clause(keyword):
+    """키워드 하나의 arXiv 질의 절 (단어별 AND)"""
+    terms = build_match_terms(keyword)
+    clause = ' AND '.join(f"all:{term}" for term in terms)
+    return f"({clause})" if len(terms) > 1 else clause
+
+
+def build_batch_query(keywords, since, until):
+    """
+    여러 키워드를 OR로 묶고 제출 시각 구간(submittedDate, UTC)으로 제한한 arXiv 질의
+
+    키워드 하나만 검색할 때도 같은 질의를 써서 묶음 여부와 관계없이 매칭 규칙과 검색 구간이 같습니다.
+    """
+    keyword_query = ' OR '.join(build_keyword_clause(keyword) for keyword in keywords)
+    date_range = (f"[{since.astimezone(timezone.utc).strftime('%Y%m%d%H%M')} TO "
+                  f"{until.astimezone(timezone.utc).strftime('%Y%m%d%H%M')}]")
+    return f"({keyword_query}) AND submittedDate:{date_range}"
+
+
+# 로컬 매칭용 영어 접미사 (arXiv 검색의 어간 처리와 같은 단어들이 일치하도록 넓게 제거)
+_STEM_SUFFIXES = sorted((
+    'ational', 'tional', 'ization', 'isation', 'ation', 'ator', 'alism', 'iveness', 'fulness', 'ousness',
+    'ality', 'ivity', 'bility', 'icate', 'ative', 'alize', 'icity', 'ical', 'ful', 'ness', 'ance', 'ence',
+    'able', 'ible', 'ement', 'ment', 'ent', 'ant', 'ism', 'ate', 'ity', 'ous', 'ive', 'ize', 'ise',
+    'ings', 'ing', 'ions', 'ion', 'ies', 'ied', 'ers', 'er', 'ed', 'es', 'ly', 'al', 'ic', 'at', 's', 'y', 'e'
+), key=len, reverse=True)
+
+
+def stem_prefix(word):
+    """
+    로컬 매칭용 어간 (이 어간으로 시작하는 단어를 일치로 취급)
+
+    arXiv의 all: 검색은 어간 처리 후 비교하므로(learning ↔ learned 등) 흔한 영어 접미사를
+    반복해서 잘라 arXiv보다 넓게 일치시킵니다. 영문자가 아닌 단어는 그대로 사용합니다.
+    """
+    if not (word.isascii() and word.isalpha()):
+        return word
+    for _ in range(3):
+        for suffix in _STEM_SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    return word
+
+
+@lru_cache(maxsize=1024)
+def _keyword_patterns(keyword):
+    """키워드의 단어별 매칭 패턴 (특수문자로 나뉜 조각마다 어간 앞부분 일치)"""
+    return tuple(
+        re.compile(r'(?<!\w)' + re.escape(stem_prefix(piece)))
+        for term in build_match_terms(keyword)
+        for piece in re.findall(r'\w+', term)
+    )
+
+
+def match_text(result):
+    """
+    arxiv.Result에서 키워드 매칭에 쓰는 텍스트 (소문자)
+
+    arXiv의 all: 검색 대상과 같게 제목/초록/저자/코멘트/저널 정보/분류를 모두 포함합니다.
+    """
+    return ' '.join([
+        result.title or '', result.summary or '', ' '.join(author.name for author in result.authors),
+        result.comment or '', result.journal_ref or '', ' '.join(result.categories or [])
+    ]).lower()
+
+
+def matches_keyword(text, keyword):
+    """텍스트(match_text)가 키워드의 모든 단어를 포함하는지 (대소문자 무시, 어간 앞부분 일치)"""
+    return all(pattern.search(text) for pattern in _keyword_patterns(keyword))
+
+
+class QueryPlanner:
+    """여러 키워드를 묶는 arXiv 질의 계획 (묶음 크기와 질의 길이 제한)"""
+
+    def __init__(self, batch_size=10, max_query_length=1000, page_size=100, max_results=500):
+        """
+        Args:
+            batch_size: 한 질의에 묶을 최대 키워드 수
+            max_query_length: 질의 문자열 최대 길이
+            page_size: 페이지당 결과 수
+            max_results: 한 질의에서 받을 최대 결과 수 (키워드별 limit을 다 채우면 더 일찍 중단)
+        """
+        self.batch_size = batch_size
+        self.max_query_length = max_query_length
+        self.page_size = page_size
+        self.max_results = max_results
+
+    def fits(self, keywords):
+        """키워드 묶음이 한 질의에 들어가는지"""
+        now = datetime.now()
+        return len(keywords) <= self.batch_size and \
+            len(build_batch_query(keywords, now, now)) <= self.max_query_length
+
+
+_planner_instance = None
+
+
+def get_query_planner():
+    """환경 변수 설정의 질의 계획기"""
+    global _planner_instance
+    if _planner_instance is None:
+        _planner_instance = QueryPlanner(
+            batch_size=int(os.getenv('ARXIV_QUERY_BATCH', '10')),
+            max_results=int(os.getenv('ARXIV_BATCH_MAX_RESULTS', '500'))
+        )
+    return _planner_instance
+
+
+def _to_paper(result):
+    """arxiv.Result를 논문 dict로 변환"""
+    return {
+        'title': result.title,
+        'authors': [author.name for author in result.authors],
+        'abstract': result.summary,
+        'pdf_url': result.pdf_url,
+        'published': result.published,
+        'entry_id': result.entry_id
+    }
+
+
+def _fetch_recent(keyword, max_results, since, limit):
+    """arXiv에 실제로 질의하여 since 이후 논문을 최대 limit개 수집 (묶음 검색과 같은 단어/구간 질의)"""
+    if not build_match_terms(keyword):
+        return []
+    search = arxiv.Search(
+        query=build_batch_query([keyword], since, datetime.now()),
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending
+    )
+
+    papers = []
+    for result in get_arxiv_client(page_size=max_results).results(search):
+        paper = _to_paper(result)
+        if published_at(paper) >= since:
+            papers.append(paper)
+
+            if len(papers) >= limit:
+                break
+
+    return papers
+
+
+def _fetch_batch(keywords, since, limit):
+    """
+    여러 키워드를 한 번에 질의하여 키워드별로 나눔
+
+    결과는 최신순이므로 모든 키워드가 limit개를 채우거나 구간 시작 시각보다
+    오래된 결과가 나오면 다음 페이지를 요청하지 않습니다.
+
+    arXiv가 돌려준 결과 중 어느 키워드에도 로컬 매칭되지 않은 논문이 있으면 로컬 매칭이
+    서버와 어긋난 것이므로, limit개를 채우지 못한 키워드는 결과를 보장하지 않습니다 (None).
+
+    Returns:
+        {정규화 키워드: (결과가 보장되는 구간 시작 시각 또는 None, 최신순 논문 최대 limit개)}
+    """
+    planner = get_query_planner()
+    search = arxiv.Search(
+        query=build_batch_query(keywords, since, datetime.now()),
+        max_results=planner.max_results,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending
+    )
+
+    papers = {keyword: [] for keyword in keywords}
+    last_published = None
+    received = 0
+    unmatched = 0
+    stopped = False
+    for result in get_arxiv_client(page_size=planner.page_size).results(search):
+        received += 1
+        paper = _to_paper(result)
+        last_published = published_at(paper)
+        if last_published < since:
+            stopped = True
+            break
+        text = match_text(result)
+        matched = [keyword for keyword in keywords if matches_keyword(text, keyword)]
+        if not matched:
+            unmatched += 1
+        for keyword in matched:
+            if len(papers[keyword]) < limit:
+                papers[keyword].append(paper)
+        if all(len(found) >= limit for found in papers.values()):
+            stopped = True
+            break
+
+    # 결과 상한에 걸려 구간 끝까지 받지 못했으면 마지막 결과 시각까지만 보장
+    exhausted = stopped or received < planner.max_results
+
+    logger.info(f"arXiv 묶음 검색: 키워드 {len(keywords)}개, 마지막 결과 {last_published}, "
+                f"매칭되지 않은 결과 {unmatched}개")
+
+    def covered_since(found):
+        if len(found) >= limit:
+            return since
+        if unmatched:
+            return None
+        return since if exhausted else last_published
+
+    return {keyword: (covered_since(found), found) for keyword, found in papers.items()}
@@ -0,0 +1,607 @@
+"""
+오프라인 발송 벤치마크
+- arXiv / Gemini / SMTP를 로컬 대역(지연 시간, 오류 비율 설정 가능)으로 바꿔 실제 외부 호출 없이 측정
+- 임시 DB에 스케줄 N개를 만들고 월요일 일괄 발송(키워드별 발송 → 발송 대기열 → 발송 워커)을 그대로 실행
+- 초당 발송 수, 단계별 p50/p95/p99 지연 시간, 최대 메모리 사용량 보고
+- --processes N: 워커 프로세스 N개가 같은 SQLite(WAL) 파일의 분산 발송 작업 항목을 나눠 처리
+- --consolidated: 수신자별 통합 다이제스트(DIGEST_MODE=consolidated)로 발송
+- --prepare: 발송 전에 준비 단계(검색 + 요약)를 먼저 실행하고, 발송 구간 측정은 그 뒤부터
+
+실행: python benchmark.py --schedules 500 --keywords 50
+      python benchmark.py --schedules 500 --keywords 50 --processes 4
+      python benchmark.py --schedules 500 --keywords 50 --keywords-per-recipient 5 --consolidated
+      python benchmark.py --schedules 500 --keywords 50 --prepare
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import resource
+import socketserver
+import tempfile
+import threading
+import time
+import tracemalloc
+
+
+class Latency:
+    """지연 시간 + 오류 주입 설정"""
+
+    def __init__(self, mean_ms, jitter=0.5, error_rate=0.0):
+        """
+        Args:
+            mean_ms: 평균 지연 시간 (밀리초)
+            jitter: 지연 시간 변동폭 (평균 대비 비율, 0.5면 ±50%)
+            error_rate: 오류 비율 (0~1)
+        """
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def sleep(self):
+        """설정된 지연 시간만큼 대기"""
+        if self.mean_ms > 0:
+            factor = random.uniform(1 - self.jitter, 1 + self.jitter)
+            time.sleep(max(0.0, self.mean_ms * factor) / 1000)
+
+    def should_fail(self):
+        """이번 호출에 오류를 낼지 여부"""
+        return random.random() < self.error_rate
+
+
+class StageTimer:
+    """단계별 소요 시간 기록기 (스레드 안전)"""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """소요 시간 기록"""
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        """함수 호출 시간을 stage로 기록하는 래퍼"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def clear(self):
+        """측정값 비우기 (준비 단계와 발송 구간을 따로 집계할 때 사용)"""
+        with self._lock:
+            self._samples = {}
+
+    def samples(self):
+        """단계별 원본 측정값 (다른 프로세스 결과와 합칠 때 사용)"""
+        with self._lock:
+            return {stage: list(values) for stage, values in self._samples.items()}
+
+    def merge(self, samples):
+        """다른 프로세스의 측정값 합치기"""
+        with self._lock:
+            for stage, values in samples.items():
+                self._samples.setdefault(stage, []).extend(values)
+
+    def summary(self):
+        """단계별 {count, p50, p95, p99, max} (밀리초)"""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+
+        return {
+            stage: {
+                'count': len(values),
+                'p50': percentile(values, 50) * 1000,
+                'p95': percentile(values, 95) * 1000,
+                'p99': percentile(values, 99) * 1000,
+                'max': values[-1] * 1000
+            }
+            for stage, values in samples.items()
+        }
+
+
+def percentile(sorted_values, pct):
+    """정렬된 값 목록의 백분위수 (nearest-rank)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class FakeArxiv:
+    """arXiv 검색 대역 (arxiv_search._fetch_recent / _fetch_batch 대체, 요청마다 arxiv_request로 기록)"""
+
+    def __init__(self, latency, papers_per_keyword=5, timer=None):
+        self.latency = latency
+        self.papers_per_keyword = papers_per_keyword
+        self.timer = timer
+
+    def _request(self):
+        """요청 한 번의 지연/오류"""
+        start = time.perf_counter()
+        try:
+            self.latency.sleep()
+            if self.latency.should_fail():
+                raise ConnectionError("fake arXiv: 503 Service Unavailable")
+        finally:
+            if self.timer is not None:
+                self.timer.record('arxiv_request', time.perf_counter() - start)
+
+    def fetch_recent(self, keyword, max_results, since, limit):
+        self._request()
+        return self._papers(keyword, limit)
+
+    def fetch_batch(self, keywords, since, limit):
+        self._request()
+        return {keyword: (since, self._papers(keyword, limit)) for keyword in keywords}
+
+    def _papers(self, keyword, limit):
+        slug = re.sub(r'\W+', '-', keyword.lower())
+        now = datetime.now()
+        return [
+            {
+                'title': f"{keyword}: benchmark paper {i}",
+                'authors': [f"Author {i}-{j}" for j in range(4)],
+                'abstract': f"We study {keyword}. " + "This is a synthetic abstract sentence. " * 30,
+                'pdf_url': f"http://arxiv.org/pdf/bench-{slug}-{i}",
+                'published': now - timedelta(hours=i),
+                'entry_id': f"http://arxiv.org/abs/bench-{slug}-{i}"
+            }
+            for i in range(min(limit, self.papers_per_keyword))
+        ]
+
+
+class FakeGenerativeModel:
+    """google.generativeai.GenerativeModel 대역"""
+
+    latency = Latency(0)
+    timer = None
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None):
+        start = time.perf_counter()
+        try:
+            self.latency.sleep()
+            if self.latency.should_fail():
+                raise RuntimeError("fake Gemini: 429 Resource has been exhausted")
+
+            bullets = "• 첫 번째 요약이에요.\n• 두 번째 요약이에요.\n• 세 번째 요약이에요."
+            if generation_config and generation_config.get('response_mime_type') == 'application/json':
+                count = len(re.findall(r'^\[\d+\]$', prompt, flags=re.MULTILINE))
+                text = json.dumps({str(i): bullets for i in range(1, count + 1)}, ensure_ascii=False)
+            else:
+                text = bullets
+            return _FakeResponse(text, prompt)
+        finally:
+            if self.timer is not None:
+                self.timer.record('gemini_call', time.perf_counter() - start)
+
+
+class _FakeResponse:
+    """Gemini 응답 대역"""
+
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = _FakeUsage(len(prompt) // 4, len(text) // 2)
+
+
+class _FakeUsage:
+    """Gemini 응답 usage_metadata 대역"""
+
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """최소한의 SMTP 서버 구현 (EHLO/MAIL/RCPT/DATA/RSET/NOOP/QUIT)"""
+
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        self._reply("220 fake-smtp ESMTP ready")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command = line.decode('utf-8', 'replace').strip().upper()
+
+            if command.startswith('EHLO'):
+                self.wfile.write(b"250-fake-smtp\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+            elif command.startswith('HELO'):
+                self._reply("250 fake-smtp")
+            elif command.startswith('MAIL FROM'):
+                self._reply("250 OK")
+            elif command.startswith('RCPT TO'):
+                if server.latency.should_fail():
+                    self._reply("451 4.3.0 Temporary failure (injected)")
+                else:
+                    self._reply("250 OK")
+            elif command == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                server.latency.sleep()
+                with server.lock:
+                    server.received += 1
+                self._reply("250 OK queued")
+            elif command in ('RSET', 'NOOP'):
+                self._reply("250 OK")
+            elif command == 'QUIT':
+                self._reply("221 Bye")
+                break
+            else:
+                self._reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """로컬 SMTP 서버 (수신 메시지 수만 셈)"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency, host='127.0.0.1', port=0):
+        super().__init__((host, port), _FakeSMTPHandler)
+        self.latency = latency
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        """백그라운드 스레드에서 서버 실행"""
+        threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True).start()
+
+    def stop(self):
+        """서버 종료"""
+        self.shutdown()
+        self.server_close()
+
+
+def configure_environment(args, db_path, smtp_port):
+    """digest 모듈을 임포트하기 전에 벤치마크용 환경 변수 설정"""
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{db_path}",
+        'PAPER_SOURCE': 'live',
+        'GOOGLE_API_KEY': 'benchmark',
+        'GEMINI_RPM': str(args.gemini_rpm),
+        'GEMINI_TPM': str(args.gemini_tpm),
+        'GEMINI_MAX_WORKERS': str(args.gemini_workers),
+        'SENDER_EMAIL': 'bench@studyletter.local',
+        'SENDER_PASSWORD': 'benchmark',
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(smtp_port),
+        'SMTP_USE_SSL': 'false',
+        'SMTP_AUTH': 'false',
+        'SMTP_POOL_SIZE': str(args.delivery_workers),
+        'DIGEST_MODE': 'consolidated' if args.consolidated else 'per_keyword',
+        'DIGEST_PREPARE': 'true' if args.prepare else 'false',
+        'DISPATCH_SEARCH_RETRY_DELAY': '0',  # 검색 오류 재시도는 대기 없이
+    })
+
+
+def seed_schedules(session, schedule_model, schedules, keywords, keywords_per_recipient=1):
+    """스케줄 N개 생성 (키워드 K개에 고르게 분배, 수신자 한 명당 구독 키워드 keywords_per_recipient개)"""
+    keyword_list = [f"topic {i}" for i in range(keywords)]
+    session.add_all([
+        schedule_model(
+            keyword=keyword_list[i % keywords],
+            email=f"reader{i // keywords_per_recipient}@bench.local",
+            is_active=True,
+            created_at=datetime.now()
+        )
+        for i in range(schedules)
+    ])
+    session.commit()
+
+
+def wait_for_outbox(session, outbox_model, timeout):
+    """발송 대기열이 비거나 timeout이 지날 때까지 대기"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        remaining = session.query(outbox_model).filter(outbox_model.status.in_(('pending', 'sending'))).count()
+        if remaining == 0:
+            return True
+        session.expire_all()
+        time.sleep(0.2)
+    return False
+
+
+def install_fakes(args, timer):
+    """arXiv/Gemini 대역 설치 및 단계별 시간 측정 래퍼 적용 (환경 변수 설정 후 호출)"""
+    import arxiv_search
+    import digest
+    import summarizer as summarizer_module
+
+    fake_arxiv = FakeArxiv(Latency(args.arxiv_latency, args.jitter, args.arxiv_error_rate), args.papers, timer)
+    arxiv_search._fetch_recent = fake_arxiv.fetch_recent
+    arxiv_search._fetch_batch = fake_arxiv.fetch_batch
+    FakeGenerativeModel.latency = Latency(args.gemini_latency, args.jitter, args.gemini_error_rate)
+    FakeGenerativeModel.timer = timer
+    summarizer_module.genai.GenerativeModel = FakeGenerativeModel
+
+    digest.search_arxiv = timer.wrap('search', digest.search_arxiv)
+    digest.summarizer.summarize_papers = timer.wrap('summarize', digest.summarizer.summarize_papers)
+    digest.build_digest = timer.wrap('digest', digest.build_digest)
+    digest.enqueue_email = timer.wrap('enqueue', digest.enqueue_email)
+    digest.enqueue_emails = timer.wrap('enqueue', digest.enqueue_emails)
+    return digest
+
+
+def start_delivery_pool(args, digest, timer):
+    """벤치마크용 발송 워커 풀 시작 (재시도 대기 없음)"""
+    from database import HistoryWriter
+    from outbox import DeliveryWorkerPool
+
+    delivery_pool = DeliveryWorkerPool(
+        digest.engine,
+        timer.wrap('send', digest.send_email),
+        workers=args.delivery_workers,
+        max_attempts=args.max_attempts,
+        base_backoff=0,
+        poll_interval=0.05,
+        history_writer=HistoryWriter(digest.engine)
+    )
+    delivery_pool.start()
+    return delivery_pool
+
+
+def peak_rss_mb():
+    """현재 프로세스의 최대 RSS (Linux: KB 단위)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(args):
+    """벤치마크 1회 실행 후 결과 dict 반환"""
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='studyletter-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+
+    smtp_server = FakeSMTPServer(Latency(args.smtp_latency, args.jitter, args.smtp_error_rate))
+    smtp_server.start()
+    configure_environment(args, db_path, smtp_server.server_address[1])
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    # 환경 변수 설정 후 임포트 (모듈 초기화 시 DB/제한기/메일 풀 설정을 읽음)
+    import arxiv_search
+    from database import EmailHistory, Outbox, Schedule, get_session
+
+    timer = StageTimer()
+    digest = install_fakes(args, timer)
+
+    session = get_session(digest.engine)
+    seed_schedules(session, Schedule, args.schedules, args.keywords, args.keywords_per_recipient)
+    keywords = sorted({arxiv_search.normalize_keyword(s.keyword) for s in session.query(Schedule.keyword).distinct()})
+    recipients = sorted({email.lower() for (email,) in session.query(Schedule.email).distinct()})
+
+    prepare_seconds, prepare_stages = None, None
+    if args.prepare:
+        # 새벽 준비 단계: 발송 구간과 따로 측정
+        prepare_start = time.perf_counter()
+        digest.prepare_weekly_digests()
+        prepare_seconds = time.perf_counter() - prepare_start
+        prepare_stages = timer.summary()
+        timer.clear()
+
+    if args.processes:
+        start, dispatch_seconds, peak_rss = run_sharded_dispatch(args, db_path, smtp_server, session, keywords, timer)
+        drained = wait_for_outbox(session, Outbox, args.timeout)
+    else:
+        # 월요일 일괄 발송: 키워드별(통합 모드면 수신자별) 작업을 스케줄러 스레드 수만큼 동시에 실행
+        start = time.perf_counter()
+        delivery_pool = start_delivery_pool(args, digest, timer)
+        with ThreadPoolExecutor(args.dispatch_workers) as executor:
+            if args.consolidated:
+                list(executor.map(digest.dispatch_recipient, recipients))
+            else:
+                list(executor.map(digest.dispatch_keyword, keywords))
+        dispatch_seconds = time.perf_counter() - start
+
+        drained = wait_for_outbox(session, Outbox, args.timeout)
+        delivery_pool.stop()
+        peak_rss = peak_rss_mb()
+    total_seconds = time.perf_counter() - start
+
+    # 대기열 등록부터 발송 완료까지 (메일 한 통 기준)
+    for created_at, sent_at in session.query(Outbox.created_at, Outbox.sent_at).filter(Outbox.status == 'sent'):
+        timer.record('queue_to_sent', (sent_at - created_at).total_seconds())
+
+    sent = session.query(EmailHistory).filter_by(status='success').count()
+    failed = session.query(EmailHistory).filter_by(status='failed').count()
+    session.close()
+    smtp_server.stop()
+
+    result = {
+        'config': vars(args),
+        'drained': drained,
+        'emails_sent': sent,
+        'emails_failed': failed,
+        'smtp_received': smtp_server.received,
+        'dispatch_seconds': dispatch_seconds,
+        'total_seconds': total_seconds,
+        'digests_per_second': sent / total_seconds if total_seconds else 0.0,
+        'keywords_per_second': len(keywords) / dispatch_seconds if dispatch_seconds else 0.0,
+        'stages': timer.summary(),
+        'prepare_seconds': prepare_seconds,
+        'prepare_stages': prepare_stages,
+        'peak_rss_mb': peak_rss,
+    }
+    if args.trace_memory:
+        result['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return result
+
+
+def run_sharded_dispatch(args, db_path, smtp_server, session, keywords, timer):
+    """
+    분산 발송 모드: 워커 프로세스 N개가 같은 DB의 작업 항목을 임대로 나눠 처리
+
+    프로세스 시작(모듈 임포트) 시간은 빼고, 모든 프로세스가 준비된 뒤 작업 항목을
+    등록한 시점부터 측정합니다.
+
+    Returns:
+        (측정 시작 시각, 키워드 처리 시간, 프로세스별 최대 RSS 중 최댓값)
+    """
+    from sqlalchemy import func
+    from database import DispatchItem
+    from dispatch_queue import current_run_key, enqueue_dispatch_items
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    results = context.Queue()
+    processes = [
+        context.Process(target=_dispatch_process,
+                        args=(args, db_path, smtp_server.server_address[1], i, ready, results),
+                        name=f"bench-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+
+    run_key = current_run_key()
+    start = time.perf_counter()
+    started_at = datetime.now()
+    enqueue_dispatch_items(session, run_key, keywords)
+
+    peak_rss = peak_rss_mb()
+    for _ in processes:
+        samples, process_rss = results.get()
+        timer.merge(samples)
+        peak_rss = max(peak_rss, process_rss)
+    for process in processes:
+        process.join()
+
+    session.expire_all()
+    finished_at = session.query(func.max(DispatchItem.finished_at)).filter(DispatchItem.run_key == run_key).scalar()
+    dispatch_seconds = (finished_at - started_at).total_seconds() if finished_at else time.perf_counter() - start
+    return start, dispatch_seconds, peak_rss
+
+
+def _dispatch_process(args, db_path, smtp_port, index, ready, results):
+    """분산 발송 모드 워커 프로세스 (분산 발송 실행기 + 발송 워커 풀)"""
+    random.seed(args.seed + index)
+    configure_environment(args, db_path, smtp_port)
+
+    from database import DispatchItem, Outbox, get_session
+    from dispatch_queue import DispatchRunner
+
+    timer = StageTimer()
+    digest = install_fakes(args, timer)
+    runner = DispatchRunner(digest.engine, digest.dispatch_work_item, workers=args.dispatch_workers,
+                            poll_interval=0.05, owner=f"bench-worker-{index}")
+    delivery_pool = start_delivery_pool(args, digest, timer)
+    runner.start()
+    ready.put(index)
+
+    # 작업 항목이 모두 끝나고 발송 대기열이 빌 때까지 처리
+    session = get_session(digest.engine)
+    deadline = time.monotonic() + args.timeout
+    seen_items = False
+    while time.monotonic() < deadline:
+        open_items = session.query(DispatchItem).filter(DispatchItem.status.in_(('pending', 'claimed'))).count()
+        seen_items = seen_items or session.query(DispatchItem.id).first() is not None
+        pending_mail = session.query(Outbox).filter(Outbox.status.in_(('pending', 'sending'))).count()
+        session.expire_all()
+        if seen_items and open_items == 0 and pending_mail == 0:
+            break
+        time.sleep(0.1)
+    session.close()
+
+    runner.stop()
+    delivery_pool.stop()
+    results.put((timer.samples(), peak_rss_mb()))
+
+
+def print_report(result):
+    """결과 표 출력"""
+    config = result['config']
+    print(f"\n스케줄 {config['schedules']}개 / 키워드 {config['keywords']}개 / 키워드당 논문 {config['papers']}편")
+    if config.get('consolidated'):
+        print(f"통합 다이제스트 모드: 수신자당 구독 키워드 {config['keywords_per_recipient']}개")
+    if config.get('processes'):
+        print(f"분산 발송 모드: 워커 프로세스 {config['processes']}개 × 실행 스레드 {config['dispatch_workers']}개")
+    print(f"발송 성공 {result['emails_sent']}건, 실패 {result['emails_failed']}건, "
+          f"SMTP 수신 {result['smtp_received']}건" + ("" if result['drained'] else " (시간 초과로 대기열 남음)"))
+    if result.get('prepare_seconds') is not None:
+        gemini_calls = result['prepare_stages'].get('gemini_call', {}).get('count', 0)
+        print(f"준비 단계 {result['prepare_seconds']:.2f}초 (Gemini 호출 {gemini_calls}회, 발송 구간 측정에서 제외)")
+    print(f"키워드 처리 {result['dispatch_seconds']:.2f}초, 전체 {result['total_seconds']:.2f}초")
+    print(f"처리량: {result['digests_per_second']:.1f} 통/초, {result['keywords_per_second']:.1f} 키워드/초")
+    print(f"최대 메모리: RSS {result['peak_rss_mb']:.1f} MB" +
+          (f", Python 할당 {result['peak_traced_mb']:.1f} MB" if 'peak_traced_mb' in result else ""))
+
+    print(f"\n{'단계':<15}{'횟수':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<15}{stats['count']:>8}{stats['p50']:>12.1f}{stats['p95']:>12.1f}"
+              f"{stats['p99']:>12.1f}{stats['max']:>12.1f}")
+
+
+def parse_args(argv=None):
+    """명령행 인자"""
+    parser = argparse.ArgumentParser(description="스터디레터 오프라인 발송 벤치마크")
+    parser.add_argument('--schedules', type=int, default=200, help="스케줄 수")
+    parser.add_argument('--keywords', type=int, default=20, help="서로 다른 키워드 수")
+    parser.add_argument('--papers', type=int, default=5, help="키워드당 논문 수")
+    parser.add_argument('--arxiv-latency', type=float, default=300, help="arXiv 평균 지연 (ms)")
+    parser.add_argument('--gemini-latency', type=float, default=800, help="Gemini 평균 지연 (ms)")
+    parser.add_argument('--smtp-latency', type=float, default=50, help="SMTP DATA 평균 지연 (ms)")
+    parser.add_argument('--jitter', type=float, default=0.5, help="지연 변동폭 (평균 대비 비율)")
+    parser.add_argument('--arxiv-error-rate', type=float, default=0.0, help="arXiv 오류 비율")
+    parser.add_argument('--gemini-error-rate', type=float, default=0.0, help="Gemini 오류 비율")
+    parser.add_argument('--smtp-error-rate', type=float, default=0.0, help="SMTP 수신 거부 비율")
+    parser.add_argument('--gemini-rpm', type=int, default=100000, help="Gemini RPM 한도")
+    parser.add_argument('--gemini-tpm', type=int, default=10 ** 9, help="Gemini TPM 한도")
+    parser.add_argument('--gemini-workers', type=int, default=5, help="요약 스레드 수")
+    parser.add_argument('--dispatch-workers', type=int, default=4, help="동시에 처리할 키워드 수 (분산 모드에서는 프로세스당)")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="분산 발송 모드 워커 프로세스 수 (0이면 한 프로세스에서 키워드별 발송)")
+    parser.add_argument('--keywords-per-recipient', type=int, default=1, help="수신자 한 명당 구독 키워드 수")
+    parser.add_argument('--consolidated', action='store_true',
+                        help="수신자별 통합 다이제스트로 발송 (DIGEST_MODE=consolidated, 분산 모드와 함께 쓸 수 없음)")
+    parser.add_argument('--prepare', action='store_true',
+                        help="발송 전에 준비 단계(DIGEST_PREPARE)를 실행하고 발송 구간만 측정")
+    parser.add_argument('--delivery-workers', type=int, default=2, help="발송 워커 수")
+    parser.add_argument('--max-attempts', type=int, default=3, help="메일당 최대 발송 시도 횟수")
+    parser.add_argument('--timeout', type=float, default=600, help="발송 대기열 비우기 제한 시간 (초)")
+    parser.add_argument('--seed', type=int, default=42, help="난수 시드")
+    parser.add_argument('--trace-memory', action='store_true', help="tracemalloc으로 Python 할당량 측정 (느려짐)")
+    parser.add_argument('--json', dest='json_path', help="결과를 JSON 파일로 저장")
+    args = parser.parse_args(argv)
+    if args.consolidated and args.processes:
+        parser.error("--consolidated는 --processes와 함께 쓸 수 없습니다.")
+    return args
+
+
+def main(argv=None):
+    """벤치마크 실행"""
+    args = parse_args(argv)
+    result = run_benchmark(args)
+    print_report(result)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,41 @@
 데이터베이스 모델 정의
 - 자동화 스케줄 관리
 - 이메일 발송 이력 관리
+- 논문 요약 캐시
+- 이메일 발송 대기열 (outbox)
+- 스케줄러 리더 임대 (여러 워커 중 하나만 작업 실행)
+- 로컬 arXiv 논문 색인
+- 다이제스트 본문 저장소 (내용 해시 기준 중복 제거 + zlib 압축)
+- 발송 통계 카운터 (이력 저장 시 함께 갱신)
+- 단발성 발송 작업 (웹에서 등록, 워커가 실행)
+- 분산 발송 작업 항목 (키워드별, 여러 워커가 임대로 나눠 처리)
+- 스케줄별 발송한 논문 기록 (이미 보낸 논문은 다음 발송에서 제외)
+- 발송 회차별 미리 준비한 키워드 다이제스트 (검색 + 요약 결과, 발송 시각에는 포맷팅/발송만)
+- 스케줄 작업 실제 시작 시각 기록 (워커가 모아서 저장, 웹에서 시작 시각 분포 표시)
+- 저장소 설정: DATABASE_URL, SQLite WAL + busy timeout, 엔진별 세션 팩토리, 발송 이력 묶음 저장
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, event, func, insert, inspect, text, tuple_, Column, Index, Integer, String, DateTime, Boolean, Text, LargeBinary, UniqueConstraint
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.orm import defer, sessionmaker
+from collections import Counter
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+import zlib
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = 'sqlite:///studyletter.db'
 
 Base = declarative_base()
 
@@ -38,22 +67,732 @@ class EmailHistory(Base):
     paper_count = Column(Integer, default=0)
     status = Column(String(50), nullable=False)  # 'success' or 'failed'
     error_message = Column(Text, nullable=True)
-    email_content = Column(Text, nullable=True)
+    email_content = Column(Text, nullable=True)  # 이전 버전 이력용 (새 이력은 content_hash 사용)
+    content_hash = Column(String(64), nullable=True)  # digest_blobs 참조
+    timings = Column(Text, nullable=True)  # 단계별 소요 시간 JSON (metrics.Trace)
+    prompt_tokens = Column(Integer, nullable=True)  # Gemini 입력 토큰 수 (다이제스트 기준)
+    output_tokens = Column(Integer, nullable=True)  # Gemini 출력 토큰 수 (다이제스트 기준)
     sent_at = Column(DateTime, default=datetime.now)
     
+    __table_args__ = (
+        # 발송 이력 화면: 최신순 목록, 필터(상태/스케줄/키워드/수신자)별 최신순 목록
+        Index('ix_email_history_sent_at_id', 'sent_at', 'id'),
+        Index('ix_email_history_status_sent_at', 'status', 'sent_at'),
+        Index('ix_email_history_schedule_sent_at', 'schedule_id', 'sent_at'),
+        Index('ix_email_history_keyword_sent_at', 'keyword', 'sent_at'),
+        Index('ix_email_history_recipient_sent_at', 'recipient', 'sent_at'),
+    )
+    
     def __repr__(self):
         return f"<EmailHistory(id={self.id}, keyword='{self.keyword}', status='{self.status}')>"
 
 
+class PaperSummary(Base):
+    """논문 요약 캐시 테이블"""
+    __tablename__ = 'paper_summaries'
+    
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), nullable=False, unique=True)  # entry_id + 모델 + 프롬프트 해시
+    entry_id = Column(String(200), nullable=False, index=True)
+    model_name = Column(String(100), nullable=False)
+    prompt_hash = Column(String(64), nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    
+    def __repr__(self):
+        return f"<PaperSummary(id={self.id}, entry_id='{self.entry_id}', model='{self.model_name}')>"
+
+
+class Outbox(Base):
+    """이메일 발송 대기열 테이블 (생성과 발송 분리)"""
+    __tablename__ = 'outbox'
+    
+    id = Column(Integer, primary_key=True)
+    schedule_id = Column(Integer, nullable=True)
+    keyword = Column(String(200), nullable=False)
+    recipient = Column(String(200), nullable=False)
+    subject = Column(String(500), nullable=False)
+    body = Column(Text, nullable=True)  # 이전 버전 대기열용 (새 행은 content_hash 사용)
+    content_hash = Column(String(64), nullable=True)  # digest_blobs 참조
+    html_hash = Column(String(64), nullable=True)  # HTML 본문 digest_blobs 참조 (EMAIL_HTML=true인 경우)
+    timings = Column(Text, nullable=True)  # 다이제스트 생성 단계별 소요 시간 JSON
+    paper_count = Column(Integer, default=0)
+    paper_ids = Column(Text, nullable=True)  # 포함된 논문 arXiv ID JSON 배열 (발송 성공 시 sent_papers에 기록)
+    schedule_ids = Column(Text, nullable=True)  # 통합 다이제스트가 포함하는 스케줄 ID JSON 배열 (없으면 schedule_id 하나)
+    status = Column(String(50), nullable=False, default='pending', index=True)  # 'pending', 'sending', 'sent', 'failed'
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.now, index=True)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<Outbox(id={self.id}, recipient='{self.recipient}', status='{self.status}')>"
+
+
+class SchedulerLease(Base):
+    """스케줄러 리더 임대 테이블"""
+    __tablename__ = 'scheduler_leases'
+    
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<SchedulerLease(name='{self.name}', holder='{self.holder}', expires_at={self.expires_at})>"
+
+
+class Paper(Base):
+    """로컬 arXiv 논문 색인 테이블 (전문 검색은 paper_index 모듈의 FTS5 테이블 사용)"""
+    __tablename__ = 'papers'
+    
+    id = Column(Integer, primary_key=True)
+    entry_id = Column(String(200), nullable=False, unique=True)
+    title = Column(Text, nullable=False)
+    authors = Column(Text, nullable=False)  # JSON 배열
+    abstract = Column(Text, nullable=False)
+    pdf_url = Column(String(500), nullable=True)
+    categories = Column(String(500), nullable=True)  # 공백으로 구분
+    published = Column(DateTime, nullable=False, index=True)
+    ingested_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<Paper(id={self.id}, entry_id='{self.entry_id}')>"
+
+
+class DigestBlob(Base):
+    """다이제스트 본문 저장 테이블 (같은 본문은 한 번만 압축 저장)"""
+    __tablename__ = 'digest_blobs'
+    
+    content_hash = Column(String(64), primary_key=True)  # 원문 SHA-256
+    content = Column(LargeBinary, nullable=False)  # zlib 압축 본문
+    size = Column(Integer, nullable=False)  # 원문 바이트 수
+    created_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<DigestBlob(content_hash='{self.content_hash[:12]}', size={self.size})>"
+
+
+class InstantJob(Base):
+    """단발성 발송 작업 테이블 (웹에서 등록, 워커가 실행, 웹이 상태 조회)"""
+    __tablename__ = 'instant_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    keyword = Column(String(200), nullable=False)
+    recipient = Column(String(200), nullable=False)
+    status = Column(String(50), nullable=False, default='queued', index=True)  # 'queued', 'running', 'success', 'failed'
+    total = Column(Integer, default=0)  # 찾은 논문 수
+    done = Column(Integer, default=0)  # 요약 완료 논문 수
+    papers = Column(Text, nullable=True)  # 요약 완료 논문 JSON 배열 (제목, 링크, 요약)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    claimed_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<InstantJob(id={self.id}, keyword='{self.keyword}', status='{self.status}')>"
+
+
+class EmailStats(Base):
+    """발송 통계 카운터 테이블 (상태별 이력 수, 이력 저장 시 함께 갱신)"""
+    __tablename__ = 'email_stats'
+    
+    status = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<EmailStats(status='{self.status}', count={self.count})>"
+
+
+class DispatchItem(Base):
+    """분산 발송 작업 항목 테이블 (발송 회차별 키워드 하나, 워커가 임대로 점유)"""
+    __tablename__ = 'dispatch_items'
+    
+    id = Column(Integer, primary_key=True)
+    run_key = Column(String(50), nullable=False)  # 발송 회차 (예정일 YYYY-MM-DD)
+    keyword = Column(String(200), nullable=False)  # 정규화된 키워드
+    status = Column(String(50), nullable=False, default='pending')  # 'pending', 'claimed', 'done', 'failed'
+    lease_owner = Column(String(200), nullable=True)  # 점유한 워커 (호스트명:PID)
+    lease_expires_at = Column(DateTime, nullable=True)  # 하트비트로 연장, 지나면 다른 워커가 재점유
+    attempts = Column(Integer, default=0)
+    sent = Column(Integer, default=0)  # 발송 대기열 등록 건수
+    failed = Column(Integer, default=0)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    claimed_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        UniqueConstraint('run_key', 'keyword', name='uq_dispatch_items_run_keyword'),
+        Index('ix_dispatch_items_status_lease', 'status', 'lease_expires_at'),
+    )
+    
+    def __repr__(self):
+        return f"<DispatchItem(id={self.id}, keyword='{self.keyword}', status='{self.status}')>"
+
+
+class SentPaper(Base):
+    """스케줄별 발송한 논문 기록 테이블 (arXiv ID 기준, 다음 발송에서 제외)"""
+    __tablename__ = 'sent_papers'
+    
+    id = Column(Integer, primary_key=True)
+    schedule_id = Column(Integer, nullable=False)
+    entry_id = Column(String(200), nullable=False)
+    sent_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        UniqueConstraint('schedule_id', 'entry_id', name='uq_sent_papers_schedule_entry'),
+    )
+    
+    def __repr__(self):
+        return f"<SentPaper(schedule_id={self.schedule_id}, entry_id='{self.entry_id}')>"
+
+
+class PreparedDigest(Base):
+    """발송 회차별 미리 준비한 키워드 다이제스트 테이블 (준비 단계의 검색 + 요약 결과)"""
+    __tablename__ = 'prepared_digests'
+    
+    id = Column(Integer, primary_key=True)
+    run_key = Column(String(50), nullable=False)  # 발송 회차 (발송일 YYYY-MM-DD)
+    keyword = Column(String(200), nullable=False)  # 정규화된 키워드
+    status = Column(String(50), nullable=False)  # 'ready', 'incomplete' (일부 요약 실패), 'failed'
+    since = Column(DateTime, nullable=True)  # 검색 구간 시작 (발송 시 스케줄 검색 구간을 덮어야 사용)
+    content_hash = Column(String(64), nullable=True)  # 논문 목록 JSON (digest_blobs 참조)
+    paper_count = Column(Integer, default=0)
+    timings = Column(Text, nullable=True)  # 준비 단계별 소요 시간/토큰 JSON
+    error_message = Column(Text, nullable=True)
+    prepared_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        UniqueConstraint('run_key', 'keyword', name='uq_prepared_digests_run_keyword'),
+    )
+    
+    def __repr__(self):
+        return f"<PreparedDigest(run_key='{self.run_key}', keyword='{self.keyword}', status='{self.status}')>"
+
+
+
+class JobStart(Base):
+    """스케줄 작업 실제 시작 시각 테이블 (워커 메모리의 기록을 웹에서 볼 수 있도록 저장)"""
+    __tablename__ = 'job_starts'
+    
+    id = Column(Integer, primary_key=True)
+    run_key = Column(String(50), nullable=False, index=True)  # 발송 회차 (실행일 YYYY-MM-DD, KST)
+    job_id = Column(String(200), nullable=False)
+    offset_seconds = Column(Integer, nullable=False)  # 발송 구간 시작(09:00) 기준 초 (음수면 구간 전)
+    
+    def __repr__(self):
+        return f"<JobStart(run_key='{self.run_key}', job_id='{self.job_id}', offset_seconds={self.offset_seconds})>"
+
+
 # 데이터베이스 초기화
-def init_db(db_path='sqlite:///studyletter.db'):
-    """데이터베이스 초기화"""
-    engine = create_engine(db_path, echo=False)
+def init_db(db_path=None):
+    """
+    데이터베이스 초기화
+    
+    Args:
+        db_path: DB URL (기본: 환경 변수 DATABASE_URL, 없으면 sqlite:///studyletter.db)
+    """
+    engine = create_db_engine(db_path or os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL))
     Base.metadata.create_all(engine)
+    migrate_db(engine)
     return engine
 
 
+def create_db_engine(db_url):
+    """
+    DB 엔진 생성
+    
+    SQLite는 스케줄러/발송 워커 스레드와 Streamlit 스레드가 같은 파일에 동시에 쓰므로
+    WAL 모드(읽기와 쓰기가 서로 막지 않음)와 busy timeout(잠금 시 바로 실패하지 않고 대기)을
+    연결마다 설정합니다. 서버 DB는 연결 풀을 사용합니다.
+    """
+    if not db_url.startswith('sqlite'):
+        return create_engine(
+            db_url,
+            echo=False,
+            pool_pre_ping=True,
+            pool_size=int(os.getenv('DATABASE_POOL_SIZE', '5'))
+        )
+    
+    busy_timeout = int(os.getenv('SQLITE_BUSY_TIMEOUT', '30000'))  # 밀리초
+    engine = create_engine(db_url, echo=False, connect_args={'timeout': busy_timeout / 1000})
+    
+    @event.listens_for(engine, 'connect')
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if db_url not in ('sqlite://', 'sqlite:///:memory:'):
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')  # WAL에서는 NORMAL도 DB 손상 없이 안전
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.close()
+    
+    return engine
+
+
+def migrate_db(engine):
+    """
+    기존 테이블에 새로 추가된 컬럼/인덱스 반영
+    
+    create_all은 없는 테이블만 만들기 때문에, 이미 있는 테이블에 모델에서
+    추가된 컬럼이 있으면 ALTER TABLE로 추가합니다 (nullable 컬럼만 대상).
+    인덱스도 없으면 생성하고, 발송 통계 카운터가 비어 있으면 기존 이력으로 채웁니다.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    
+    seed_email_stats(engine)
+
+
+def seed_email_stats(engine):
+    """발송 통계 카운터가 비어 있으면 기존 이력을 한 번 집계하여 채움 (이전 버전 DB용)"""
+    session = get_session(engine)
+    try:
+        if session.query(EmailStats).first() is not None:
+            return
+        rows = session.query(EmailHistory.status, func.count(EmailHistory.id)).group_by(EmailHistory.status).all()
+        for status, count in rows:
+            session.add(EmailStats(status=status, count=count))
+        session.commit()
+    except IntegrityError:
+        # 다른 프로세스가 먼저 채운 경우
+        session.rollback()
+    finally:
+        session.close()
+
+
+def increment_email_stats(session, status, amount=1):
+    """
+    상태별 발송 통계 카운터 증가
+    
+    커밋은 호출 측 트랜잭션에서 함께 처리되므로 이력 행과 카운터가 항상 일치합니다.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(EmailStats).values(status=status, count=amount)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[EmailStats.status],
+            set_={'count': EmailStats.count + amount}
+        ))
+        return
+    
+    updated = session.query(EmailStats).filter_by(status=status).update(
+        {'count': EmailStats.count + amount}, synchronize_session=False
+    )
+    if not updated:
+        session.add(EmailStats(status=status, count=amount))
+        session.flush()
+
+
+def get_email_stats(session):
+    """
+    발송 통계 조회 (이력 테이블을 스캔하지 않고 카운터 행만 읽음)
+    
+    Returns:
+        {'total': 전체 건수, 'success': 성공 건수, 'failed': 실패 건수}
+    """
+    counts = dict(session.query(EmailStats.status, EmailStats.count).all())
+    return {
+        'total': sum(counts.values()),
+        'success': counts.get('success', 0),
+        'failed': counts.get('failed', 0)
+    }
+
+
+# 엔진별 세션 팩토리 (호출마다 sessionmaker를 새로 만들지 않음)
+_session_factories = weakref.WeakKeyDictionary()
+_session_factories_lock = threading.Lock()
+
+
 def get_session(engine):
     """세션 생성"""
-    Session = sessionmaker(bind=engine)
+    with _session_factories_lock:
+        Session = _session_factories.get(engine)
+        if Session is None:
+            Session = _session_factories[engine] = sessionmaker(bind=engine)
     return Session()
+
+
+def store_blob(session, content):
+    """
+    본문을 압축 저장하고 내용 해시 반환 (이미 있으면 저장 생략)
+    
+    커밋은 호출 측 트랜잭션에서 함께 처리됩니다.
+    """
+    raw = content.encode('utf-8')
+    content_hash = hashlib.sha256(raw).hexdigest()
+    values = {
+        'content_hash': content_hash,
+        'content': zlib.compress(raw, 6),
+        'size': len(raw),
+        'created_at': datetime.now()
+    }
+    
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        session.execute(sqlite.insert(DigestBlob).values(**values).on_conflict_do_nothing())
+    elif dialect == 'postgresql':
+        session.execute(postgresql.insert(DigestBlob).values(**values).on_conflict_do_nothing())
+    elif session.get(DigestBlob, content_hash) is None:
+        session.add(DigestBlob(**values))
+        session.flush()
+    
+    return content_hash
+
+
+def load_blob(session, content_hash):
+    """내용 해시로 본문 조회 (없으면 None)"""
+    blob = session.get(DigestBlob, content_hash)
+    if blob is None:
+        return None
+    return zlib.decompress(blob.content).decode('utf-8')
+
+
+def record_sent_papers(session, schedule_id, entry_ids, sent_at=None):
+    """
+    스케줄에 발송한 논문 기록 (이미 있으면 건너뜀)
+    
+    커밋은 호출 측 트랜잭션에서 함께 처리됩니다.
+    """
+    if not entry_ids:
+        return
+    sent_at = sent_at or datetime.now()
+    rows = [{'schedule_id': schedule_id, 'entry_id': entry_id, 'sent_at': sent_at} for entry_id in entry_ids]
+    
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        session.execute(sqlite.insert(SentPaper).values(rows).on_conflict_do_nothing())
+    elif dialect == 'postgresql':
+        session.execute(postgresql.insert(SentPaper).values(rows).on_conflict_do_nothing())
+    else:
+        existing = set(load_sent_paper_ids(session, [schedule_id], entry_ids).get(schedule_id, ()))
+        session.add_all([SentPaper(**row) for row in rows if row['entry_id'] not in existing])
+        session.flush()
+
+
+def load_sent_paper_ids(session, schedule_ids, entry_ids):
+    """
+    후보 논문 중 이미 발송한 논문 조회 ((schedule_id, entry_id) 유일 인덱스로 한 번에 조회)
+    
+    Returns:
+        {schedule_id: 발송한 arXiv ID 집합}
+    """
+    if not schedule_ids or not entry_ids:
+        return {}
+    sent = {}
+    rows = session.query(SentPaper.schedule_id, SentPaper.entry_id).filter(
+        SentPaper.schedule_id.in_(schedule_ids),
+        SentPaper.entry_id.in_(entry_ids)
+    )
+    for schedule_id, entry_id in rows:
+        sent.setdefault(schedule_id, set()).add(entry_id)
+    return sent
+
+
+def _encode_papers(papers):
+    """논문 목록을 JSON으로 (발표일은 ISO 8601 문자열)"""
+    return json.dumps([dict(paper, published=paper['published'].isoformat()) for paper in papers],
+                      ensure_ascii=False)
+
+
+def _decode_papers(content):
+    """JSON 논문 목록 복원"""
+    return [dict(paper, published=datetime.fromisoformat(paper['published'])) for paper in json.loads(content)]
+
+
+def save_prepared_digest(session, run_key, keyword, status, since=None, papers=None, timings=None,
+                         error_msg=None):
+    """
+    준비 단계 결과 저장 (같은 회차/키워드는 덮어씀)
+    
+    논문 목록(요약 포함)은 digest_blobs에 압축 저장합니다.
+    """
+    row = session.query(PreparedDigest).filter_by(run_key=run_key, keyword=keyword).first()
+    if row is None:
+        row = PreparedDigest(run_key=run_key, keyword=keyword)
+        session.add(row)
+    
+    row.status = status
+    row.since = since
+    row.content_hash = store_blob(session, _encode_papers(papers)) if papers is not None else None
+    row.paper_count = len(papers) if papers else 0
+    row.timings = json.dumps(timings) if timings else None
+    row.error_message = error_msg
+    row.prepared_at = datetime.now()
+    try:
+        session.commit()
+    except IntegrityError:
+        # 다른 워커가 먼저 저장한 경우
+        session.rollback()
+
+
+def load_prepared_digest(session, run_key, keyword, since):
+    """
+    준비된 다이제스트의 논문 목록 조회
+    
+    준비가 끝난('ready') 결과이고 검색 구간이 since까지 덮는 경우만 반환하며,
+    아니면 None (발송 시 바로 검색/요약).
+    """
+    row = session.query(PreparedDigest).filter_by(run_key=run_key, keyword=keyword, status='ready').first()
+    if row is None or row.since is None or row.since > since or row.content_hash is None:
+        return None
+    content = load_blob(session, row.content_hash)
+    if content is None:
+        return None
+    return _decode_papers(content)
+
+
+def get_prepare_progress(session, run_key):
+    """발송 회차 준비 상황 {상태: 키워드 수}"""
+    rows = session.query(PreparedDigest.status, func.count(PreparedDigest.id)).filter(
+        PreparedDigest.run_key == run_key
+    ).group_by(PreparedDigest.status).all()
+    return dict(rows)
+
+
+def prune_prepared_digests(session, before_run_key):
+    """지난 회차 준비 결과 삭제 (본문 blob은 다른 이력과 공유될 수 있어 남김)"""
+    deleted = session.query(PreparedDigest).filter(PreparedDigest.run_key < before_run_key).delete(
+        synchronize_session=False
+    )
+    session.commit()
+    return deleted
+
+
+
+def save_job_starts(session, starts, keep_days=28):
+    """
+    작업 시작 기록 저장 후 오래된 회차 삭제
+    
+    Args:
+        starts: [(run_key, job_id, offset_seconds), ...] (비어 있지 않아야 함)
+        keep_days: 가장 최근 회차 기준 보관 기간 (일)
+    """
+    session.add_all([
+        JobStart(run_key=run_key, job_id=job_id, offset_seconds=int(offset))
+        for run_key, job_id, offset in starts
+    ])
+    latest = datetime.strptime(max(run_key for run_key, _, _ in starts), '%Y-%m-%d')
+    cutoff = (latest - timedelta(days=keep_days)).strftime('%Y-%m-%d')
+    session.query(JobStart).filter(JobStart.run_key < cutoff).delete(synchronize_session=False)
+    session.commit()
+
+
+def get_job_start_offsets(session, run_key=None):
+    """
+    회차의 작업 시작 시각 목록 (run_key가 없으면 가장 최근 회차)
+    
+    Returns:
+        (run_key, [구간 시작 기준 초, ...]) - 기록이 없으면 (None, [])
+    """
+    if run_key is None:
+        run_key = session.query(func.max(JobStart.run_key)).scalar()
+        if run_key is None:
+            return None, []
+    rows = session.query(JobStart.offset_seconds).filter(JobStart.run_key == run_key).all()
+    return run_key, [offset for offset, in rows]
+
+def get_email_content(session, history):
+    """발송 이력의 이메일 본문 (필요할 때만 압축 해제)"""
+    if history.content_hash:
+        return load_blob(session, history.content_hash)
+    return history.email_content
+
+
+def query_email_history(session, status=None, keyword=None, recipient=None, schedule_id=None,
+                        date_from=None, date_to=None, cursor=None, page_size=50):
+    """
+    발송 이력 한 페이지 조회 (최신순, 키셋 페이지네이션)
+    
+    OFFSET 대신 직전 페이지 마지막 행의 (sent_at, id) 이후만 조회하므로
+    몇 번째 페이지든 인덱스를 따라 page_size + 1행만 읽습니다.
+    이메일 본문은 지연 로딩합니다 (get_email_content로 필요할 때 조회).
+    
+    Args:
+        session: DB 세션
+        status: 'success' / 'failed'
+        keyword: 키워드 (정확히 일치)
+        recipient: 수신 이메일 (정확히 일치)
+        schedule_id: 스케줄 ID (0이면 단발성 발송만)
+        date_from: 이 날짜부터 (date)
+        date_to: 이 날짜까지 (date, 당일 포함)
+        cursor: 직전 페이지의 next_cursor (None이면 첫 페이지)
+        page_size: 페이지당 행 수
+    
+    Returns:
+        (이력 목록, 다음 페이지 cursor 또는 None)
+    """
+    query = session.query(EmailHistory).options(defer(EmailHistory.email_content))
+    
+    if status:
+        query = query.filter(EmailHistory.status == status)
+    if keyword:
+        query = query.filter(EmailHistory.keyword == keyword)
+    if recipient:
+        query = query.filter(EmailHistory.recipient == recipient)
+    if schedule_id == 0:
+        query = query.filter(EmailHistory.schedule_id.is_(None))
+    elif schedule_id is not None:
+        query = query.filter(EmailHistory.schedule_id == schedule_id)
+    if date_from:
+        query = query.filter(EmailHistory.sent_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(EmailHistory.sent_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if cursor:
+        query = query.filter(tuple_(EmailHistory.sent_at, EmailHistory.id) < tuple_(*cursor))
+    
+    rows = query.order_by(EmailHistory.sent_at.desc(), EmailHistory.id.desc()).limit(page_size + 1).all()
+    
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, (rows[-1].sent_at, rows[-1].id)
+    return rows, None
+
+
+def _timing_columns(timings):
+    """계측 결과(dict)를 이력 컬럼 값으로 변환"""
+    if not timings:
+        return {'timings': None, 'prompt_tokens': None, 'output_tokens': None}
+    return {
+        'timings': json.dumps(timings),
+        'prompt_tokens': timings.get('prompt_tokens'),
+        'output_tokens': timings.get('output_tokens')
+    }
+
+
+def save_email_history(session, schedule_id, keyword, recipient, paper_count, status, error_msg, email_content,
+                       content_hash=None, timings=None):
+    """
+    이메일 발송 이력 저장
+    
+    paper_count는 본문에 담긴 논문 수입니다 (논문을 찾지 못한 실패 이력은 0).
+    본문은 digest_blobs에 한 번만 압축 저장하고 이력에는 해시만 기록합니다.
+    이미 저장된 본문이면 content_hash를 직접 넘길 수 있습니다.
+    timings는 metrics.Trace.to_dict() 결과입니다.
+    """
+    if content_hash is None and email_content is not None:
+        content_hash = store_blob(session, email_content)
+    
+    history = EmailHistory(
+        schedule_id=schedule_id,
+        keyword=keyword,
+        recipient=recipient,
+        paper_count=paper_count,
+        status=status,
+        error_message=error_msg,
+        content_hash=content_hash,
+        sent_at=datetime.now(),
+        **_timing_columns(timings)
+    )
+    session.add(history)
+    increment_email_stats(session, status)
+    session.commit()
+
+
+class HistoryWriter:
+    """
+    발송 이력 묶음 저장기 (group commit)
+    
+    발송이 몰릴 때 이력 행마다 커밋하면 쓰기 잠금 경합과 fsync가 발송 수만큼 발생합니다.
+    이력을 메모리에 모았다가 batch_size개가 차거나 flush_interval초가 지나면
+    한 트랜잭션으로 저장합니다 (통계 카운터도 같은 트랜잭션에서 갱신).
+    """
+    
+    def __init__(self, engine, batch_size=100, flush_interval=1.0):
+        """
+        Args:
+            engine: SQLAlchemy 엔진
+            batch_size: 이만큼 쌓이면 바로 저장
+            flush_interval: 최대 저장 지연 (초)
+        """
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def add(self, schedule_id, keyword, recipient, status, error_msg, content_hash, paper_count, timings=None):
+        """이력 한 건 추가 (저장은 백그라운드 스레드에서)"""
+        with self._lock:
+            self._buffer.append({
+                'schedule_id': schedule_id,
+                'keyword': keyword,
+                'recipient': recipient,
+                'paper_count': paper_count,
+                'status': status,
+                'error_message': error_msg,
+                'content_hash': content_hash,
+                'sent_at': datetime.now(),
+                **_timing_columns(timings)
+            })
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+    
+    def flush(self):
+        """쌓인 이력을 한 트랜잭션으로 저장하고 저장한 건수 반환"""
+        with self._flush_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return 0
+            
+            session = get_session(self.engine)
+            start = time.perf_counter()
+            try:
+                session.execute(insert(EmailHistory), records)
+                for status, count in Counter(record['status'] for record in records).items():
+                    increment_email_stats(session, status, count)
+                session.commit()
+                registry.observe('history_write', time.perf_counter() - start)
+                return len(records)
+            except Exception:
+                session.rollback()
+                # 다음 저장 때 다시 시도
+                with self._lock:
+                    self._buffer[:0] = records
+                raise
+            finally:
+                session.close()
+    
+    def start(self):
+        """백그라운드 저장 스레드 시작"""
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """저장 스레드 종료 (남은 이력은 모두 저장)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    def _run(self):
+        """저장 루프"""
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"발송 이력 저장 오류: {e}")
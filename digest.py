@@ -0,0 +1,768 @@
+"""
+다이제스트 생성/발송 파이프라인
+- arXiv 검색 → Gemini 요약 → 이메일 포맷팅 (email_templates) → 발송 대기열
+- 키워드별 일괄 발송 작업 (DISPATCH_MODE=sharded면 작업 항목으로 나눠 모든 워커가 처리)
+- 예약 발송은 마지막 발송 이후 구간에서 아직 보내지 않은 논문만 요약/발송 (증분 다이제스트)
+- 발송 구간 전 준비 단계에서 키워드별 검색 + 요약을 미리 저장하고, 발송 시각에는 포맷팅/발송만 (없으면 바로 생성)
+- DIGEST_MODE=consolidated면 수신자별로 모든 구독 키워드 논문을 arXiv ID로 중복 제거하여 한 통으로 발송
+- 단발성 발송은 요약이 끝나는 논문부터 단계별로 반환 (스트리밍)
+- Streamlit 없이 동작하므로 웹(app.py)과 스케줄러 워커(worker.py)가 함께 사용
+"""
+
+import google.generativeai as genai
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+import hashlib
+import logging
+import os
+import threading
+import time
+from database import (init_db, get_session, load_prepared_digest, load_sent_paper_ids, prune_prepared_digests,
+                      save_email_history, save_prepared_digest, Outbox, Schedule)
+from summary_cache import SummaryCache
+from summarizer import SUMMARY_ERROR_PREFIX, GeminiSummarizer
+from mailer import build_message, get_mail_pool
+from email_templates import render_combined_digest, render_digest, render_footer
+from outbox import enqueue_email, enqueue_emails
+from dispatch_queue import current_run_key, enqueue_dispatch_items, is_sharded_dispatch_enabled
+from metrics import Trace, registry
+from scheduler import is_prepare_enabled
+from paper_index import init_paper_index, is_local_search_enabled, search_local
+from arxiv_search import normalize_keyword, published_at, search_recent
+
+logger = logging.getLogger(__name__)
+
+# 환경 변수 로드
+load_dotenv()
+
+# Gemini API 설정 (Lite 모델로 변경)
+genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+
+# 데이터베이스 초기화
+engine = init_db()
+
+# 로컬 논문 색인 (FTS5) 초기화
+if is_local_search_enabled():
+    init_paper_index(engine)
+
+# 논문 요약 캐시 (메모리 LRU + DB)
+summary_cache = SummaryCache(engine)
+
+# 요약 엔진 (동시 요약 + 프로세스 공통 RPM/TPM 제한)
+summarizer = GeminiSummarizer(cache=summary_cache)
+
+# 증분 발송 검색 구간의 겹침 (arXiv 공개 지연 대비, 겹친 구간의 논문은 발송 기록으로 제외)
+INCREMENTAL_OVERLAP = timedelta(hours=int(os.getenv('INCREMENTAL_OVERLAP_HOURS', '24')))
+
+# 준비 단계 작업 ID
+PREPARE_JOB_ID = 'prepare_digests'
+
+
+class SearchError(Exception):
+    """발송 단계의 논문 검색 오류 (검색 결과가 비어 있는 '새 논문 없음'과 구분)"""
+
+
+def search_arxiv(keyword, max_results=10, since=None, batch_with=None, raise_errors=False):
+    """
+    arXiv에서 최근 7일 이내 논문 검색 (PAPER_SOURCE=local이면 로컬 색인 사용)
+    
+    since를 주면 그 이후(최대 7일 전까지) 논문만 검색합니다.
+    batch_with로 같은 회차에 발송할 다른 키워드를 주면 캐시에 없는 키워드를 묶어
+    arXiv에 한 번에 질의합니다 (나머지 키워드는 캐시에서 바로 조회).
+    검색 오류는 빈 목록으로 처리하며, raise_errors면 예외를 그대로 올립니다 (예약 발송/준비 단계용).
+    """
+    try:
+        if is_local_search_enabled():
+            seven_days_ago = datetime.now() - timedelta(days=7)
+            return search_local(engine, keyword, since=max(since or seven_days_ago, seven_days_ago), limit=5)
+        
+        # 공유 클라이언트 + 키워드 검색 결과 TTL 캐시
+        if since is not None:
+            since = max(since, datetime.now() - timedelta(days=7))
+        return search_recent(keyword, max_results=max_results, days=7, limit=5, since=since,
+                             batch_with=batch_with)
+    except Exception as e:
+        logger.error(f"논문 검색 중 오류가 발생했습니다: {str(e)}")
+        if raise_errors:
+            raise
+        return []
+
+
+def format_email_content(papers, keyword):
+    """이메일 본문 포맷팅 (텍스트 공통 본문, email_templates 캐시 사용)"""
+    return render_digest(keyword, papers)['text']
+
+
+def send_email(recipient, subject, body, html_body=None, schedule_ids=None):
+    """
+    SMTP 연결 풀을 통해 이메일 전송
+    
+    공통 본문 인코딩은 mailer가 다이제스트별로 캐시하고,
+    수신자별 꼬리말(수신 주소, 구독 해지 링크)만 여기서 렌더링합니다.
+    구독 해지 링크는 schedule_ids(메일에 포함된 자동화 전체)에 서명합니다.
+    웹 화면은 POST를 받을 수 없어 원클릭 해지(List-Unsubscribe-Post)를 지원하지 않으므로
+    List-Unsubscribe 헤더는 넣지 않고 본문 꼬리말의 확인 화면 링크만 사용합니다.
+    """
+    try:
+        sender_email = os.getenv('SENDER_EMAIL')
+        sender_password = os.getenv('SENDER_PASSWORD')
+        
+        if not sender_email or not sender_password:
+            raise ValueError("이메일 설정이 .env 파일에 없습니다.")
+        
+        footer = render_footer(recipient, schedule_ids)
+        message = build_message(sender_email, recipient, subject, body, html_body=html_body,
+                                footer=footer['text'], html_footer=footer['html'])
+        
+        # 로그인된 연결을 재사용 (SMTP_SSL, 포트 465 기본)
+        get_mail_pool().send(message)
+        
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+def has_summary(paper):
+    """요약이 정상적으로 채워진 논문인지 (요약 실패 안내문은 제외)"""
+    summary = paper.get('summary')
+    return bool(summary) and not summary.startswith(SUMMARY_ERROR_PREFIX)
+
+
+def build_digest(keyword, papers=None, trace=None, summarized=False):
+    """
+    키워드 하나에 대한 다이제스트 생성 (검색 + 요약 + 포맷팅)
+    
+    papers를 주면 검색을 건너뛰고 그 논문만 요약합니다 (증분 발송).
+    summarized면 요약도 건너뜁니다 (준비 단계에서 요약해 둔 논문).
+    단계별 소요 시간과 Gemini 토큰 사용량은 'trace'(metrics.Trace)에 기록됩니다.
+    """
+    trace = trace or Trace()
+    
+    with trace.activate():
+        # 1. arXiv 검색
+        if papers is None:
+            with trace.stage('search'):
+                papers = search_arxiv(keyword)
+        
+        if not papers:
+            return {'keyword': keyword, 'papers': [], 'subject': None, 'body': None, 'html': None,
+                    'trace': trace}
+        
+        # 2. Gemini로 요약
+        if not summarized:
+            with trace.stage('summarize'):
+                summarizer.summarize_papers(papers)
+        
+        # 3. 이메일 포맷팅
+        with trace.stage('format'):
+            subject = f"[스터디레터] '{keyword}' 관련 최신 논문 ({datetime.now().strftime('%y/%m/%d')})"
+            rendered = render_digest(keyword, papers)
+    
+    return {'keyword': keyword, 'papers': papers, 'subject': subject, 'body': rendered['text'],
+            'html': rendered['html'], 'trace': trace}
+
+
+def stream_instant_digest(keyword, email):
+    """
+    단발성 발송 파이프라인 (검색 → 요약 → 포맷팅 → 발송)을 단계별로 yield
+    
+    요약이 끝나는 논문부터 바로 반환하므로 첫 결과를 모델 호출 한 번 만에
+    보여줄 수 있습니다 (워커의 단발성 발송 실행기가 진행 상황으로 기록).
+    논문을 찾으면 요약과 동시에 SMTP 연결을 미리 열어 두어
+    마지막 요약이 끝난 뒤에는 메시지 전송만 남도록 합니다.
+    
+    Yields:
+        {'type': 'papers', 'papers': 논문 목록}  (빈 목록이면 여기서 종료)
+        {'type': 'summary', 'index': 논문 인덱스, 'paper': 논문, 'done': 완료 수, 'total': 전체 수}
+        {'type': 'sent', 'success': 성공 여부, 'error': 오류 메시지, 'subject': 제목, 'body': 본문}
+    """
+    trace = Trace()
+    
+    with trace.stage('search'):
+        papers = search_arxiv(keyword)
+    yield {'type': 'papers', 'papers': papers}
+    
+    if not papers:
+        return
+    
+    # 요약하는 동안 SMTP 연결(TLS + 로그인) 준비
+    if os.getenv('SENDER_EMAIL') and os.getenv('SENDER_PASSWORD'):
+        threading.Thread(target=get_mail_pool().prewarm, name="smtp-prewarm", daemon=True).start()
+    
+    # yield 사이에는 호출 측 코드가 실행되므로 요약을 진행할 때만 Trace 활성화
+    summaries = summarizer.iter_summaries(papers)
+    start = time.perf_counter()
+    done = 0
+    while True:
+        with trace.activate():
+            item = next(summaries, None)
+        if item is None:
+            break
+        done += 1
+        yield {'type': 'summary', 'index': item[0], 'paper': item[1], 'done': done, 'total': len(papers)}
+    trace.record('summarize', time.perf_counter() - start)
+    
+    with trace.stage('format'):
+        subject = f"[스터디레터] '{keyword}' 관련 최신 논문 ({datetime.now().strftime('%y/%m/%d')})"
+        rendered = render_digest(keyword, papers)
+        email_body = rendered['text']
+    
+    with trace.stage('send'):
+        success, error = send_email(email, subject, email_body, html_body=rendered['html'])
+    
+    status = 'success' if success else 'failed'
+    registry.inc('emails_total', status=status)
+    
+    # 이력 저장
+    session = get_session(engine)
+    try:
+        save_email_history(session, None, keyword, email, len(papers), status, error, email_body,
+                           timings=trace.to_dict())
+    finally:
+        session.close()
+    
+    yield {'type': 'sent', 'success': success, 'error': error, 'subject': subject, 'body': email_body}
+
+
+def deliver_digest(session, digest, keyword, email, schedule_id=None):
+    """
+    생성된 다이제스트를 수신자 한 명 앞으로 발송 대기열에 추가
+    
+    실제 발송, 재시도, 이력 저장, 스케줄 갱신은 발송 워커(outbox)가 처리합니다.
+    """
+    papers = digest['papers']
+    
+    if not papers:
+        save_email_history(session, schedule_id, keyword, email, 0, 'failed', 
+                         '최근 7일 이내 논문을 찾지 못했습니다.', None, timings=digest['trace'].to_dict())
+        registry.inc('emails_total', status='failed')
+        return False, "논문을 찾지 못했습니다."
+    
+    # 4. 발송 대기열에 추가
+    enqueue_email(session, schedule_id, keyword, email, digest['subject'], digest['body'], len(papers),
+                  timings=digest['trace'].to_dict(), paper_ids=[paper['entry_id'] for paper in papers],
+                  html_body=digest.get('html'))
+    
+    return True, None
+
+
+def is_consolidated_digest_enabled():
+    """DIGEST_MODE=consolidated이면 수신자별로 모든 구독 키워드를 한 통으로 묶어 발송"""
+    return os.getenv('DIGEST_MODE', 'per_keyword').lower() == 'consolidated'
+
+
+def group_schedules_by_keyword(schedules):
+    """활성 스케줄을 정규화된 키워드별로 묶음"""
+    groups = {}
+    for schedule in schedules:
+        groups.setdefault(normalize_keyword(schedule.keyword), []).append(schedule)
+    return groups
+
+
+def group_schedules_by_recipient(schedules):
+    """활성 스케줄을 수신 이메일(소문자)별로 묶음"""
+    groups = {}
+    for schedule in schedules:
+        groups.setdefault(schedule.email.strip().lower(), []).append(schedule)
+    return groups
+
+
+def dispatch_job_id(normalized):
+    """키워드별 발송 작업 ID (지터 계산 키로도 사용)"""
+    return f"dispatch_{normalized}"
+
+
+def recipient_job_id(recipient):
+    """수신자별 통합 발송 작업 ID (작업 ID/로그에 이메일 주소가 남지 않도록 해시 사용)"""
+    return f"dispatch_recipient_{hashlib.sha1(recipient.encode('utf-8')).hexdigest()[:12]}"
+
+
+def schedule_dispatch_job_id(keyword, email):
+    """스케줄이 속한 발송 작업 ID (DIGEST_MODE에 따라 키워드별 또는 수신자별)"""
+    if is_consolidated_digest_enabled():
+        return recipient_job_id(email.strip().lower())
+    return dispatch_job_id(normalize_keyword(keyword))
+
+
+def search_window(schedule, now=None):
+    """스케줄의 검색 구간 시작 시각 (마지막 발송 시각 - 겹침 구간, 최대 7일 전)"""
+    since = (now or datetime.now()) - timedelta(days=7)
+    if schedule.last_sent is not None:
+        since = max(since, schedule.last_sent - INCREMENTAL_OVERLAP)
+    return since
+
+
+def plan_incremental_digests(session, group, papers, windows):
+    """
+    스케줄별로 아직 보내지 않은 논문 계산
+    
+    발송 기록은 (schedule_id, entry_id) 인덱스로 그룹 전체를 한 번에 조회합니다.
+    처음 발송하는 스케줄은 새 논문이 없어도 포함합니다 (논문 없음 이력 기록).
+    
+    Returns:
+        ({새 논문 arXiv ID 튜플: [스케줄, ...]}, 새 논문이 없어 건너뛴 스케줄 수)
+    """
+    sent_ids = load_sent_paper_ids(session, [schedule.id for schedule in group],
+                                   [paper['entry_id'] for paper in papers])
+    
+    plans = {}
+    skipped = 0
+    for schedule in group:
+        already_sent = sent_ids.get(schedule.id, set())
+        new_ids = tuple(
+            paper['entry_id'] for paper in papers
+            if published_at(paper) >= windows[schedule.id]
+            and paper['entry_id'] not in already_sent
+        )
+        if new_ids or schedule.last_sent is None:
+            plans.setdefault(new_ids, []).append(schedule)
+        else:
+            skipped += 1
+    return plans, skipped
+
+
+def enqueue_digest(session, digest, schedules):
+    """
+    다이제스트 하나를 여러 스케줄 수신자 앞으로 발송 대기열에 추가
+    
+    대기열 등록은 한 트랜잭션으로 묶고, 실패하면 수신자별로 다시 등록합니다.
+    
+    Returns:
+        (등록 건수, 실패 건수)
+    """
+    if digest['papers']:
+        try:
+            enqueue_emails(session, [(schedule.id, schedule.keyword, schedule.email) for schedule in schedules],
+                           digest['subject'], digest['body'], len(digest['papers']),
+                           timings=digest['trace'].to_dict(),
+                           paper_ids=[paper['entry_id'] for paper in digest['papers']],
+                           html_body=digest.get('html'))
+            return len(schedules), 0
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"발송 대기열 일괄 등록 실패, 수신자별로 다시 등록합니다: {e}")
+    
+    sent, failed = 0, 0
+    for schedule in schedules:
+        try:
+            success, error = deliver_digest(session, digest, schedule.keyword,
+                                            schedule.email, schedule.id)
+        except Exception as e:
+            session.rollback()
+            success, error = False, str(e)
+        
+        if success:
+            sent += 1
+        else:
+            failed += 1
+            print(f"[{datetime.now()}] 자동 발송 실패: {schedule.keyword} → {schedule.email} ({error})")
+    
+    return sent, failed
+
+
+def load_keyword_papers(session, keyword, since, batch_with=None):
+    """
+    발송 단계의 키워드 논문 목록 (준비 단계 결과가 있으면 사용)
+    
+    이번 회차 준비 결과가 없거나, 실패/일부 실패했거나, 검색 구간이 since까지
+    덮지 못하면 바로 검색합니다 (요약도 발송 단계에서 진행).
+    검색 오류는 빈 목록(새 논문 없음)으로 바꾸지 않고 SearchError로 올립니다.
+    
+    Returns:
+        (논문 목록, 준비 결과 사용 여부)
+    """
+    if is_prepare_enabled():
+        papers = load_prepared_digest(session, current_run_key(), normalize_keyword(keyword), since)
+        if papers is not None:
+            registry.inc('prepared_digests_total', result='hit')
+            return papers, True
+        registry.inc('prepared_digests_total', result='miss')
+    try:
+        return search_arxiv(keyword, since=since, batch_with=batch_with, raise_errors=True), False
+    except Exception as e:
+        raise SearchError(str(e)) from e
+
+
+def dispatch_keyword_group(session, group, batch_with=None):
+    """
+    키워드 그룹 하나 처리 (증분 다이제스트)
+    
+    그룹에서 가장 이른 검색 구간으로 한 번만 검색한 뒤, 스케줄마다 마지막 발송 이후
+    아직 보내지 않은 논문만 골라 같은 논문 묶음끼리 다이제스트를 한 번씩 생성합니다.
+    새 논문이 없는 스케줄은 Gemini 호출 없이 건너뜁니다.
+    준비 단계 결과가 있으면 검색/요약 없이 포맷팅과 대기열 등록만 합니다.
+    batch_with는 arXiv 질의에 함께 묶을 수 있는 다른 키워드 목록입니다.
+    
+    Returns:
+        (등록 건수, 실패 건수)
+    """
+    keyword = group[0].keyword
+    trace = Trace()
+    windows = {schedule.id: search_window(schedule) for schedule in group}
+    
+    with trace.stage('search'):
+        papers, prepared = load_keyword_papers(session, keyword, min(windows.values()), batch_with)
+    
+    plans, skipped = plan_incremental_digests(session, group, papers, windows)
+    if skipped:
+        print(f"[{datetime.now()}] 새 논문 없음: '{keyword}' 수신자 {skipped}명 건너뜀")
+    
+    sent, failed = 0, 0
+    for new_ids, schedules in plans.items():
+        new_papers = [paper for paper in papers if paper['entry_id'] in new_ids]
+        # 묶음마다 검색 단계 계측을 이어받아 다이제스트별로 기록
+        digest = build_digest(keyword, papers=new_papers, trace=Trace(trace.to_dict()),
+                              summarized=prepared and all(has_summary(paper) for paper in new_papers))
+        plan_sent, plan_failed = enqueue_digest(session, digest, schedules)
+        sent += plan_sent
+        failed += plan_failed
+    
+    return sent, failed
+
+
+def consolidated_keyword_label(keywords):
+    """통합 다이제스트 이력/대기열의 키워드 표시 (컬럼 길이 200자 이내)"""
+    label = ', '.join(keywords)
+    if len(label) > 200:
+        label = f"{keywords[0][:180]} 외 {len(keywords) - 1}개"
+    return label
+
+
+def dispatch_recipient_group(session, group, batch_with=None):
+    """
+    수신자 한 명의 통합 다이제스트 처리 (DIGEST_MODE=consolidated)
+    
+    구독 키워드마다 검색한 결과를 합치고 arXiv ID로 중복을 제거하여, 여러 키워드에
+    걸리는 논문도 한 번만 요약/포함합니다. 수신자의 어느 스케줄로든 이미 보낸 논문은
+    제외하며, 완성된 다이제스트는 한 통으로 발송 대기열에 등록합니다.
+    구독 키워드가 하나뿐이면 키워드 다이제스트와 같으므로 키워드 그룹 처리로 넘깁니다.
+    
+    Returns:
+        (등록 건수, 실패 건수)
+    """
+    keyword_groups = group_schedules_by_keyword(group)
+    if len(keyword_groups) == 1:
+        return dispatch_keyword_group(session, group, batch_with=batch_with)
+    
+    recipient = group[0].email
+    trace = Trace()
+    windows = {schedule.id: search_window(schedule) for schedule in group}
+    
+    results = {}
+    prepared_ids = set()
+    with trace.stage('search'):
+        for normalized, schedules in keyword_groups.items():
+            since = min(windows[schedule.id] for schedule in schedules)
+            papers, prepared = load_keyword_papers(session, schedules[0].keyword, since, batch_with)
+            results[normalized] = (since, papers)
+            if prepared:
+                prepared_ids.update(paper['entry_id'] for paper in papers)
+    
+    # 다른 키워드로 이미 받은 논문도 제외 (수신자의 모든 스케줄 발송 기록)
+    sent_ids = load_sent_paper_ids(session, list(windows),
+                                   [paper['entry_id'] for _, papers in results.values() for paper in papers])
+    already_sent = set().union(*sent_ids.values())
+    
+    keywords = []
+    merged = {}
+    paper_keywords = {}
+    for normalized, schedules in keyword_groups.items():
+        keyword = schedules[0].keyword
+        keywords.append(keyword)
+        since, papers = results[normalized]
+        for paper in papers:
+            entry_id = paper['entry_id']
+            if entry_id in already_sent or published_at(paper) < since:
+                continue
+            merged.setdefault(entry_id, paper)
+            paper_keywords.setdefault(entry_id, []).append(keyword)
+    
+    label = consolidated_keyword_label(keywords)
+    papers = list(merged.values())
+    if not papers:
+        if all(schedule.last_sent is not None for schedule in group):
+            print(f"[{datetime.now()}] 새 논문 없음: 통합 다이제스트 '{label}' 건너뜀")
+            return 0, 0
+        save_email_history(session, group[0].id, label, recipient, 0, 'failed',
+                           '최근 7일 이내 논문을 찾지 못했습니다.', None, timings=trace.to_dict())
+        registry.inc('emails_total', status='failed')
+        return 0, 1
+    
+    with trace.activate():
+        # 준비 단계에서 요약해 둔 논문은 건너뜀
+        pending = [paper for paper in papers if not (paper['entry_id'] in prepared_ids and has_summary(paper))]
+        if pending:
+            with trace.stage('summarize'):
+                summarizer.summarize_papers(pending)
+        
+        with trace.stage('format'):
+            subject = (f"[스터디레터] 구독 키워드 {len(keywords)}개 관련 최신 논문 "
+                       f"({datetime.now().strftime('%y/%m/%d')})")
+            rendered = render_combined_digest(keywords, papers, paper_keywords)
+    
+    try:
+        enqueue_email(session, group[0].id, label, recipient, subject, rendered['text'], len(papers),
+                      timings=trace.to_dict(), paper_ids=list(merged), html_body=rendered['html'],
+                      schedule_ids=[schedule.id for schedule in group])
+    except Exception as e:
+        session.rollback()
+        print(f"[{datetime.now()}] 자동 발송 실패: 통합 다이제스트 '{label}' "
+              f"({recipient_job_id(recipient.strip().lower())}, {e})")
+        return 0, 1
+    return 1, 0
+
+
+def record_search_failure(session, group, error, combined=False):
+    """
+    검색 오류를 실패 이력으로 기록 (새 논문 없음과 달리 last_sent는 그대로 두어 다음 발송에서 같은 구간을 다시 검색)
+    
+    Args:
+        combined: 통합 다이제스트면 수신자 한 명 앞으로 한 건만 기록
+    
+    Returns:
+        (등록 건수, 실패 건수)
+    """
+    error_msg = f"논문 검색 실패: {error}"
+    if combined:
+        keywords = [schedules[0].keyword for schedules in group_schedules_by_keyword(group).values()]
+        save_email_history(session, group[0].id, consolidated_keyword_label(keywords), group[0].email, 0,
+                           'failed', error_msg, None)
+        registry.inc('emails_total', status='failed')
+        return 0, 1
+    
+    for schedule in group:
+        save_email_history(session, schedule.id, schedule.keyword, schedule.email, 0, 'failed', error_msg, None)
+    registry.inc('emails_total', len(group), status='failed')
+    return 0, len(group)
+
+
+def dispatch_with_search_retries(session, group, dispatch_group, batch_with=None, combined=False):
+    """
+    검색 오류가 나면 잠시 후 다시 시도하는 그룹 발송 (arXiv 일시 장애 대비)
+    
+    DISPATCH_SEARCH_RETRIES(기본 2)번까지 DISPATCH_SEARCH_RETRY_DELAY(기본 60)초 간격을
+    늘려 가며 다시 시도하고, 모두 실패하면 실패 이력을 남깁니다.
+    
+    Returns:
+        (등록 건수, 실패 건수)
+    """
+    retries = int(os.getenv('DISPATCH_SEARCH_RETRIES', '2'))
+    delay = float(os.getenv('DISPATCH_SEARCH_RETRY_DELAY', '60'))
+    for attempt in range(retries + 1):
+        try:
+            return dispatch_group(session, group, batch_with=batch_with)
+        except SearchError as e:
+            session.rollback()
+            if attempt == retries:
+                return record_search_failure(session, group, e, combined=combined)
+            logger.warning(f"논문 검색 실패, {delay * (attempt + 1):.0f}초 후 다시 시도합니다 "
+                           f"({attempt + 1}/{retries}): {e}")
+            time.sleep(delay * (attempt + 1))
+
+
+def load_keyword_groups(session):
+    """활성 스케줄을 정규화된 키워드별로 묶어 조회"""
+    schedules = session.query(Schedule).filter_by(is_active=True).all()
+    return group_schedules_by_keyword(schedules)
+
+
+def dispatch_keyword(normalized):
+    """스케줄러 작업: 정규화된 키워드 하나의 주간 발송"""
+    session = get_session(engine)
+    
+    try:
+        groups = load_keyword_groups(session)
+        group = groups.get(normalized)
+        if not group:
+            return
+        
+        print(f"[{datetime.now()}] 키워드 발송 시작: '{normalized}' (수신자 {len(group)}명)")
+        sent, failed = dispatch_with_search_retries(session, group, dispatch_keyword_group, batch_with=list(groups))
+        print(f"[{datetime.now()}] 키워드 발송 대기열 등록 완료: '{normalized}' 등록 {sent}건, 실패 {failed}건")
+    finally:
+        session.close()
+
+
+def dispatch_recipient(recipient):
+    """스케줄러 작업 (DIGEST_MODE=consolidated): 수신자 한 명의 통합 주간 발송"""
+    session = get_session(engine)
+    
+    try:
+        schedules = session.query(Schedule).filter_by(is_active=True).all()
+        group = group_schedules_by_recipient(schedules).get(recipient)
+        if not group:
+            return
+        
+        print(f"[{datetime.now()}] 통합 발송 시작: 구독 {len(group)}개")
+        sent, failed = dispatch_with_search_retries(session, group, dispatch_recipient_group,
+                                                    batch_with=list(group_schedules_by_keyword(schedules)),
+                                                    combined=True)
+        print(f"[{datetime.now()}] 통합 발송 대기열 등록 완료: 등록 {sent}건, 실패 {failed}건")
+    finally:
+        session.close()
+
+
+def queue_keyword_dispatch(normalized):
+    """스케줄러 작업 (DISPATCH_MODE=sharded): 키워드 발송을 작업 항목으로만 등록"""
+    session = get_session(engine)
+    
+    try:
+        if enqueue_dispatch_items(session, current_run_key(), [normalized]):
+            print(f"[{datetime.now()}] 키워드 발송 작업 항목 등록: '{normalized}'")
+    finally:
+        session.close()
+
+
+def dispatch_work_item(session, item):
+    """
+    분산 발송 실행기가 점유한 작업 항목 처리
+    
+    임대 만료로 재점유된 항목이면 이전 점유에서 이미 발송 대기열에 등록한
+    수신자는 건너뜁니다. 검색 오류는 예외로 올려 실행기가 항목을 반납하고 다시 처리하게 하며,
+    마지막 점유(DISPATCH_MAX_ATTEMPTS)에서도 실패하면 실패 이력을 남깁니다.
+    
+    Returns:
+        (등록 건수, 실패 건수)
+    """
+    groups = load_keyword_groups(session)
+    group = groups.get(item.keyword, [])
+    
+    if item.attempts > 1 and group:
+        queued = {
+            schedule_id for (schedule_id,) in session.query(Outbox.schedule_id).filter(
+                Outbox.schedule_id.in_([schedule.id for schedule in group]),
+                Outbox.created_at >= item.created_at
+            )
+        }
+        group = [schedule for schedule in group if schedule.id not in queued]
+    
+    if not group:
+        return 0, 0
+    
+    print(f"[{datetime.now()}] 키워드 발송 시작: '{item.keyword}' (수신자 {len(group)}명, 항목 {item.id})")
+    try:
+        sent, failed = dispatch_keyword_group(session, group, batch_with=list(groups))
+    except SearchError as e:
+        if item.attempts < int(os.getenv('DISPATCH_MAX_ATTEMPTS', '3')):
+            raise
+        session.rollback()
+        sent, failed = record_search_failure(session, group, e)
+    print(f"[{datetime.now()}] 키워드 발송 대기열 등록 완료: '{item.keyword}' 등록 {sent}건, 실패 {failed}건")
+    return sent, failed
+
+
+def prepare_keyword_group(session, run_key, group, batch_with=None):
+    """
+    준비 단계: 키워드 그룹 하나의 검색 + 요약 결과 저장
+    
+    스케줄마다 보낼 논문(아직 보내지 않은 논문)만 요약해 두며, 발송 단계는 이 결과로
+    포맷팅과 대기열 등록만 합니다. 검색이 실패하면 'failed', 일부 요약이 실패하면
+    'incomplete'로 저장하여 발송 단계가 바로 검색/요약하도록 합니다.
+    
+    Returns:
+        저장한 상태 ('ready', 'incomplete', 'failed')
+    """
+    keyword = group[0].keyword
+    normalized = normalize_keyword(keyword)
+    trace = Trace()
+    windows = {schedule.id: search_window(schedule) for schedule in group}
+    since = min(windows.values())
+    
+    try:
+        with trace.activate():
+            with trace.stage('search'):
+                papers = search_arxiv(keyword, since=since, batch_with=batch_with, raise_errors=True)
+            plans, _ = plan_incremental_digests(session, group, papers, windows)
+            planned_ids = set().union(*plans)
+            pending = [paper for paper in papers if paper['entry_id'] in planned_ids]
+            with trace.stage('summarize'):
+                summarizer.summarize_papers(pending)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"다이제스트 준비 실패 ('{normalized}'): {e}")
+        save_prepared_digest(session, run_key, normalized, 'failed', timings=trace.to_dict(), error_msg=str(e))
+        return 'failed'
+    
+    failed_count = sum(1 for paper in pending if not has_summary(paper))
+    status = 'incomplete' if failed_count else 'ready'
+    save_prepared_digest(session, run_key, normalized, status, since=since, papers=papers,
+                         timings=trace.to_dict(),
+                         error_msg=f"요약 실패 {failed_count}편" if failed_count else None)
+    return status
+
+
+def _prepare_group(run_key, group, batch_with):
+    """준비 단계 스레드 작업 (스레드마다 세션 사용)"""
+    session = get_session(engine)
+    try:
+        return prepare_keyword_group(session, run_key, group, batch_with=batch_with)
+    finally:
+        session.close()
+
+
+def prepare_weekly_digests():
+    """
+    스케줄러 작업: 이번 회차 모든 키워드 다이제스트 준비 (발송 구간 전 새벽)
+    
+    키워드 그룹을 DIGEST_PREPARE_WORKERS(기본 4)개씩 동시에 준비하고,
+    2주보다 오래된 준비 결과는 정리합니다.
+    """
+    run_key = current_run_key()
+    session = get_session(engine)
+    try:
+        prune_prepared_digests(session, (date.fromisoformat(run_key) - timedelta(days=14)).isoformat())
+        groups = load_keyword_groups(session)
+    finally:
+        session.close()
+    
+    print(f"[{datetime.now()}] 다이제스트 준비 시작: 키워드 {len(groups)}개 (회차 {run_key})")
+    batch_with = list(groups)
+    with ThreadPoolExecutor(int(os.getenv('DIGEST_PREPARE_WORKERS', '4'))) as executor:
+        statuses = Counter(executor.map(lambda group: _prepare_group(run_key, group, batch_with), groups.values()))
+    print(f"[{datetime.now()}] 다이제스트 준비 완료: {dict(statuses)}")
+
+
+def sync_dispatch_jobs(scheduler):
+    """
+    활성 스케줄 기준으로 키워드별 발송 작업 동기화
+    
+    키워드마다 작업 하나를 두고 키워드별 고정 지터로 실행 시각을 분산합니다.
+    DISPATCH_MODE=sharded면 작업은 항목만 등록하고 처리는 모든 워커의 분산 발송 실행기가 맡습니다.
+    DIGEST_MODE=consolidated면 수신자마다 작업 하나를 둡니다 (리더 워커에서 실행).
+    DIGEST_PREPARE=true면 발송 구간 전에 다이제스트를 준비하는 작업도 둡니다.
+    
+    Args:
+        scheduler: StudyLetterScheduler
+    """
+    session = get_session(engine)
+    try:
+        schedules = session.query(Schedule).filter_by(is_active=True).all()
+    finally:
+        session.close()
+    
+    consolidated = is_consolidated_digest_enabled()
+    if consolidated:
+        wanted = {recipient_job_id(recipient): recipient
+                  for recipient in group_schedules_by_recipient(schedules)}
+        job_func = dispatch_recipient
+    else:
+        wanted = {dispatch_job_id(normalized): normalized
+                  for normalized in group_schedules_by_keyword(schedules)}
+        job_func = queue_keyword_dispatch if is_sharded_dispatch_enabled() else dispatch_keyword
+    
+    for job_id, target in wanted.items():
+        if not scheduler.scheduler.get_job(job_id):
+            # 작업 이름도 로그에 남으므로 수신자별 작업은 이메일 주소 대신 해시 작업 ID 사용
+            scheduler.add_dispatch_job(job_func, job_id=job_id, args=[target],
+                                       name=f"Weekly digest: {job_id if consolidated else target}")
+    
+    for job in scheduler.get_jobs():
+        if job.id.startswith('dispatch_') and job.id not in wanted:
+            scheduler.remove_job_by_id(job.id)
+    
+    if not is_prepare_enabled():
+        scheduler.remove_job_by_id(PREPARE_JOB_ID)
+    elif not scheduler.scheduler.get_job(PREPARE_JOB_ID):
+        scheduler.add_prepare_job(prepare_weekly_digests, job_id=PREPARE_JOB_ID)
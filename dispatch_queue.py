@@ -0,0 +1,276 @@
+"""
+분산 발송 작업 항목 (DISPATCH_MODE=sharded)
+- 리더 워커의 스케줄러는 키워드별 발송 시각에 작업 항목만 dispatch_items 테이블에 기록
+- 모든 워커 프로세스(여러 노드 포함)의 실행기가 항목을 임대로 점유하여 다이제스트 생성/발송 대기열 등록
+- 점유한 항목은 하트비트로 임대를 연장하고, 워커가 비정상 종료하여 임대가 만료되면 다른 워커가 재점유
+- 같은 DB(SQLite WAL 파일 또는 서버 DB)를 공유하면 워커 수만큼 키워드를 동시에 처리
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import logging
+import os
+from zoneinfo import ZoneInfo
+import socket
+import threading
+
+from database import DispatchItem, get_session
+from scheduler import TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+def is_sharded_dispatch_enabled():
+    """DISPATCH_MODE=sharded이면 키워드 발송을 작업 항목으로 나눠 모든 워커가 처리"""
+    return os.getenv('DISPATCH_MODE', 'local').lower() == 'sharded'
+
+
+def current_run_key(now=None):
+    """
+    발송 회차 키 (발송일 YYYY-MM-DD, 같은 날 같은 키워드는 한 번만 등록)
+
+    스케줄러 작업이 Asia/Seoul 기준으로 실행되므로 호스트 시간대(UTC 등)와 관계없이
+    한국 날짜를 씁니다 (월요일 새벽 준비 작업과 09:00 발송 작업이 같은 키를 사용).
+    """
+    return (now or datetime.now(ZoneInfo(TIMEZONE))).strftime('%Y-%m-%d')
+
+
+def enqueue_dispatch_items(session, run_key, keywords):
+    """
+    발송 회차의 키워드별 작업 항목 등록 (이미 등록된 키워드는 건너뜀)
+
+    리더가 바뀌어 같은 회차 작업이 다시 실행되어도 (run_key, keyword) 유일 제약으로
+    항목은 한 번만 만들어집니다.
+
+    Returns:
+        새로 등록된 항목 수
+    """
+    existing = {
+        keyword for (keyword,) in session.query(DispatchItem.keyword).filter(
+            DispatchItem.run_key == run_key, DispatchItem.keyword.in_(keywords)
+        )
+    }
+
+    added = 0
+    for keyword in keywords:
+        if keyword in existing:
+            continue
+        session.add(DispatchItem(run_key=run_key, keyword=keyword, status='pending', created_at=datetime.now()))
+        try:
+            session.commit()
+            added += 1
+        except IntegrityError:
+            # 다른 워커가 먼저 등록한 경우
+            session.rollback()
+    return added
+
+
+def get_dispatch_progress(session, run_key):
+    """발송 회차 진행 상황 {상태: 항목 수}"""
+    rows = session.query(DispatchItem.status, func.count(DispatchItem.id)).filter(
+        DispatchItem.run_key == run_key
+    ).group_by(DispatchItem.status).all()
+    return dict(rows)
+
+
+class DispatchRunner:
+    """분산 발송 작업 항목 실행기 (임대 + 하트비트)"""
+
+    def __init__(self, engine, process_func, workers=2, batch_size=1, lease_ttl=120,
+                 heartbeat_interval=None, poll_interval=2, max_attempts=3, owner=None):
+        """
+        Args:
+            engine: SQLAlchemy 엔진
+            process_func: 항목 처리 함수 (session, item) -> (등록 건수, 실패 건수)
+                          (digest.dispatch_work_item)
+            workers: 동시에 처리할 항목 수 (스레드 수)
+            batch_size: 스레드가 한 번에 점유할 항목 수
+            lease_ttl: 임대 유효 시간 (초), 하트비트가 끊기면 이 시간 뒤 다른 워커가 재점유
+            heartbeat_interval: 임대 연장 간격 (초, 기본 lease_ttl / 3)
+            poll_interval: 대기 항목이 없을 때 조회 간격 (초)
+            max_attempts: 최대 점유 횟수 (임대 만료로 재점유될 때마다 증가)
+            owner: 이 프로세스 식별자 (기본: 호스트명:PID)
+        """
+        self.engine = engine
+        self.process_func = process_func
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval or max(1.0, lease_ttl / 3)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """실행 스레드와 하트비트 스레드 시작"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"dispatch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="dispatch-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logger.info(f"분산 발송 실행기 {self.workers}개가 시작되었습니다. ({self.owner})")
+
+    def stop(self, timeout=None):
+        """실행 스레드 종료 (처리 중인 항목은 끝까지 처리, 아직 시작하지 않은 항목은 반납)"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info("분산 발송 실행기가 종료되었습니다.")
+
+    def claim_batch(self, session):
+        """
+        처리할 항목을 최대 batch_size개 점유
+
+        조건부 UPDATE로 점유하므로 여러 워커 프로세스가 동시에 조회해도
+        한 항목은 한 워커만 점유합니다. 임대가 만료된 항목은 재점유하되,
+        max_attempts번 점유되고도 끝나지 않은 항목은 실패로 처리합니다.
+        """
+        now = datetime.now()
+        lease = {'lease_owner': self.owner, 'lease_expires_at': now + timedelta(seconds=self.lease_ttl)}
+
+        candidates = session.query(DispatchItem.id, DispatchItem.status, DispatchItem.attempts).filter(
+            (DispatchItem.status == 'pending') |
+            ((DispatchItem.status == 'claimed') & (DispatchItem.lease_expires_at < now))
+        ).order_by(DispatchItem.id.asc()).limit(self.batch_size * 2).all()
+
+        claimed_ids = []
+        for item_id, status, attempts in candidates:
+            query = session.query(DispatchItem).filter(DispatchItem.id == item_id, DispatchItem.status == status)
+            if status == 'claimed':
+                query = query.filter(DispatchItem.lease_expires_at < now)
+
+            if status == 'claimed' and attempts >= self.max_attempts:
+                if query.update({'status': 'failed', 'finished_at': now,
+                                 'error_message': f'임대 만료 {attempts}회 (워커 비정상 종료 반복)'},
+                                synchronize_session=False):
+                    logger.warning(f"분산 발송 항목 실패 처리 (ID: {item_id}, 점유 {attempts}회)")
+                session.commit()
+                continue
+
+            claimed = query.update(
+                dict(lease, status='claimed', claimed_at=now, attempts=DispatchItem.attempts + 1),
+                synchronize_session=False
+            )
+            session.commit()
+            if claimed:
+                if status == 'claimed':
+                    logger.info(f"임대가 만료된 분산 발송 항목 재점유 (ID: {item_id})")
+                claimed_ids.append(item_id)
+                if len(claimed_ids) >= self.batch_size:
+                    break
+
+        if not claimed_ids:
+            return []
+        return session.query(DispatchItem).filter(DispatchItem.id.in_(claimed_ids)).order_by(DispatchItem.id).all()
+
+    def heartbeat(self):
+        """이 워커가 점유한 항목의 임대 연장 (연장한 항목 수)"""
+        session = get_session(self.engine)
+        try:
+            extended = session.query(DispatchItem).filter(
+                DispatchItem.lease_owner == self.owner, DispatchItem.status == 'claimed'
+            ).update(
+                {'lease_expires_at': datetime.now() + timedelta(seconds=self.lease_ttl)},
+                synchronize_session=False
+            )
+            session.commit()
+            return extended
+        finally:
+            session.close()
+
+    def _finish(self, session, item, values):
+        """임대를 가진 경우에만 항목 상태 기록 (임대를 잃었으면 False)"""
+        updated = session.query(DispatchItem).filter(
+            DispatchItem.id == item.id,
+            DispatchItem.lease_owner == self.owner,
+            DispatchItem.status == 'claimed'
+        ).update(dict(values, lease_expires_at=None), synchronize_session=False)
+        session.commit()
+        if not updated:
+            logger.warning(f"분산 발송 항목의 임대를 잃었습니다 (ID: {item.id}, 다른 워커가 재점유)")
+        return bool(updated)
+
+    def execute(self, session, item):
+        """점유한 항목 처리 및 결과 기록"""
+        try:
+            sent, failed = self.process_func(session, item)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"분산 발송 항목 처리 실패 (ID: {item.id}, '{item.keyword}'): {e}")
+            # 재시도 횟수가 남았으면 반납하여 다른 워커가 다시 처리
+            status = 'pending' if item.attempts < self.max_attempts else 'failed'
+            self._finish(session, item, {
+                'status': status,
+                'error_message': str(e),
+                'finished_at': datetime.now() if status == 'failed' else None
+            })
+            return False
+
+        return self._finish(session, item, {
+            'status': 'done',
+            'sent': sent,
+            'failed': failed,
+            'error_message': None,
+            'finished_at': datetime.now()
+        })
+
+    def release(self, session, item):
+        """처리하지 않은 항목 반납 (점유 횟수도 되돌림)"""
+        self._finish(session, item, {'status': 'pending', 'attempts': DispatchItem.attempts - 1})
+
+    def _run(self):
+        """실행 루프"""
+        while not self._stop.is_set():
+            session = get_session(self.engine)
+            try:
+                items = self.claim_batch(session)
+                if not items:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                for item in items:
+                    if self._stop.is_set():
+                        self.release(session, item)
+                    else:
+                        self.execute(session, item)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"분산 발송 실행기 오류: {e}")
+                self._stop.wait(self.poll_interval)
+            finally:
+                session.close()
+
+    def _heartbeat_loop(self):
+        """하트비트 루프"""
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"분산 발송 하트비트 오류: {e}")
+
+
+# 전역 분산 발송 실행기 인스턴스
+_runner_instance = None
+_runner_lock = threading.Lock()
+
+
+def get_dispatch_runner(engine, process_func):
+    """분산 발송 실행기 싱글톤 인스턴스 반환 (처음 호출 시 시작)"""
+    global _runner_instance
+    with _runner_lock:
+        if _runner_instance is None:
+            _runner_instance = DispatchRunner(
+                engine,
+                process_func,
+                workers=int(os.getenv('DISPATCH_WORKERS', '2')),
+                batch_size=int(os.getenv('DISPATCH_CLAIM_BATCH', '1')),
+                lease_ttl=int(os.getenv('DISPATCH_LEASE_TTL', '120')),
+                max_attempts=int(os.getenv('DISPATCH_MAX_ATTEMPTS', '3'))
+            )
+            _runner_instance.start()
+        return _runner_instance
@@ -0,0 +1,363 @@
+"""
+이메일 템플릿 렌더러
+- string.Template을 모듈 로드 시 한 번만 컴파일해 두고 다이제스트 공통 본문(텍스트/HTML)을 렌더링
+- 같은 키워드/날짜/논문의 공통 본문은 캐시하여 발송 회차마다 한 번만 렌더링
+- 수신자마다 달라지는 꼬리말(수신 주소, 구독 해지 링크)은 발송 시 따로 렌더링하여 공통 본문 뒤에 붙임
+- 통합 다이제스트(DIGEST_MODE=consolidated)는 수신자의 여러 구독 키워드 논문을 한 본문으로 렌더링
+- EMAIL_HTML=true면 HTML 본문도 함께 생성 (multipart/alternative)
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from string import Template
+from urllib.parse import urlencode
+import hashlib
+import hmac
+import html
+import os
+import threading
+
+RULE = '=' * 70
+DIVIDER = '-' * 70
+
+TEXT_INTRO = Template("""
+스터디레터 - '$keyword' 관련 최신 논문 ($today)
+$rule
+
+안녕하세요!
+
+'$keyword' 키워드로 검색된 최근 7일 이내 논문 ${count}편을 요약해드립니다.
+
+$rule
+
+""")
+
+TEXT_PAPER = Template("""
+[논문 $index]
+제목: $title
+저자: $authors
+링크: $pdf_url
+발표일: $published
+
+📝 Gemini 요약:
+$summary
+
+$divider
+
+""")
+
+TEXT_COMBINED_INTRO = Template("""
+스터디레터 - 구독 키워드 ${keyword_count}개 관련 최신 논문 ($today)
+$rule
+
+안녕하세요!
+
+$keywords 키워드로 검색된 최근 7일 이내 논문 ${count}편을 요약해드립니다.
+여러 키워드에 해당하는 논문은 한 번만 포함했습니다.
+
+$rule
+
+""")
+
+TEXT_COMBINED_PAPER = Template("""
+[논문 $index]
+제목: $title
+저자: $authors
+링크: $pdf_url
+발표일: $published
+키워드: $paper_keywords
+
+📝 Gemini 요약:
+$summary
+
+$divider
+
+""")
+
+TEXT_OUTRO = """
+
+이 이메일은 스터디레터 서비스를 통해 자동으로 생성되었습니다.
+Powered by arXiv & Google Gemini
+
+"""
+
+TEXT_FOOTER = Template("""$divider
+이 메일은 $recipient 주소로 발송되었습니다.
+""")
+
+TEXT_UNSUBSCRIBE = Template("""구독 해지: $url
+""")
+
+HTML_INTRO = Template("""<h2 style="margin:0 0 4px">스터디레터 - '$keyword' 관련 최신 논문</h2>
+<p style="color:#666;margin:0 0 16px">$today · 최근 7일 이내 논문 ${count}편</p>
+""")
+
+HTML_PAPER = Template("""<div style="border-top:1px solid #ddd;padding:12px 0">
+<h3 style="margin:0 0 4px">[논문 $index] <a href="$pdf_url">$title</a></h3>
+<p style="color:#666;margin:0 0 8px">$authors · $published</p>
+<p style="margin:0">$summary</p>
+</div>
+""")
+
+HTML_COMBINED_INTRO = Template("""<h2 style="margin:0 0 4px">스터디레터 - 구독 키워드 ${keyword_count}개 관련 최신 논문</h2>
+<p style="color:#666;margin:0 0 16px">$today · $keywords · 최근 7일 이내 논문 ${count}편</p>
+""")
+
+HTML_COMBINED_PAPER = Template("""<div style="border-top:1px solid #ddd;padding:12px 0">
+<h3 style="margin:0 0 4px">[논문 $index] <a href="$pdf_url">$title</a></h3>
+<p style="color:#666;margin:0 0 8px">$authors · $published · 키워드: $paper_keywords</p>
+<p style="margin:0">$summary</p>
+</div>
+""")
+
+HTML_OUTRO = """<p style="color:#999;font-size:12px;border-top:1px solid #ddd;padding-top:12px">
+이 이메일은 스터디레터 서비스를 통해 자동으로 생성되었습니다.<br>Powered by arXiv &amp; Google Gemini</p>
+"""
+
+HTML_OPEN = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"></head>
+<body style="font-family:sans-serif;line-height:1.5;max-width:720px;margin:0 auto">
+"""
+
+HTML_FOOTER = Template("""<p style="color:#999;font-size:12px">이 메일은 $recipient 주소로 발송되었습니다.$unsubscribe</p>
+""")
+
+HTML_UNSUBSCRIBE = Template(""" <a href="$url" style="color:#999">구독 해지</a>""")
+
+HTML_CLOSE = """</body></html>
+"""
+
+
+def is_html_enabled():
+    """EMAIL_HTML=true면 HTML 본문도 생성"""
+    return os.getenv('EMAIL_HTML', 'false').lower() == 'true'
+
+
+def _author_line(authors):
+    """저자 3명까지 + 외 N명"""
+    author_str = ', '.join(authors[:3])
+    if len(authors) > 3:
+        author_str += f" 외 {len(authors) - 3}명"
+    return author_str
+
+
+def _paper_fields(paper):
+    """논문 템플릿 공통 값 (텍스트)"""
+    return {
+        'title': paper['title'],
+        'authors': _author_line(paper['authors']),
+        'pdf_url': paper['pdf_url'],
+        'published': paper['published'].strftime('%Y-%m-%d'),
+        'summary': paper['summary']
+    }
+
+
+def _html_paper_fields(paper):
+    """논문 템플릿 공통 값 (HTML, 이스케이프 적용)"""
+    return {
+        'title': html.escape(paper['title']),
+        'authors': html.escape(_author_line(paper['authors'])),
+        'pdf_url': html.escape(paper['pdf_url'] or '', quote=True),
+        'published': paper['published'].strftime('%Y-%m-%d'),
+        'summary': html.escape(paper['summary']).replace('\n', '<br>\n')
+    }
+
+
+def _quoted_keywords(keywords):
+    """'a', 'b' 형식의 키워드 목록"""
+    return ', '.join(f"'{keyword}'" for keyword in keywords)
+
+
+def render_text(keyword, papers, today):
+    """텍스트 공통 본문"""
+    parts = [TEXT_INTRO.substitute(keyword=keyword, today=today, count=len(papers), rule=RULE)]
+    for idx, paper in enumerate(papers, 1):
+        parts.append(TEXT_PAPER.substitute(_paper_fields(paper), index=idx, divider=DIVIDER))
+    parts.append(TEXT_OUTRO)
+    return ''.join(parts)
+
+
+def render_html(keyword, papers, today):
+    """HTML 공통 본문 (닫는 태그는 수신자별 꼬리말과 함께 붙임)"""
+    parts = [HTML_OPEN, HTML_INTRO.substitute(keyword=html.escape(keyword), today=today, count=len(papers))]
+    for idx, paper in enumerate(papers, 1):
+        parts.append(HTML_PAPER.substitute(_html_paper_fields(paper), index=idx))
+    parts.append(HTML_OUTRO)
+    return ''.join(parts)
+
+
+def render_combined_text(keywords, papers, paper_keywords, today):
+    """통합 다이제스트 텍스트 본문"""
+    parts = [TEXT_COMBINED_INTRO.substitute(keyword_count=len(keywords), keywords=_quoted_keywords(keywords),
+                                            today=today, count=len(papers), rule=RULE)]
+    for idx, paper in enumerate(papers, 1):
+        parts.append(TEXT_COMBINED_PAPER.substitute(
+            _paper_fields(paper), index=idx, divider=DIVIDER,
+            paper_keywords=', '.join(paper_keywords[paper['entry_id']])
+        ))
+    parts.append(TEXT_OUTRO)
+    return ''.join(parts)
+
+
+def render_combined_html(keywords, papers, paper_keywords, today):
+    """통합 다이제스트 HTML 본문 (닫는 태그는 수신자별 꼬리말과 함께 붙임)"""
+    parts = [HTML_OPEN, HTML_COMBINED_INTRO.substitute(
+        keyword_count=len(keywords), keywords=html.escape(_quoted_keywords(keywords)),
+        today=today, count=len(papers)
+    )]
+    for idx, paper in enumerate(papers, 1):
+        parts.append(HTML_COMBINED_PAPER.substitute(
+            _html_paper_fields(paper), index=idx,
+            paper_keywords=html.escape(', '.join(paper_keywords[paper['entry_id']]))
+        ))
+    parts.append(HTML_OUTRO)
+    return ''.join(parts)
+
+
+class _RenderCache:
+    """공통 본문 LRU 캐시 (키워드, 날짜, 논문/요약 기준)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_render_cache = _RenderCache()
+
+
+def _render_key(keyword, papers, today, with_html, paper_keywords=None):
+    """공통 본문 캐시 키 (요약이 바뀌면 다른 키)"""
+    digest = hashlib.sha256()
+    for paper in papers:
+        digest.update(paper['entry_id'].encode('utf-8'))
+        digest.update(paper['summary'].encode('utf-8'))
+        if paper_keywords is not None:
+            digest.update('\0'.join(paper_keywords[paper['entry_id']]).encode('utf-8'))
+    return (keyword, today, with_html, digest.hexdigest())
+
+
+def render_digest(keyword, papers, today=None):
+    """
+    다이제스트 공통 본문 렌더링 (수신자와 무관한 부분, 캐시 적용)
+
+    Returns:
+        {'text': 텍스트 본문, 'html': HTML 본문 (EMAIL_HTML이 꺼져 있으면 None)}
+    """
+    today = today or datetime.now().strftime('%Y년 %m월 %d일')
+    with_html = is_html_enabled()
+    key = _render_key(keyword, papers, today, with_html)
+
+    rendered = _render_cache.get(key)
+    if rendered is None:
+        rendered = {
+            'text': render_text(keyword, papers, today),
+            'html': render_html(keyword, papers, today) if with_html else None
+        }
+        _render_cache.put(key, rendered)
+    return rendered
+
+
+def render_combined_digest(keywords, papers, paper_keywords, today=None):
+    """
+    통합 다이제스트 공통 본문 렌더링 (수신자 한 명의 여러 구독 키워드, 캐시 적용)
+
+    Args:
+        keywords: 구독 키워드 목록 (표시 순서)
+        papers: arXiv ID로 중복을 제거한 논문 목록
+        paper_keywords: {arXiv ID: 해당 논문이 검색된 키워드 목록}
+
+    Returns:
+        {'text': 텍스트 본문, 'html': HTML 본문 (EMAIL_HTML이 꺼져 있으면 None)}
+    """
+    today = today or datetime.now().strftime('%Y년 %m월 %d일')
+    with_html = is_html_enabled()
+    key = _render_key(tuple(keywords), papers, today, with_html, paper_keywords)
+
+    rendered = _render_cache.get(key)
+    if rendered is None:
+        rendered = {
+            'text': render_combined_text(keywords, papers, paper_keywords, today),
+            'html': render_combined_html(keywords, papers, paper_keywords, today) if with_html else None
+        }
+        _render_cache.put(key, rendered)
+    return rendered
+
+
+def unsubscribe_value(schedule_ids):
+    """구독 해지 링크의 스케줄 ID 값 (통합 다이제스트는 포함된 스케줄 모두, 쉼표 구분)"""
+    return ','.join(str(schedule_id) for schedule_id in sorted(set(schedule_ids)))
+
+
+def parse_unsubscribe_value(value):
+    """구독 해지 링크의 스케줄 ID 값 해석 (형식이 잘못되면 None)"""
+    parts = (value or '').split(',')
+    if not all(part.isdigit() for part in parts):
+        return None
+    return [int(part) for part in parts]
+
+
+def unsubscribe_token(value):
+    """구독 해지 링크 서명 (UNSUBSCRIBE_SECRET 기준 HMAC, 스케줄 ID 값 전체에 서명)"""
+    secret = os.getenv('UNSUBSCRIBE_SECRET', '')
+    return hmac.new(secret.encode('utf-8'), str(value).encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def verify_unsubscribe_token(value, token):
+    """구독 해지 링크 서명 확인"""
+    if not os.getenv('UNSUBSCRIBE_SECRET'):
+        return False
+    return hmac.compare_digest(unsubscribe_token(value), token or '')
+
+
+def unsubscribe_url(schedule_ids):
+    """
+    구독 해지 링크 (APP_BASE_URL과 UNSUBSCRIBE_SECRET이 모두 설정된 경우만, 아니면 None)
+
+    웹 화면(app.py)이 ?unsubscribe=<스케줄 ID 목록>&token=<서명>을 받아 목록의 자동화를
+    모두 비활성화합니다 (통합 다이제스트는 메일에 포함된 모든 자동화).
+    """
+    base_url = os.getenv('APP_BASE_URL')
+    if not schedule_ids or not base_url or not os.getenv('UNSUBSCRIBE_SECRET'):
+        return None
+    value = unsubscribe_value(schedule_ids)
+    query = urlencode({'unsubscribe': value, 'token': unsubscribe_token(value)})
+    return f"{base_url.rstrip('/')}/?{query}"
+
+
+def render_footer(recipient, schedule_ids=None):
+    """
+    수신자별 꼬리말
+
+    Args:
+        schedule_ids: 메일에 포함된 자동화 ID 목록 (단발성 발송이면 None, 구독 해지 링크 없음)
+
+    Returns:
+        {'text': 텍스트 꼬리말, 'html': HTML 꼬리말 (닫는 태그 포함), 'unsubscribe_url': 구독 해지 링크 또는 None}
+    """
+    url = unsubscribe_url(schedule_ids)
+    text = TEXT_FOOTER.substitute(divider=DIVIDER, recipient=recipient)
+    if url:
+        text += TEXT_UNSUBSCRIBE.substitute(url=url)
+    return {
+        'text': text,
+        'html': HTML_FOOTER.substitute(
+            recipient=html.escape(recipient),
+            unsubscribe=HTML_UNSUBSCRIBE.substitute(url=html.escape(url, quote=True)) if url else ''
+        ) + HTML_CLOSE,
+        'unsubscribe_url': url
+    }
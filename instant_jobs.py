@@ -0,0 +1,197 @@
+"""
+단발성 발송 작업
+- 웹(Streamlit)은 작업을 instant_jobs 테이블에 등록하고 작업 ID만 받아 상태를 조회
+- 워커 프로세스의 작업 실행기가 행을 점유하여 실행하고 진행 상황을 기록
+- 예약 발송과 같은 프로세스에서 실행되므로 Gemini 호출 한도와 요약/검색 캐시를 공유
+"""
+
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+
+from database import InstantJob, get_session
+
+logger = logging.getLogger(__name__)
+
+# 완료/실패로 끝난 작업 상태
+FINISHED_STATUSES = ('success', 'failed')
+
+
+def submit_instant_job(session, keyword, recipient):
+    """단발성 발송 작업 등록 후 작업 ID 반환"""
+    job = InstantJob(
+        keyword=keyword,
+        recipient=recipient,
+        status='queued',
+        created_at=datetime.now()
+    )
+    session.add(job)
+    session.commit()
+    return job.id
+
+
+def get_instant_job(session, job_id):
+    """
+    작업 상태 조회
+
+    Returns:
+        {'id', 'keyword', 'recipient', 'status', 'total', 'done', 'papers', 'error_message',
+         'created_at', 'finished_at'} 또는 None
+    """
+    job = session.get(InstantJob, job_id)
+    if job is None:
+        return None
+    return {
+        'id': job.id,
+        'keyword': job.keyword,
+        'recipient': job.recipient,
+        'status': job.status,
+        'total': job.total,
+        'done': job.done,
+        'papers': json.loads(job.papers) if job.papers else [],
+        'error_message': job.error_message,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at
+    }
+
+
+class InstantJobRunner:
+    """단발성 발송 작업 실행기 (스레드 수로 동시 실행 수 제한)"""
+
+    def __init__(self, engine, pipeline_func, workers=2, poll_interval=1, claim_timeout=600):
+        """
+        Args:
+            engine: SQLAlchemy 엔진
+            pipeline_func: 발송 파이프라인 (keyword, recipient) -> 단계별 이벤트 generator
+                           (digest.stream_instant_digest)
+            workers: 동시에 실행할 작업 수
+            poll_interval: 대기 작업이 없을 때 조회 간격 (초)
+            claim_timeout: 'running' 상태로 이 시간(초) 넘게 남은 작업은 재점유 (워커 비정상 종료 대비)
+        """
+        self.engine = engine
+        self.pipeline_func = pipeline_func
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """실행 스레드 시작"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"instant-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"단발성 발송 실행기 {self.workers}개가 시작되었습니다.")
+
+    def stop(self, timeout=None):
+        """실행 스레드 종료 (진행 중인 작업은 끝까지 실행)"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info("단발성 발송 실행기가 종료되었습니다.")
+
+    def claim_next(self, session):
+        """
+        실행할 작업 하나를 점유
+
+        조건부 UPDATE로 상태를 바꾸므로 여러 워커 프로세스가 동시에 조회해도
+        한 작업은 한 실행기만 점유합니다.
+        """
+        now = datetime.now()
+        stale_before = now - timedelta(seconds=self.claim_timeout)
+
+        candidates = session.query(InstantJob.id, InstantJob.status).filter(
+            (InstantJob.status == 'queued') |
+            ((InstantJob.status == 'running') & (InstantJob.claimed_at < stale_before))
+        ).order_by(InstantJob.id.asc()).limit(self.workers * 2).all()
+
+        for job_id, status in candidates:
+            query = session.query(InstantJob).filter(InstantJob.id == job_id, InstantJob.status == status)
+            if status == 'running':
+                query = query.filter(InstantJob.claimed_at < stale_before)
+            claimed = query.update(
+                {'status': 'running', 'claimed_at': now},
+                synchronize_session=False
+            )
+            session.commit()
+            if claimed:
+                return session.query(InstantJob).filter_by(id=job_id).first()
+
+        return None
+
+    def execute(self, session, job):
+        """점유한 작업 실행 및 진행 상황 기록"""
+        finished = []
+
+        for event in self.pipeline_func(job.keyword, job.recipient):
+            if event['type'] == 'papers':
+                job.total = len(event['papers'])
+                if not event['papers']:
+                    job.status = 'failed'
+                    job.error_message = '최근 7일 이내 논문을 찾지 못했습니다.'
+            elif event['type'] == 'summary':
+                paper = event['paper']
+                finished.append({
+                    'index': event['index'],
+                    'title': paper['title'],
+                    'pdf_url': paper['pdf_url'],
+                    'summary': paper['summary']
+                })
+                job.done = event['done']
+                job.papers = json.dumps(finished, ensure_ascii=False)
+            elif event['type'] == 'sent':
+                job.status = 'success' if event['success'] else 'failed'
+                job.error_message = event['error']
+            session.commit()
+
+        job.finished_at = datetime.now()
+        session.commit()
+
+    def _run(self):
+        """실행 루프"""
+        while not self._stop.is_set():
+            session = get_session(self.engine)
+            try:
+                job = self.claim_next(session)
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                try:
+                    self.execute(session, job)
+                except Exception as e:
+                    session.rollback()
+                    logger.error(f"단발성 발송 작업 실패 (ID: {job.id}): {e}")
+                    job.status = 'failed'
+                    job.error_message = str(e)
+                    job.finished_at = datetime.now()
+                    session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"단발성 발송 실행기 오류: {e}")
+                self._stop.wait(self.poll_interval)
+            finally:
+                session.close()
+
+
+# 전역 단발성 발송 실행기 인스턴스
+_runner_instance = None
+_runner_lock = threading.Lock()
+
+
+def get_instant_job_runner(engine, pipeline_func):
+    """단발성 발송 실행기 싱글톤 인스턴스 반환 (처음 호출 시 시작)"""
+    global _runner_instance
+    with _runner_lock:
+        if _runner_instance is None:
+            _runner_instance = InstantJobRunner(
+                engine,
+                pipeline_func,
+                workers=int(os.getenv('INSTANT_JOB_WORKERS', '2'))
+            )
+            _runner_instance.start()
+        return _runner_instance
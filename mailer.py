@@ -0,0 +1,258 @@
+"""
+메일 발송 모듈
+- 로그인된 SMTP 연결을 작은 풀로 유지하여 여러 메시지에 재사용
+- 서버가 연결을 끊으면 재연결 후 재시도
+- 연결당 최대 메시지 수 제한 (초과 시 새 연결)
+- 발송 직전 작업(요약 등)과 겹쳐서 연결을 미리 열어 두는 사전 연결
+- 다이제스트 공통 본문은 한 번만 인코딩하고 수신자별 꼬리말만 따로 인코딩하여 이어 붙임
+"""
+
+from email.mime.multipart import MIMEMultipart
+from email.mime.nonmultipart import MIMENonMultipart
+from functools import lru_cache
+import base64
+import logging
+import os
+import smtplib
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# base64 한 줄(76자)에 들어가는 원본 바이트 수
+BASE64_LINE_BYTES = 57
+
+
+@lru_cache(maxsize=128)
+def encode_shared_body(body):
+    """
+    공통 본문 base64 인코딩 (본문 내용별로 한 번만 수행)
+
+    바이트 수를 57의 배수로 맞춰 두면 인코딩 결과가 줄 단위로 끝나므로
+    수신자별 꼬리말의 인코딩 결과를 그대로 이어 붙일 수 있습니다.
+    부족한 바이트는 마지막 줄바꿈 앞에 공백으로 채웁니다 (텍스트/HTML 모두 보이지 않음).
+    """
+    data = body.encode('utf-8')
+    pad = -len(data) % BASE64_LINE_BYTES
+    if pad:
+        stripped = data.rstrip(b'\n')
+        data = stripped + b' ' * pad + data[len(stripped):]
+    return base64.encodebytes(data).decode('ascii')
+
+
+def _text_part(subtype, body, footer=None):
+    """미리 인코딩한 공통 본문 + 꼬리말로 text/* 파트 생성"""
+    part = MIMENonMultipart('text', subtype, charset='utf-8')
+    part['Content-Transfer-Encoding'] = 'base64'
+    payload = encode_shared_body(body)
+    if footer:
+        payload += base64.encodebytes(footer.encode('utf-8')).decode('ascii')
+    part.set_payload(payload)
+    return part
+
+
+def build_message(sender, recipient, subject, body, html_body=None, footer=None, html_footer=None,
+                  headers=None):
+    """
+    이메일 메시지 생성
+
+    Args:
+        body: 텍스트 공통 본문 (같은 다이제스트의 수신자 모두 동일, 인코딩 결과 캐시)
+        html_body: HTML 공통 본문 (있으면 multipart/alternative로 텍스트와 함께 첨부)
+        footer: 수신자별 텍스트 꼬리말
+        html_footer: 수신자별 HTML 꼬리말
+        headers: 추가 헤더 (List-Unsubscribe 등)
+    """
+    message = MIMEMultipart()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    for name, value in (headers or {}).items():
+        message[name] = value
+
+    text_part = _text_part('plain', body, footer)
+    if html_body is None:
+        message.attach(text_part)
+    else:
+        alternative = MIMEMultipart('alternative')
+        alternative.attach(text_part)
+        alternative.attach(_text_part('html', html_body, html_footer))
+        message.attach(alternative)
+    return message
+
+
+class _PooledConnection:
+    """풀에서 관리하는 SMTP 연결 하나"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """로그인된 SMTP 연결 풀"""
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=True,
+                 pool_size=2, max_messages_per_connection=100, timeout=30):
+        """
+        Args:
+            host: SMTP 서버 주소
+            port: SMTP 포트
+            username: 로그인 계정 (None이면 로그인 생략, 로컬 테스트 서버용)
+            password: 로그인 비밀번호
+            use_ssl: SMTP_SSL 사용 여부
+            pool_size: 최대 동시 연결 수
+            max_messages_per_connection: 연결 하나로 보낼 최대 메시지 수
+            timeout: 소켓 타임아웃 (초)
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.pool_size = pool_size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.timeout = timeout
+
+        self._idle = []
+        self._open_count = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        """새 SMTP 연결 생성 및 로그인"""
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+        try:
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+
+        logger.info(f"SMTP 연결 생성: {self.host}:{self.port}")
+        return _PooledConnection(smtp)
+
+    def _acquire(self):
+        """유휴 연결을 꺼내거나 새로 만듦 (풀이 가득 차면 대기)"""
+        with self._cond:
+            while not self._idle and self._open_count >= self.pool_size:
+                self._cond.wait()
+
+            if self._idle:
+                return self._idle.pop()
+            self._open_count += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open_count -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn, discard=False):
+        """연결 반납 (discard면 닫고 버림)"""
+        if discard:
+            conn.close()
+
+        with self._cond:
+            if discard:
+                self._open_count -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def send(self, message):
+        """
+        메시지 발송
+
+        연결이 끊겨 있으면 한 번 재연결하여 다시 보냅니다.
+        """
+        conn = self._acquire()
+
+        for attempt in range(2):
+            try:
+                conn.smtp.send_message(message)
+                break
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self._release(conn, discard=True)
+                if attempt == 1:
+                    raise
+                logger.info(f"SMTP 연결이 끊겨 재연결합니다: {e}")
+                conn = self._acquire()
+            except Exception:
+                # 수신자 거부 등은 연결 자체는 정상이므로 반납
+                self._release(conn)
+                raise
+
+        conn.sent += 1
+        self._release(conn, discard=conn.sent >= self.max_messages_per_connection)
+
+    def prewarm(self):
+        """
+        발송 전에 연결을 미리 열어 둠 (TLS 핸드셰이크/로그인을 발송 경로에서 제외)
+
+        유휴 연결이 이미 있거나 풀이 가득 차 있으면 아무것도 하지 않습니다.
+        실패해도 예외를 내지 않으며, 실제 발송 때 다시 연결을 시도합니다.
+        """
+        with self._cond:
+            if self._idle or self._open_count >= self.pool_size:
+                return
+            self._open_count += 1
+
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.info(f"SMTP 사전 연결 실패: {e}")
+            with self._cond:
+                self._open_count -= 1
+                self._cond.notify()
+            return
+
+        self._release(conn)
+
+    def close(self):
+        """유휴 연결 모두 종료"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+
+        for conn in idle:
+            conn.close()
+
+
+# 전역 메일 풀 인스턴스
+_mail_pool_instance = None
+_mail_pool_lock = threading.Lock()
+
+
+def get_mail_pool():
+    """환경 변수 설정으로 SMTP 풀 싱글톤 인스턴스 반환"""
+    global _mail_pool_instance
+    with _mail_pool_lock:
+        if _mail_pool_instance is None:
+            # SMTP_AUTH=false면 로그인 생략 (로컬 테스트 SMTP 서버용)
+            use_auth = os.getenv('SMTP_AUTH', 'true').lower() == 'true'
+            _mail_pool_instance = SMTPConnectionPool(
+                host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+                port=int(os.getenv('SMTP_PORT', '465')),
+                username=os.getenv('SENDER_EMAIL') if use_auth else None,
+                password=os.getenv('SENDER_PASSWORD'),
+                use_ssl=os.getenv('SMTP_USE_SSL', 'true').lower() == 'true',
+                pool_size=int(os.getenv('SMTP_POOL_SIZE', '2')),
+                max_messages_per_connection=int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', '100'))
+            )
+        return _mail_pool_instance
@@ -0,0 +1,217 @@
+"""
+단계별 소요 시간 / 토큰 사용량 계측
+- Trace: 다이제스트 한 건의 단계별 소요 시간과 Gemini 토큰 사용량 (발송 이력에 함께 저장)
+- 프로세스 전체 누적 카운터/히스토그램 (Prometheus 텍스트 형식으로 내보내기)
+- 내보내기: METRICS_PORT가 있으면 HTTP /metrics, METRICS_FILE이 있으면 주기적으로 파일 기록
+"""
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import contextvars
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 히스토그램 구간 (초)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class MetricsRegistry:
+    """프로세스 전체 누적 지표 (스레드 안전)"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # stage -> [구간별 개수, 합계, 개수]
+        self._counters = {}  # (이름, 라벨) -> 값
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """단계 소요 시간 기록"""
+        with self._lock:
+            histogram = self._histograms.setdefault(stage, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        """카운터 증가"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self):
+        """Prometheus 텍스트 형식"""
+        lines = []
+        with self._lock:
+            histograms = {stage: (list(h[0]), h[1], h[2]) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines.append("# HELP studyletter_stage_seconds Time spent in each pipeline stage.")
+        lines.append("# TYPE studyletter_stage_seconds histogram")
+        for stage, (counts, total, count) in sorted(histograms.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'studyletter_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+            lines.append(f'studyletter_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'studyletter_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'studyletter_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE studyletter_{name} counter")
+                seen.add(name)
+            label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+            lines.append(f"studyletter_{name}{{{label_text}}} {value}" if label_text
+                         else f"studyletter_{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+# 전역 지표 레지스트리
+registry = MetricsRegistry()
+
+
+class Trace:
+    """다이제스트 한 건의 단계별 소요 시간과 토큰 사용량"""
+
+    def __init__(self, timings=None):
+        """
+        Args:
+            timings: 이어서 기록할 기존 계측 결과 (to_dict 형식)
+        """
+        timings = timings or {}
+        self.stages = dict(timings.get('stages', {}))
+        self.gemini_calls = list(timings.get('gemini_calls', []))
+        self.prompt_tokens = timings.get('prompt_tokens', 0)
+        self.output_tokens = timings.get('output_tokens', 0)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """단계 소요 시간 누적 (전역 지표에도 반영)"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        registry.observe(stage, seconds)
+
+    def record_gemini(self, seconds, prompt_tokens, output_tokens):
+        """Gemini 호출 한 번의 소요 시간과 토큰 사용량"""
+        with self._lock:
+            self.gemini_calls.append(round(seconds, 4))
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+
+    @contextmanager
+    def stage(self, name):
+        """with 블록 소요 시간을 name 단계로 기록"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def activate(self):
+        """with 블록 안의 Gemini 호출을 이 Trace에 기록 (current_trace로 조회)"""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def to_dict(self):
+        """발송 이력/대기열에 저장할 형식"""
+        with self._lock:
+            return {
+                'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+                'gemini_calls': list(self.gemini_calls),
+                'prompt_tokens': self.prompt_tokens,
+                'output_tokens': self.output_tokens
+            }
+
+
+_current_trace = contextvars.ContextVar('studyletter_trace', default=None)
+
+
+def current_trace():
+    """현재 활성화된 Trace (없으면 None)"""
+    return _current_trace.get()
+
+
+def record_gemini_call(seconds, response=None):
+    """
+    Gemini 호출 기록 (전역 지표 + 활성 Trace)
+
+    토큰 수는 응답의 usage_metadata에서 읽습니다 (오류로 응답이 없으면 0).
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+    output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+
+    registry.observe('gemini', seconds)
+    registry.inc('gemini_calls_total', status='ok' if response is not None else 'error')
+    registry.inc('gemini_tokens_total', prompt_tokens, type='prompt')
+    registry.inc('gemini_tokens_total', output_tokens, type='output')
+
+    trace = current_trace()
+    if trace is not None:
+        trace.record_gemini(seconds, prompt_tokens, output_tokens)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics_file(path):
+    """지표를 파일로 기록 (node_exporter textfile collector 등에서 읽을 수 있도록 원자적으로 교체)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_exporter(stop_event=None):
+    """
+    환경 변수 설정에 따라 지표 내보내기 시작
+
+    - METRICS_PORT: HTTP /metrics 서버 포트
+    - METRICS_FILE: 지표 파일 경로 (METRICS_FILE_INTERVAL초마다 기록, 기본 15)
+    """
+    port = os.getenv('METRICS_PORT')
+    if port:
+        server = ThreadingHTTPServer(('0.0.0.0', int(port)), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"지표 HTTP 서버 시작: :{port}/metrics")
+
+    path = os.getenv('METRICS_FILE')
+    if path:
+        interval = float(os.getenv('METRICS_FILE_INTERVAL', '15'))
+        stop_event = stop_event or threading.Event()
+
+        def _write_loop():
+            while not stop_event.wait(interval):
+                try:
+                    write_metrics_file(path)
+                except OSError as e:
+                    logger.error(f"지표 파일 기록 오류: {e}")
+            write_metrics_file(path)
+
+        threading.Thread(target=_write_loop, name="metrics-file", daemon=True).start()
+        logger.info(f"지표 파일 기록 시작: {path} ({interval}초마다)")
@@ -0,0 +1,278 @@
+"""
+이메일 발송 대기열 (outbox)
+- 다이제스트 생성 쪽은 발송할 메일을 outbox 테이블에 기록만 함
+- 발송 워커 풀이 대기 중인 행을 점유하여 발송하고, 실패 시 지수 백오프로 재시도
+- 메일 서버가 느려도 Gemini 요약 작업은 막히지 않음
+- 발송 이력은 HistoryWriter로 모아서 한 번에 저장
+- 예약 발송이 성공하면 포함된 논문을 스케줄별 발송 기록(sent_papers)에 추가
+  (통합 다이제스트는 포함된 모든 스케줄에 기록)
+"""
+
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+import time
+
+from database import (HistoryWriter, Outbox, Schedule, get_session, load_blob, record_sent_papers,
+                      save_email_history, store_blob)
+from metrics import Trace, registry
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(session, schedule_id, keyword, recipient, subject, body, paper_count, timings=None,
+                  paper_ids=None, html_body=None, schedule_ids=None):
+    """
+    발송할 메일을 대기열에 추가 (본문은 digest_blobs에 한 번만 저장)
+
+    timings는 다이제스트 생성 단계 계측 결과이며, 발송 후 이력에 발송 단계와 합쳐 저장됩니다.
+    paper_ids는 포함된 논문 arXiv ID 목록이며, 발송에 성공하면 스케줄별 발송 기록에 추가됩니다.
+    html_body는 HTML 공통 본문이며, 있으면 텍스트 본문과 함께 발송됩니다.
+    schedule_ids는 통합 다이제스트(여러 구독 키워드를 한 통으로)가 포함하는 스케줄 ID 목록입니다.
+    """
+    start = time.perf_counter()
+    item = Outbox(
+        schedule_id=schedule_id,
+        keyword=keyword,
+        recipient=recipient,
+        subject=subject,
+        content_hash=store_blob(session, body),
+        html_hash=store_blob(session, html_body) if html_body else None,
+        timings=json.dumps(timings) if timings else None,
+        paper_count=paper_count,
+        paper_ids=json.dumps(paper_ids) if paper_ids else None,
+        schedule_ids=json.dumps(schedule_ids) if schedule_ids else None,
+        status='pending',
+        next_attempt_at=datetime.now(),
+        created_at=datetime.now()
+    )
+    session.add(item)
+    session.commit()
+    registry.observe('enqueue', time.perf_counter() - start)
+    return item
+
+
+def enqueue_emails(session, recipients, subject, body, paper_count, timings=None, paper_ids=None,
+                   html_body=None):
+    """
+    같은 메일을 여러 수신자 앞으로 한 트랜잭션에 대기열 추가 (키워드 그룹 일괄 발송용)
+
+    여러 워커 프로세스가 같은 DB에 동시에 쓸 때 수신자마다 커밋하지 않도록 묶습니다.
+
+    Args:
+        recipients: [(schedule_id, keyword, recipient), ...]
+    """
+    start = time.perf_counter()
+    content_hash = store_blob(session, body)
+    html_hash = store_blob(session, html_body) if html_body else None
+    timings_json = json.dumps(timings) if timings else None
+    paper_ids_json = json.dumps(paper_ids) if paper_ids else None
+    now = datetime.now()
+    session.add_all([
+        Outbox(
+            schedule_id=schedule_id,
+            keyword=keyword,
+            recipient=recipient,
+            subject=subject,
+            content_hash=content_hash,
+            html_hash=html_hash,
+            timings=timings_json,
+            paper_count=paper_count,
+            paper_ids=paper_ids_json,
+            status='pending',
+            next_attempt_at=now,
+            created_at=now
+        )
+        for schedule_id, keyword, recipient in recipients
+    ])
+    session.commit()
+    registry.observe('enqueue', time.perf_counter() - start)
+
+
+class DeliveryWorkerPool:
+    """outbox 발송 워커 풀"""
+
+    def __init__(self, engine, send_func, workers=2, max_attempts=5, base_backoff=60,
+                 poll_interval=2, claim_timeout=600, history_writer=None):
+        """
+        Args:
+            engine: SQLAlchemy 엔진
+            send_func: 발송 함수 (recipient, subject, body, html_body=, schedule_ids=)
+                       -> (성공 여부, 오류 메시지)
+            workers: 발송 워커 스레드 수
+            max_attempts: 최대 발송 시도 횟수
+            base_backoff: 첫 재시도 대기 시간 (초), 이후 2배씩 증가
+            poll_interval: 대기열이 비었을 때 조회 간격 (초)
+            claim_timeout: 'sending' 상태로 이 시간(초) 넘게 남은 행은 재점유 (워커 비정상 종료 대비)
+            history_writer: 발송 이력 묶음 저장기 (None이면 건마다 바로 저장)
+        """
+        self.engine = engine
+        self.send_func = send_func
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.history_writer = history_writer
+
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """워커 스레드 시작"""
+        if self.history_writer is not None:
+            self.history_writer.start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"delivery-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"발송 워커 {self.workers}개가 시작되었습니다.")
+
+    def stop(self, timeout=None):
+        """워커 스레드 종료"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.history_writer is not None:
+            self.history_writer.stop()
+        logger.info("발송 워커가 종료되었습니다.")
+
+    def claim_next(self, session):
+        """
+        발송할 행 하나를 점유
+
+        조건부 UPDATE로 상태를 바꾸므로 여러 워커(프로세스)가 동시에 조회해도
+        한 행은 한 워커만 점유합니다.
+        """
+        now = datetime.now()
+        stale_before = now - timedelta(seconds=self.claim_timeout)
+
+        candidates = session.query(Outbox.id, Outbox.status).filter(
+            ((Outbox.status == 'pending') & (Outbox.next_attempt_at <= now)) |
+            ((Outbox.status == 'sending') & (Outbox.claimed_at < stale_before))
+        ).order_by(Outbox.next_attempt_at.asc()).limit(self.workers * 2).all()
+
+        for item_id, status in candidates:
+            query = session.query(Outbox).filter(Outbox.id == item_id, Outbox.status == status)
+            if status == 'sending':
+                query = query.filter(Outbox.claimed_at < stale_before)
+            claimed = query.update(
+                {'status': 'sending', 'claimed_at': now},
+                synchronize_session=False
+            )
+            session.commit()
+            if claimed:
+                return session.query(Outbox).filter_by(id=item_id).first()
+
+        return None
+
+    def deliver(self, session, item):
+        """점유한 행 발송 및 결과 기록"""
+        body = load_blob(session, item.content_hash) if item.content_hash else item.body
+        html_body = load_blob(session, item.html_hash) if item.html_hash else None
+        schedule_ids = self._schedule_ids(item)
+        trace = Trace(json.loads(item.timings) if item.timings else None)
+        with trace.stage('send'):
+            success, error_msg = self.send_func(item.recipient, item.subject, body,
+                                                html_body=html_body, schedule_ids=schedule_ids)
+        item.attempts += 1
+
+        if success:
+            item.status = 'sent'
+            item.sent_at = datetime.now()
+            item.last_error = None
+            session.commit()
+
+            self._record_history(session, item, 'success', None, body, trace)
+
+            # 스케줄 업데이트 (자동화인 경우, 통합 다이제스트면 포함된 스케줄 모두)
+            if schedule_ids:
+                for schedule_id in schedule_ids:
+                    if item.paper_ids:
+                        record_sent_papers(session, schedule_id, json.loads(item.paper_ids), item.sent_at)
+                    schedule = session.query(Schedule).filter_by(id=schedule_id).first()
+                    if schedule:
+                        schedule.last_sent = datetime.now()
+                session.commit()
+            return True
+
+        item.last_error = error_msg
+        if item.attempts >= self.max_attempts:
+            item.status = 'failed'
+            session.commit()
+            self._record_history(session, item, 'failed', error_msg, body, trace)
+            logger.warning(f"발송 최종 실패 ({item.attempts}회): {item.recipient} ({error_msg})")
+        else:
+            delay = self.base_backoff * (2 ** (item.attempts - 1))
+            item.status = 'pending'
+            item.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+            session.commit()
+            logger.info(f"발송 실패, {delay}초 후 재시도 ({item.attempts}/{self.max_attempts}): "
+                        f"{item.recipient} ({error_msg})")
+        return False
+
+    @staticmethod
+    def _schedule_ids(item):
+        """메일에 포함된 자동화 ID 목록 (통합 다이제스트는 schedule_ids, 단발성 발송은 빈 목록)"""
+        if item.schedule_ids:
+            return json.loads(item.schedule_ids)
+        return [item.schedule_id] if item.schedule_id else []
+
+    def _record_history(self, session, item, status, error_msg, body, trace):
+        """발송 결과 이력 기록 (마지막 시도 점유 시각까지의 대기열 대기 시간 포함)"""
+        trace.record('queue_wait', (item.claimed_at - item.created_at).total_seconds())
+        registry.inc('emails_total', status=status)
+        timings = trace.to_dict()
+
+        if self.history_writer is not None and item.content_hash:
+            self.history_writer.add(item.schedule_id, item.keyword, item.recipient, status, error_msg,
+                                    item.content_hash, item.paper_count, timings)
+        else:
+            save_email_history(session, item.schedule_id, item.keyword, item.recipient, item.paper_count,
+                               status, error_msg, body, content_hash=item.content_hash, timings=timings)
+
+    def _run(self):
+        """워커 루프"""
+        while not self._stop.is_set():
+            session = get_session(self.engine)
+            try:
+                item = self.claim_next(session)
+                if item is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self.deliver(session, item)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"발송 워커 오류: {e}")
+                self._stop.wait(self.poll_interval)
+            finally:
+                session.close()
+
+
+# 전역 발송 워커 풀 인스턴스
+_delivery_pool_instance = None
+_delivery_pool_lock = threading.Lock()
+
+
+def get_delivery_pool(engine, send_func):
+    """발송 워커 풀 싱글톤 인스턴스 반환 (처음 호출 시 시작)"""
+    global _delivery_pool_instance
+    with _delivery_pool_lock:
+        if _delivery_pool_instance is None:
+            _delivery_pool_instance = DeliveryWorkerPool(
+                engine,
+                send_func,
+                workers=int(os.getenv('DELIVERY_WORKERS', '2')),
+                max_attempts=int(os.getenv('DELIVERY_MAX_ATTEMPTS', '5')),
+                base_backoff=int(os.getenv('DELIVERY_BASE_BACKOFF', '60')),
+                history_writer=HistoryWriter(
+                    engine,
+                    batch_size=int(os.getenv('HISTORY_BATCH_SIZE', '100')),
+                    flush_interval=float(os.getenv('HISTORY_FLUSH_INTERVAL', '1.0'))
+                )
+            )
+            _delivery_pool_instance.start()
+        return _delivery_pool_instance
@@ -0,0 +1,239 @@
+"""
+로컬 arXiv 논문 색인
+- 매일 신규 제출 논문을 카테고리 단위로 일괄 수집하여 papers 테이블에 저장
+- SQLite FTS5 색인으로 구독 키워드를 로컬에서 바로 매칭
+- 수집 소스는 교체 가능 (arXiv API / 로컬 JSON 픽스처)
+"""
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import DateTime, bindparam, text
+import arxiv
+import json
+import logging
+import os
+
+from arxiv_search import get_arxiv_client
+from database import Paper, get_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORIES = "cs.AI cs.CL cs.CV cs.LG cs.IR cs.RO stat.ML quant-ph"
+
+# papers 테이블을 원본으로 하는 FTS5 색인 + 동기화 트리거
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+        title, abstract, content='papers', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN
+        INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, title, abstract)
+        VALUES ('delete', old.id, old.title, old.abstract);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS papers_fts_update AFTER UPDATE ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, title, abstract)
+        VALUES ('delete', old.id, old.title, old.abstract);
+        INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+    END""",
+]
+
+
+def init_paper_index(engine):
+    """FTS5 색인 테이블과 트리거 생성 (SQLite 전용)"""
+    if engine.dialect.name != 'sqlite':
+        raise ValueError("로컬 논문 색인은 SQLite(FTS5)에서만 지원합니다.")
+
+    with engine.begin() as conn:
+        for ddl in FTS_DDL:
+            conn.execute(text(ddl))
+
+
+def to_local_naive(published):
+    """
+    제출 시각을 로컬 시각(시간대 정보 제거)으로 변환
+
+    검색 구간 since와 arxiv_search.published_at이 모두 로컬 시각 기준이므로 색인도 같은 기준으로
+    저장합니다. 시간대 정보가 없는 값은 arXiv와 같이 UTC로 간주합니다.
+    """
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published.astimezone().replace(tzinfo=None)
+
+
+def is_local_search_enabled():
+    """PAPER_SOURCE=local이면 키워드 검색을 로컬 색인에서 수행"""
+    return os.getenv('PAPER_SOURCE', 'live').lower() == 'local'
+
+
+class ArxivIngestionSource:
+    """arXiv API에서 하루치 신규 제출 논문을 카테고리 단위로 일괄 수집"""
+
+    def __init__(self, categories=None, page_size=500):
+        """
+        Args:
+            categories: 수집할 arXiv 카테고리 목록
+            page_size: 요청 한 번에 받을 논문 수
+        """
+        self.categories = categories or os.getenv('ARXIV_INGEST_CATEGORIES', DEFAULT_CATEGORIES).split()
+        self.client = get_arxiv_client(page_size=page_size)
+
+    def fetch(self, day):
+        """day 날짜(UTC 기준)에 제출된 논문 목록"""
+        category_query = ' OR '.join(f"cat:{category}" for category in self.categories)
+        date_range = f"[{day.strftime('%Y%m%d')}0000 TO {day.strftime('%Y%m%d')}2359]"
+        search = arxiv.Search(
+            query=f"({category_query}) AND submittedDate:{date_range}",
+            max_results=None,
+            sort_by=arxiv.SortCriterion.SubmittedDate,
+            sort_order=arxiv.SortOrder.Descending
+        )
+
+        for result in self.client.results(search):
+            yield {
+                'entry_id': result.entry_id,
+                'title': result.title,
+                'authors': [author.name for author in result.authors],
+                'abstract': result.summary,
+                'pdf_url': result.pdf_url,
+                'categories': result.categories,
+                'published': to_local_naive(result.published)
+            }
+
+
+class FixtureIngestionSource:
+    """로컬 JSON 파일을 수집 소스로 사용 (테스트/오프라인용)"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 논문 목록 JSON 파일 경로
+                  [{"entry_id", "title", "authors", "abstract", "pdf_url", "categories", "published"}, ...]
+                  published는 ISO 8601 문자열
+        """
+        self.path = path
+
+    def fetch(self, day):
+        """day 날짜에 제출된 논문 목록"""
+        with open(self.path, encoding='utf-8') as f:
+            papers = json.load(f)
+
+        for paper in papers:
+            published = datetime.fromisoformat(paper['published'])
+            if published.tzinfo is not None:
+                published = published.astimezone(timezone.utc)
+            # day는 arXiv와 같이 UTC 날짜 기준
+            if published.date() == day.date():
+                yield dict(paper, published=to_local_naive(published))
+
+
+def get_ingestion_source():
+    """환경 변수 설정에 맞는 수집 소스 (INGEST_FIXTURE가 있으면 픽스처 사용)"""
+    fixture = os.getenv('INGEST_FIXTURE')
+    if fixture:
+        return FixtureIngestionSource(fixture)
+    return ArxivIngestionSource()
+
+
+def ingest(engine, source, day):
+    """
+    하루치 논문을 수집하여 색인에 추가 (이미 있는 논문은 제출 시각만 맞춤)
+
+    Returns:
+        새로 추가된 논문 수
+    """
+    fetched = list(source.fetch(day))
+    if not fetched:
+        return 0
+
+    session = get_session(engine)
+    try:
+        existing = {
+            row.entry_id: row for row in session.query(Paper).filter(
+                Paper.entry_id.in_([paper['entry_id'] for paper in fetched])
+            )
+        }
+
+        added = 0
+        for paper in fetched:
+            if paper['entry_id'] in existing:
+                # 이전 버전은 UTC로 저장했으므로 다시 수집될 때 로컬 시각으로 고침
+                row = existing[paper['entry_id']]
+                if row is not None and row.published != paper['published']:
+                    row.published = paper['published']
+                continue
+            existing[paper['entry_id']] = None
+            session.add(Paper(
+                entry_id=paper['entry_id'],
+                title=paper['title'],
+                authors=json.dumps(paper['authors'], ensure_ascii=False),
+                abstract=paper['abstract'],
+                pdf_url=paper.get('pdf_url'),
+                categories=' '.join(paper.get('categories') or []),
+                published=paper['published'],
+                ingested_at=datetime.now()
+            ))
+            added += 1
+
+        session.commit()
+        logger.info(f"논문 색인 수집 완료 ({day.strftime('%Y-%m-%d')}): {len(fetched)}편 중 {added}편 추가")
+        return added
+    finally:
+        session.close()
+
+
+def ingest_recent(engine, source=None, days=2):
+    """최근 며칠치 논문 수집 (arXiv 공개 지연을 고려해 하루 이상 겹쳐서 수집)"""
+    source = source or get_ingestion_source()
+    today = datetime.utcnow()
+    added = 0
+    for offset in range(days):
+        added += ingest(engine, source, today - timedelta(days=offset))
+    return added
+
+
+def build_match_query(keyword):
+    """키워드를 FTS5 MATCH 식으로 변환 (단어별 AND, 특수문자는 따옴표로 이스케이프)"""
+    tokens = [token for token in keyword.split() if any(ch.isalnum() for ch in token)]
+    return ' AND '.join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+def search_local(engine, keyword, since, limit=5):
+    """
+    로컬 색인에서 키워드 검색 (최신순)
+
+    Args:
+        engine: SQLAlchemy 엔진
+        keyword: 검색 키워드
+        since: 이 시각 이후 제출된 논문만
+        limit: 최대 논문 수
+
+    Returns:
+        search_arxiv와 같은 형식의 논문 목록
+    """
+    match = build_match_query(keyword)
+    if not match:
+        return []
+
+    query = text(
+        """SELECT p.entry_id, p.title, p.authors, p.abstract, p.pdf_url, p.published
+           FROM papers_fts JOIN papers p ON p.id = papers_fts.rowid
+           WHERE papers_fts MATCH :match AND p.published >= :since
+           ORDER BY p.published DESC
+           LIMIT :limit"""
+    ).bindparams(bindparam('since', type_=DateTime)).columns(published=DateTime)
+
+    with engine.connect() as conn:
+        rows = conn.execute(query, {'match': match, 'since': since, 'limit': limit}).fetchall()
+
+    return [
+        {
+            'title': row.title,
+            'authors': json.loads(row.authors),
+            'abstract': row.abstract,
+            'pdf_url': row.pdf_url,
+            'published': row.published,
+            'entry_id': row.entry_id
+        }
+        for row in rows
+    ]
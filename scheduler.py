@@ -1,85 +1,334 @@
 """
 자동화 스케줄러
 - 매주 월요일 오전 9시 자동 발송
+- 발송 전 새벽에 다이제스트를 미리 준비하는 준비 단계 작업 (발송 시각에는 포맷팅/발송만)
+- 발송 시각을 작업별 고정 지터로 분산 (월요일 09:00부터 설정한 구간 안에서)
+- 실행 스레드 수 제한, 작업별 coalesce / misfire 유예
+- DB 임대로 여러 워커 중 하나만 작업 실행
+- 작업 실제 시작 시각을 모아 DB에 저장 (웹에서 시작 시각 분포 표시)
 """
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.events import EVENT_JOB_SUBMITTED
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+import hashlib
 import logging
+import os
+import socket
+import threading
+
+from database import SchedulerLease, get_session, save_job_starts
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 발송 구간 시작 시각 (월요일 09:00 KST)
+WINDOW_START_HOUR = 9
+TIMEZONE = 'Asia/Seoul'
+
+# 지터가 하루를 넘지 않도록 분산 구간 상한 (09:00 ~ 23:59)
+MAX_SPREAD_MINUTES = (24 - WINDOW_START_HOUR) * 60 - 1
+
+
+def is_prepare_enabled():
+    """DIGEST_PREPARE=true(기본)면 발송 구간 전에 다이제스트 준비 단계 실행"""
+    return os.getenv('DIGEST_PREPARE', 'true').lower() == 'true'
+
+
+def get_prepare_hour():
+    """준비 단계 실행 시각 (월요일 0시~8시, 발송 구간 시작 전)"""
+    return max(0, min(int(os.getenv('DIGEST_PREPARE_HOUR', '3')), WINDOW_START_HOUR - 1))
+
+
+def get_spread_minutes():
+    """환경 변수의 발송 분산 구간 (분)"""
+    return max(0, min(int(os.getenv('DISPATCH_SPREAD_MINUTES', '60')), MAX_SPREAD_MINUTES))
+
+
+def jitter_seconds(key, spread_minutes):
+    """작업 키별 고정 지터 (초) - 같은 키는 항상 같은 시각에 실행"""
+    if spread_minutes == 0:
+        return 0
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % (spread_minutes * 60)
+
+
+def planned_start(key, spread_minutes=None):
+    """작업 키의 예정 실행 시각 (HH:MM:SS)"""
+    if spread_minutes is None:
+        spread_minutes = get_spread_minutes()
+    offset = WINDOW_START_HOUR * 3600 + jitter_seconds(key, spread_minutes)
+    return f"{offset // 3600:02d}:{(offset % 3600) // 60:02d}:{offset % 60:02d}"
+
+
+def _bucket_label(offset, bucket_minutes):
+    """구간 시작 기준 초를 히스토그램 구간 라벨(HH:MM)로 변환"""
+    start = WINDOW_START_HOUR * 60 + int(offset // (bucket_minutes * 60)) * bucket_minutes
+    return f"{start // 60:02d}:{start % 60:02d}"
+
+
+def actual_start_histogram(offsets, bucket_minutes=5):
+    """실제 시작 시각 목록(구간 시작 기준 초)의 분포 {구간 라벨: 실행 수} (구간 전 실행은 제외)"""
+    actual = Counter(_bucket_label(offset, bucket_minutes) for offset in offsets if offset >= 0)
+    return dict(sorted(actual.items()))
+
+
+def planned_start_histogram(keys, spread_minutes=None, bucket_minutes=5):
+    """작업 키 목록의 예정 시작 시각 분포 {구간 라벨: 작업 수}"""
+    if spread_minutes is None:
+        spread_minutes = get_spread_minutes()
+    counts = Counter(_bucket_label(jitter_seconds(key, spread_minutes), bucket_minutes) for key in keys)
+    return dict(sorted(counts.items()))
+
 
 class StudyLetterScheduler:
     """논문 요약 자동 발송 스케줄러"""
-    
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
+
+    def __init__(self, max_workers=None, misfire_grace_time=None, spread_minutes=None):
+        """
+        Args:
+            max_workers: 작업 실행 스레드 수
+            misfire_grace_time: 예정 시각을 놓쳐도 실행을 허용하는 시간 (초)
+            spread_minutes: 발송 분산 구간 (분, 0이면 모두 09:00 정각)
+        """
+        self.max_workers = max_workers or int(os.getenv('SCHEDULER_MAX_WORKERS', '4'))
+        self.misfire_grace_time = misfire_grace_time or int(os.getenv('SCHEDULER_MISFIRE_GRACE', '3600'))
+        if spread_minutes is None:
+            spread_minutes = get_spread_minutes()
+        self.spread_minutes = max(0, min(spread_minutes, MAX_SPREAD_MINUTES))
+
+        self._pending_starts = []  # DB에 아직 저장하지 않은 (회차, 작업 ID, 구간 시작 기준 초)
+        self._start_lock = threading.Lock()
+
+        self.scheduler = BackgroundScheduler(
+            executors={'default': ThreadPoolExecutor(self.max_workers)},
+            job_defaults={
+                'coalesce': True,  # 밀린 실행은 한 번으로 합침
+                'max_instances': 1,
+                'misfire_grace_time': self.misfire_grace_time
+            },
+            timezone=TIMEZONE
+        )
+        self.scheduler.add_listener(self._record_start, EVENT_JOB_SUBMITTED)
         self.scheduler.start()
-        logger.info("스케줄러가 시작되었습니다.")
-    
-    def add_weekly_job(self, job_func, schedule_id, keyword, email):
+        logger.info(f"스케줄러가 시작되었습니다. (스레드 {self.max_workers}개, 분산 {self.spread_minutes}분)")
+
+    def jitter_seconds(self, key):
+        """작업 키별 고정 지터 (초)"""
+        return jitter_seconds(key, self.spread_minutes)
+
+    def _weekly_trigger(self, key):
+        """월요일 09:00 + 지터 시각의 CronTrigger"""
+        offset = WINDOW_START_HOUR * 3600 + self.jitter_seconds(key)
+        return CronTrigger(
+            day_of_week='mon',  # 월요일
+            hour=offset // 3600,
+            minute=(offset % 3600) // 60,
+            second=offset % 60,
+            timezone=TIMEZONE
+        )
+
+    def planned_start(self, key):
+        """작업 키의 예정 실행 시각 (HH:MM:SS)"""
+        return planned_start(key, self.spread_minutes)
+
+    def add_dispatch_job(self, job_func, job_id="weekly_dispatch", args=None, name=None):
         """
-        매주 월요일 오전 9시 작업 추가
-        
+        매주 월요일 오전 9시(+지터) 일괄 발송 작업 추가
+
+        스케줄마다 작업을 만들지 않고, 하나의 작업이 여러 스케줄을
+        묶어 처리합니다.
+
         Args:
             job_func: 실행할 함수
-            schedule_id: 스케줄 ID
-            keyword: 검색 키워드
-            email: 수신 이메일
+            job_id: 작업 ID (지터 계산 키)
+            args: 함수 인자
+            name: 작업 이름
         """
-        job_id = f"schedule_{schedule_id}"
-        
-        # 기존 작업이 있으면 제거
-        if self.scheduler.get_job(job_id):
-            self.scheduler.remove_job(job_id)
-        
-        # 매주 월요일 오전 9시에 실행
-        trigger = CronTrigger(
-            day_of_week='mon',  # 월요일
-            hour=9,             # 오전 9시
-            minute=0,
-            timezone='Asia/Seoul'
+        self.scheduler.add_job(
+            job_func,
+            trigger=self._weekly_trigger(job_id),
+            args=args or [],
+            id=job_id,
+            name=name or "Weekly digest dispatch",
+            replace_existing=True
         )
-        
+
+        logger.info(f"일괄 발송 작업 등록됨: {job_id} (매주 월요일 {self.planned_start(job_id)})")
+
+    def add_prepare_job(self, job_func, job_id="prepare_digests", hour=None, args=None, name=None):
+        """
+        매주 월요일 발송 구간 전(기본 03:00) 다이제스트 준비 작업 추가
+
+        검색/요약처럼 비용이 큰 작업을 한산한 시간에 미리 끝내 두고,
+        09:00 이후 발송 작업은 준비된 결과로 포맷팅/발송만 합니다.
+
+        Args:
+            job_func: 실행할 함수
+            job_id: 작업 ID
+            hour: 실행 시 (기본 DIGEST_PREPARE_HOUR)
+            args: 함수 인자
+            name: 작업 이름
+        """
+        if hour is None:
+            hour = get_prepare_hour()
         self.scheduler.add_job(
             job_func,
-            trigger=trigger,
-            args=[schedule_id, keyword, email],
+            trigger=CronTrigger(day_of_week='mon', hour=hour, minute=0, timezone=TIMEZONE),
+            args=args or [],
             id=job_id,
-            name=f"Weekly digest: {keyword} → {email}",
+            name=name or "Weekly digest preparation",
             replace_existing=True
         )
-        
-        logger.info(f"자동화 작업 추가됨: {keyword} → {email} (매주 월요일 09:00)")
-    
-    def remove_job(self, schedule_id):
-        """작업 제거"""
-        job_id = f"schedule_{schedule_id}"
+
+        logger.info(f"준비 작업 등록됨: {job_id} (매주 월요일 {hour:02d}:00)")
+
+    def add_daily_job(self, job_func, job_id, hour, minute=0, args=None, name=None):
+        """
+        매일 정해진 시각 작업 추가 (논문 색인 수집 등)
+
+        Args:
+            job_func: 실행할 함수
+            job_id: 작업 ID
+            hour: 실행 시
+            minute: 실행 분
+            args: 함수 인자
+            name: 작업 이름
+        """
+        self.scheduler.add_job(
+            job_func,
+            trigger=CronTrigger(hour=hour, minute=minute, timezone=TIMEZONE),
+            args=args or [],
+            id=job_id,
+            name=name or job_id,
+            replace_existing=True
+        )
+
+        logger.info(f"매일 작업 등록됨: {job_id} (매일 {hour:02d}:{minute:02d})")
+
+    def run_now(self, job_func, job_id, args=None):
+        """작업을 즉시 한 번 실행 (스케줄러 스레드에서)"""
+        self.scheduler.add_job(job_func, args=args or [], id=job_id, replace_existing=True)
+
+    def remove_job_by_id(self, job_id):
+        """작업 ID로 제거"""
         if self.scheduler.get_job(job_id):
             self.scheduler.remove_job(job_id)
-            logger.info(f"자동화 작업 제거됨: schedule_{schedule_id}")
-    
+            logger.info(f"작업 제거됨: {job_id}")
+
     def get_jobs(self):
         """모든 작업 조회"""
         return self.scheduler.get_jobs()
-    
-    def shutdown(self):
+
+    def _record_start(self, event):
+        """작업 실행 시작 시각 기록 (구간 시작 기준 초)"""
+        now = datetime.now(self.scheduler.timezone)
+        window_start = now.replace(hour=WINDOW_START_HOUR, minute=0, second=0, microsecond=0)
+        offset = (now - window_start).total_seconds()
+        with self._start_lock:
+            self._pending_starts.append((now.strftime('%Y-%m-%d'), event.job_id, offset))
+
+    def flush_start_records(self, engine):
+        """
+        모아 둔 작업 시작 기록을 DB에 저장 (워커가 주기적으로 호출)
+        
+        시작 기록은 워커 메모리에만 있으므로, 웹 화면에서 볼 수 있도록 job_starts 테이블에 옮깁니다.
+        저장에 실패하면 다음 호출에서 다시 시도합니다.
+        """
+        with self._start_lock:
+            starts, self._pending_starts = self._pending_starts, []
+        if not starts:
+            return 0
+        
+        session = get_session(engine)
+        try:
+            save_job_starts(session, starts)
+            return len(starts)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"작업 시작 기록 저장 실패: {e}")
+            with self._start_lock:
+                self._pending_starts[:0] = starts
+            return 0
+        finally:
+            session.close()
+
+    def shutdown(self, wait=True):
         """스케줄러 종료"""
-        self.scheduler.shutdown()
+        self.scheduler.shutdown(wait=wait)
         logger.info("스케줄러가 종료되었습니다.")
 
 
-# 전역 스케줄러 인스턴스
-_scheduler_instance = None
+class LeaderLease:
+    """
+    DB 기반 리더 임대
+
+    여러 워커 프로세스 중 임대를 가진 하나만 스케줄 작업을 실행합니다.
+    임대는 ttl 동안 유효하며, 리더가 주기적으로 갱신하지 않으면 다른 워커가 가져갑니다.
+    """
+
+    def __init__(self, engine, name='scheduler', holder=None, ttl=60):
+        """
+        Args:
+            engine: SQLAlchemy 엔진
+            name: 임대 이름
+            holder: 이 프로세스 식별자 (기본: 호스트명:PID)
+            ttl: 임대 유효 시간 (초)
+        """
+        self.engine = engine
+        self.name = name
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+
+    def try_acquire(self):
+        """임대 획득 또는 갱신 (성공 시 True)"""
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+        session = get_session(self.engine)
+        try:
+            updated = session.query(SchedulerLease).filter(
+                SchedulerLease.name == self.name,
+                (SchedulerLease.holder == self.holder) | (SchedulerLease.expires_at < now)
+            ).update({'holder': self.holder, 'expires_at': expires_at}, synchronize_session=False)
+            session.commit()
+            if updated:
+                return True
+
+            if session.query(SchedulerLease).filter_by(name=self.name).first() is not None:
+                return False
+
+            session.add(SchedulerLease(name=self.name, holder=self.holder,
+                                       expires_at=expires_at, acquired_at=now))
+            session.commit()
+            return True
+        except IntegrityError:
+            # 다른 워커가 먼저 임대 행을 만든 경우
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def release(self):
+        """임대 반납 (다른 워커가 바로 가져갈 수 있도록 만료 처리)"""
+        session = get_session(self.engine)
+        try:
+            session.query(SchedulerLease).filter_by(name=self.name, holder=self.holder).update(
+                {'expires_at': datetime.now()}, synchronize_session=False
+            )
+            session.commit()
+        finally:
+            session.close()
 
 
-def get_scheduler():
-    """스케줄러 싱글톤 인스턴스 반환"""
-    global _scheduler_instance
-    if _scheduler_instance is None:
-        _scheduler_instance = StudyLetterScheduler()
-    return _scheduler_instance
+def get_lease_status(engine, name='scheduler'):
+    """현재 임대 상태 (없으면 None)"""
+    session = get_session(engine)
+    try:
+        return session.query(SchedulerLease).filter_by(name=name).first()
+    finally:
+        session.close()
@@ -0,0 +1,387 @@
+"""
+Gemini 논문 요약 엔진
+- 스레드 풀로 여러 논문을 동시에 요약
+- 프로세스 전체가 공유하는 토큰 버킷으로 RPM/TPM 한도 준수
+- 요약 캐시 우선 조회
+- 여러 초록을 한 번에 보내는 배치 요약 (JSON 응답, 실패 시 단건 요약으로 대체)
+- 같은 논문을 동시에 요약하려는 호출은 진행 중인 요약 하나를 함께 기다림 (arXiv ID 기준)
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextvars
+import google.generativeai as genai
+import json
+import logging
+import os
+import threading
+import time
+
+from metrics import record_gemini_call
+from summary_cache import hash_prompt
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = 'gemini-1.5-flash-8b'
+
+SUMMARY_PROMPT = """You are a helpful research assistant.
+Summarize the given academic paper abstract into Korean.
+
+Requirements:
+- Summarize in exactly 3 bullet points
+- Maintain technical terms in English if the Korean translation is awkward
+- Use professional yet easy-to-read tone (해요체)
+- Each bullet point should be concise but informative
+
+Abstract:
+{abstract}
+
+Provide only the 3 bullet points in Korean, starting each with "• ":
+"""
+
+BATCH_SUMMARY_PROMPT = """You are a helpful research assistant.
+Summarize each of the given academic paper abstracts into Korean.
+
+Requirements:
+- Summarize each abstract in exactly 3 bullet points
+- Maintain technical terms in English if the Korean translation is awkward
+- Use professional yet easy-to-read tone (해요체)
+- Each bullet point should be concise but informative
+
+Abstracts:
+{abstracts}
+
+Respond with a JSON object only. Use the paper numbers ("1", "2", ...) as keys.
+Each value must be a single string with the 3 bullet points in Korean,
+each starting with "• " and separated by newlines.
+"""
+
+# 요약 실패 시 요약 대신 들어가는 안내문 앞부분 (캐시하지 않음)
+SUMMARY_ERROR_PREFIX = "• 요약 생성 중 오류가 발생했습니다"
+
+# 프롬프트 템플릿이 바뀌면 캐시 키도 바뀜 (단건/배치 프롬프트를 하나의 버전으로 취급)
+PROMPT_HASH = hash_prompt(SUMMARY_PROMPT + BATCH_SUMMARY_PROMPT)
+
+# 응답(3줄 한국어 요약) 토큰 수 추정치
+OUTPUT_TOKEN_ESTIMATE = 300
+
+
+def estimate_tokens(prompt, outputs=1):
+    """요청 하나의 토큰 사용량 추정 (입력 약 4자당 1토큰 + 요약 수만큼 출력 추정치)"""
+    return len(prompt) // 4 + OUTPUT_TOKEN_ESTIMATE * outputs
+
+
+def build_batch_prompt(abstracts):
+    """초록 여러 개를 번호를 붙여 하나의 프롬프트로 구성"""
+    numbered = "\n\n".join(
+        f"[{idx}]\n{abstract}" for idx, abstract in enumerate(abstracts, 1)
+    )
+    return BATCH_SUMMARY_PROMPT.format(abstracts=numbered)
+
+
+def parse_batch_response(text, count):
+    """
+    배치 응답(JSON)을 논문별 요약으로 분리
+
+    Args:
+        text: 모델 응답 텍스트
+        count: 요청한 초록 수
+
+    Returns:
+        {0부터 시작하는 인덱스: 요약} (형식이 올바른 항목만 포함)
+    """
+    text = text.strip()
+    if text.startswith('```'):
+        # ```json ... ``` 코드 블록으로 감싼 응답 처리
+        text = text.strip('`')
+        if text.startswith('json'):
+            text = text[len('json'):]
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+
+    if not isinstance(data, dict):
+        return {}
+
+    summaries = {}
+    for idx in range(count):
+        value = data.get(str(idx + 1))
+        if isinstance(value, list):
+            value = "\n".join(str(line) for line in value)
+        if isinstance(value, str) and value.strip():
+            summaries[idx] = value.strip()
+    return summaries
+
+
+class TokenBucket:
+    """스레드 안전 토큰 버킷"""
+
+    def __init__(self, capacity, refill_per_second):
+        """
+        Args:
+            capacity: 버킷 최대 크기 (순간 허용량)
+            refill_per_second: 초당 충전량
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """토큰을 확보할 때까지 대기"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.refill_per_second
+            time.sleep(wait)
+
+
+class GeminiRateLimiter:
+    """
+    Gemini RPM/TPM 한도 제한기
+
+    버킷 크기(burst)만큼 즉시 허용하고 나머지 (한도 - burst)를 1분에 걸쳐 충전하므로
+    어떤 60초 구간에서도 요청 수/토큰 수가 한도를 넘지 않습니다.
+    """
+
+    def __init__(self, rpm, tpm, request_burst=None, token_burst=None):
+        request_burst = request_burst or max(1, min(5, rpm // 3))
+        token_burst = token_burst or max(1, tpm // 4)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(request_burst, max(rpm - request_burst, 1) / 60)
+        self.tokens = TokenBucket(token_burst, max(tpm - token_burst, 1) / 60)
+
+    def acquire(self, tokens):
+        """요청 1회 + 추정 토큰만큼 대기 후 허용"""
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+
+# 전역 제한기 인스턴스 (프로세스 내 모든 작업이 공유)
+_rate_limiter_instance = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Gemini 제한기 싱글톤 인스턴스 반환"""
+    global _rate_limiter_instance
+    with _rate_limiter_lock:
+        if _rate_limiter_instance is None:
+            _rate_limiter_instance = GeminiRateLimiter(
+                rpm=int(os.getenv('GEMINI_RPM', '15')),
+                tpm=int(os.getenv('GEMINI_TPM', '1000000'))
+            )
+        return _rate_limiter_instance
+
+
+class GeminiSummarizer:
+    """캐시 + 제한기 + 스레드 풀 기반 요약 엔진"""
+
+    def __init__(self, cache=None, rate_limiter=None, max_workers=None, model_name=GEMINI_MODEL,
+                 batch_size=None):
+        """
+        Args:
+            cache: SummaryCache (None이면 캐시 미사용)
+            rate_limiter: GeminiRateLimiter (None이면 전역 제한기)
+            max_workers: 동시 요약 스레드 수
+            model_name: Gemini 모델 이름
+            batch_size: 요청 하나에 담을 초록 수 (1 이하면 배치 미사용)
+        """
+        self.cache = cache
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.model_name = model_name
+        self.batch_size = batch_size or int(os.getenv('GEMINI_BATCH_SIZE', '5'))
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv('GEMINI_MAX_WORKERS', '5')),
+            thread_name_prefix='gemini'
+        )
+        self._inflight = {}  # arXiv ID -> 진행 중인 요약의 Future (요약 문자열)
+        self._inflight_lock = threading.Lock()
+
+    def _generate(self, prompt, outputs=1, generation_config=None):
+        """제한기를 거쳐 Gemini 호출 (실패 시 예외 발생)"""
+        self.rate_limiter.acquire(estimate_tokens(prompt, outputs))
+        model = genai.GenerativeModel(self.model_name)
+
+        # 호출 시간/토큰 사용량 계측 (제한기 대기 시간은 제외)
+        start = time.perf_counter()
+        response = None
+        try:
+            response = model.generate_content(prompt, generation_config=generation_config)
+            return response.text.strip()
+        finally:
+            record_gemini_call(time.perf_counter() - start, response)
+
+    def _cached(self, paper):
+        """캐시된 요약 조회 (없으면 None)"""
+        entry_id = paper.get('entry_id')
+        if self.cache and entry_id:
+            return self.cache.get(entry_id, self.model_name, PROMPT_HASH)
+        return None
+
+    def _store(self, paper, summary):
+        """요약을 캐시에 저장"""
+        entry_id = paper.get('entry_id')
+        if self.cache and entry_id:
+            self.cache.put(entry_id, self.model_name, PROMPT_HASH, summary)
+
+    def _summarize_uncached(self, paper):
+        """캐시를 거치지 않고 단건 요약 후 저장 (오류 시 오류 메시지 반환)"""
+        try:
+            summary = self._generate(SUMMARY_PROMPT.format(abstract=paper['abstract']))
+        except Exception as e:
+            # 오류 메시지는 캐시하지 않음
+            logger.warning(f"요약 실패 ({paper.get('entry_id')}): {e}")
+            return f"{SUMMARY_ERROR_PREFIX}: {str(e)}"
+
+        self._store(paper, summary)
+        return summary
+
+    def summarize_batch(self, papers):
+        """
+        초록 여러 개를 요청 하나로 요약
+
+        Returns:
+            {0부터 시작하는 인덱스: 요약} (응답에서 빠졌거나 형식이 잘못된 논문은 제외)
+        """
+        prompt = build_batch_prompt([paper['abstract'] for paper in papers])
+        try:
+            text = self._generate(
+                prompt,
+                outputs=len(papers),
+                generation_config={'response_mime_type': 'application/json'}
+            )
+        except Exception as e:
+            logger.warning(f"배치 요약 실패 ({len(papers)}편): {e}")
+            return {}
+
+        summaries = parse_batch_response(text, len(papers))
+        if len(summaries) < len(papers):
+            logger.warning(f"배치 응답 형식 오류: {len(papers)}편 중 {len(summaries)}편만 분리됨")
+
+        for idx, summary in summaries.items():
+            self._store(papers[idx], summary)
+        return summaries
+
+    def _submit(self, context, func, *args):
+        """스레드 풀에 작업 제출 (호출 측 계측 Trace가 작업 스레드에도 보이도록 호출 측 컨텍스트 복사)"""
+        return self.executor.submit(context.copy().run, func, *args)
+
+    def _claim(self, paper):
+        """
+        논문 요약 결과를 받을 Future
+
+        다른 호출이 같은 논문을 요약 중이면 그 Future를 함께 기다리고, 아니면 새로 만들어
+        등록합니다 (arXiv ID가 없는 논문은 등록하지 않음).
+
+        Returns:
+            (Future, 이 호출이 요약해야 하는지)
+        """
+        entry_id = paper.get('entry_id')
+        with self._inflight_lock:
+            future = self._inflight.get(entry_id) if entry_id else None
+            if future is not None:
+                return future, False
+            future = Future()
+            if entry_id:
+                self._inflight[entry_id] = future
+            return future, True
+
+    def _resolve(self, paper, future, summary):
+        """요약 결과를 기다리는 모든 호출에 전달하고 진행 중 목록에서 제거"""
+        with self._inflight_lock:
+            if self._inflight.get(paper.get('entry_id')) is future:
+                del self._inflight[paper['entry_id']]
+        future.set_result(summary)
+
+    def _start_single(self, context, paper, future):
+        """단건 요약 작업 시작 (완료되면 결과 전달)"""
+        def done(task):
+            try:
+                summary = task.result()
+            except Exception as e:
+                summary = f"{SUMMARY_ERROR_PREFIX}: {str(e)}"
+            self._resolve(paper, future, summary)
+
+        self._submit(context, self._summarize_uncached, paper).add_done_callback(done)
+
+    def _start_batch(self, context, items):
+        """배치 요약 작업 시작 (응답에서 빠진 논문은 단건 요약으로 다시 요청)"""
+        def done(task):
+            try:
+                summaries = task.result()
+            except Exception as e:
+                logger.warning(f"배치 요약 실패 ({len(items)}편): {e}")
+                summaries = {}
+            for pos, (paper, future) in enumerate(items):
+                if pos in summaries:
+                    self._resolve(paper, future, summaries[pos])
+                else:
+                    self._start_single(context, paper, future)
+
+        self._submit(context, self.summarize_batch, [paper for paper, _ in items]).add_done_callback(done)
+
+    def iter_summaries(self, papers):
+        """
+        논문들을 동시에 요약하고 완료되는 순서대로 반환
+
+        캐시에 없는 논문은 batch_size개씩 묶어 요청하고, 배치 응답에서
+        빠진 논문만 단건 요청으로 다시 요약합니다. 다른 호출(다른 키워드/수신자 그룹)이
+        이미 요약 중인 논문은 새로 요청하지 않고 그 결과를 기다립니다.
+        각 논문의 'summary'를 채운 뒤 (인덱스, 논문)을 yield 합니다.
+        호출한 스레드에서 yield 되므로 Streamlit 화면 갱신에 그대로 쓸 수 있습니다.
+        """
+        waiting = {}  # Future -> [인덱스, ...]
+        owned = []
+        for idx, paper in enumerate(papers):
+            cached = self._cached(paper)
+            if cached is not None:
+                paper['summary'] = cached
+                yield idx, paper
+                continue
+
+            future, is_owner = self._claim(paper)
+            waiting.setdefault(future, []).append(idx)
+            if is_owner:
+                # 조회와 등록 사이에 다른 호출이 요약을 끝냈을 수 있음
+                cached = self._cached(paper)
+                if cached is not None:
+                    self._resolve(paper, future, cached)
+                else:
+                    owned.append((paper, future))
+
+        # 요약 작업의 결과 전달은 작업 스레드에서 하므로 이 제너레이터를 끝까지 소비하지 않아도
+        # 같은 논문을 기다리는 다른 호출은 결과를 받음
+        context = contextvars.copy_context()
+        batch_size = max(self.batch_size, 1)
+        for start in range(0, len(owned), batch_size):
+            chunk = owned[start:start + batch_size]
+            if len(chunk) == 1:
+                self._start_single(context, *chunk[0])
+            else:
+                self._start_batch(context, chunk)
+
+        while waiting:
+            done, _ = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in done:
+                for idx in waiting.pop(future):
+                    papers[idx]['summary'] = future.result()
+                    yield idx, papers[idx]
+
+    def summarize_papers(self, papers):
+        """논문 목록 전체 요약 (모두 끝날 때까지 대기)"""
+        for _ in self.iter_summaries(papers):
+            pass
+        return papers
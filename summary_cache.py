@@ -0,0 +1,167 @@
+"""
+논문 요약 캐시
+- 프로세스 내 LRU 캐시 + SQLite 영구 캐시(paper_summaries) 2단계 구성
+- 키: arXiv entry_id + 모델 이름 + 프롬프트 템플릿 해시
+- TTL / 최대 개수 기반 정리, 히트/미스 카운터
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import logging
+import threading
+
+from database import PaperSummary, get_session
+
+logger = logging.getLogger(__name__)
+
+
+def hash_prompt(template):
+    """프롬프트 템플릿 해시 (템플릿이 바뀌면 캐시가 자동으로 무효화됨)"""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+
+def make_cache_key(entry_id, model_name, prompt_hash):
+    """캐시 키 생성"""
+    raw = f"{entry_id}|{model_name}|{prompt_hash}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """논문 요약 2단계 캐시 (메모리 LRU → DB)"""
+
+    def __init__(self, engine, max_memory_entries=1000, max_db_rows=50000,
+                 ttl=timedelta(days=30), prune_every=100):
+        """
+        Args:
+            engine: SQLAlchemy 엔진
+            max_memory_entries: 메모리 LRU 최대 항목 수
+            max_db_rows: DB 캐시 최대 행 수 (초과 시 오래된 것부터 삭제)
+            ttl: 캐시 유효 기간
+            prune_every: 저장 N회마다 DB 정리 실행
+        """
+        self.engine = engine
+        self.max_memory_entries = max_memory_entries
+        self.max_db_rows = max_db_rows
+        self.ttl = ttl
+        self.prune_every = prune_every
+
+        self._memory = OrderedDict()  # cache_key -> (summary, created_at)
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _is_expired(self, created_at):
+        return created_at < datetime.now() - self.ttl
+
+    def _remember(self, key, summary, created_at):
+        """메모리 LRU에 저장 (락 안에서 호출)"""
+        self._memory[key] = (summary, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, entry_id, model_name, prompt_hash):
+        """캐시된 요약 조회 (없으면 None)"""
+        key = make_cache_key(entry_id, model_name, prompt_hash)
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                summary, created_at = cached
+                if not self._is_expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return summary
+                del self._memory[key]
+
+        session = get_session(self.engine)
+        try:
+            row = session.query(PaperSummary).filter_by(cache_key=key).first()
+            if row is not None and not self._is_expired(row.created_at):
+                with self._lock:
+                    self._remember(key, row.summary, row.created_at)
+                    self.db_hits += 1
+                return row.summary
+        finally:
+            session.close()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, entry_id, model_name, prompt_hash, summary):
+        """요약 저장 (메모리 + DB)"""
+        key = make_cache_key(entry_id, model_name, prompt_hash)
+        now = datetime.now()
+
+        with self._lock:
+            self._remember(key, summary, now)
+            self._puts += 1
+            should_prune = self._puts % self.prune_every == 0
+
+        session = get_session(self.engine)
+        try:
+            row = session.query(PaperSummary).filter_by(cache_key=key).first()
+            if row is None:
+                row = PaperSummary(
+                    cache_key=key,
+                    entry_id=entry_id,
+                    model_name=model_name,
+                    prompt_hash=prompt_hash
+                )
+                session.add(row)
+            row.summary = summary
+            row.created_at = now
+            session.commit()
+        except IntegrityError:
+            # 다른 스레드가 같은 키를 먼저 저장한 경우
+            session.rollback()
+        finally:
+            session.close()
+
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """만료되었거나 최대 개수를 넘은 DB 캐시 정리"""
+        session = get_session(self.engine)
+        try:
+            deleted = session.query(PaperSummary).filter(
+                PaperSummary.created_at < datetime.now() - self.ttl
+            ).delete(synchronize_session=False)
+
+            overflow = session.query(PaperSummary).count() - self.max_db_rows
+            if overflow > 0:
+                oldest_ids = [
+                    row_id for (row_id,) in session.query(PaperSummary.id)
+                    .order_by(PaperSummary.created_at.asc())
+                    .limit(overflow)
+                ]
+                deleted += session.query(PaperSummary).filter(
+                    PaperSummary.id.in_(oldest_ids)
+                ).delete(synchronize_session=False)
+
+            session.commit()
+            if deleted:
+                logger.info(f"요약 캐시 정리: {deleted}건 삭제")
+            return deleted
+        finally:
+            session.close()
+
+    def stats(self):
+        """히트/미스 통계"""
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            hits = self.memory_hits + self.db_hits
+            return {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'memory_size': len(self._memory),
+            }
@@ -0,0 +1,64 @@
+"""로컬 논문 색인 검색이 실시간 arXiv 검색과 같은 시간 기준을 쓰는지 확인"""
+
+from datetime import datetime
+import json
+import time
+
+import pytest
+
+from arxiv_search import published_at
+from database import init_db
+from paper_index import FixtureIngestionSource, ingest, init_paper_index, search_local
+
+# 검색 구간 경계(KST 09:00 = UTC 00:00) 양쪽에 제출된 논문
+PAPERS = [
+    {
+        'entry_id': 'http://arxiv.org/abs/2610.00001v1',
+        'title': 'Diffusion models after the boundary',
+        'authors': ['Kim'],
+        'abstract': 'We study diffusion models.',
+        'pdf_url': 'http://arxiv.org/pdf/2610.00001v1',
+        'categories': ['cs.LG'],
+        'published': '2026-10-12T00:30:00+00:00'
+    },
+    {
+        'entry_id': 'http://arxiv.org/abs/2610.00002v1',
+        'title': 'Diffusion models before the boundary',
+        'authors': ['Lee'],
+        'abstract': 'We study diffusion models.',
+        'pdf_url': 'http://arxiv.org/pdf/2610.00002v1',
+        'categories': ['cs.LG'],
+        'published': '2026-10-11T23:30:00+00:00'
+    },
+]
+
+
+@pytest.fixture
+def kst_host(monkeypatch):
+    """호스트 시간대를 KST로 설정"""
+    monkeypatch.setenv('TZ', 'Asia/Seoul')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_local_search_matches_live_window_at_boundary(kst_host, tmp_path):
+    fixture = tmp_path / 'papers.json'
+    fixture.write_text(json.dumps(PAPERS), encoding='utf-8')
+    engine = init_db(f"sqlite:///{tmp_path / 'index.db'}")
+    init_paper_index(engine)
+
+    source = FixtureIngestionSource(str(fixture))
+    for day in (datetime(2026, 10, 11), datetime(2026, 10, 12)):
+        ingest(engine, source, day)
+
+    since = datetime(2026, 10, 12, 9, 0)  # 로컬(KST) 시각
+    local = [paper['entry_id'] for paper in search_local(engine, 'diffusion', since)]
+    live = [
+        paper['entry_id']
+        for paper in sorted(PAPERS, key=lambda paper: paper['published'], reverse=True)
+        if published_at(dict(paper, published=datetime.fromisoformat(paper['published']))) >= since
+    ]
+
+    assert local == live == ['http://arxiv.org/abs/2610.00001v1']
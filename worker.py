@@ -0,0 +1,125 @@
+"""
+스케줄러 워커 프로세스
+- Procfile의 worker 항목으로 웹(Streamlit)과 분리하여 실행
+- DB 리더 임대를 가진 워커 하나만 스케줄 작업 실행
+- 시작 시 Schedule 테이블에서 작업을 일괄 재구성하고, 이후 주기적으로 동기화
+- outbox 발송 워커는 모든 워커 프로세스에서 실행 (행 단위 점유로 중복 발송 없음)
+- 웹에서 등록한 단발성 발송 작업도 모든 워커 프로세스에서 실행 (예약 발송과 호출 한도/캐시 공유)
+- DISPATCH_MODE=sharded면 리더가 등록한 키워드 발송 작업 항목을 모든 워커 프로세스가 나눠 처리
+- PAPER_SOURCE=local이면 매일 arXiv 신규 논문을 로컬 색인에 수집
+- 리더는 작업 실제 시작 시각을 동기화 주기마다 DB에 저장 (웹에서 시작 시각 분포 표시)
+- 단계별 소요 시간/토큰 사용량 지표를 Prometheus 텍스트 형식으로 내보내기 (METRICS_PORT, METRICS_FILE)
+
+실행: python worker.py
+"""
+
+import logging
+import os
+import signal
+import threading
+
+from digest import dispatch_work_item, engine, send_email, stream_instant_digest, sync_dispatch_jobs
+from dispatch_queue import get_dispatch_runner, is_sharded_dispatch_enabled
+from instant_jobs import get_instant_job_runner
+from metrics import start_exporter
+from outbox import get_delivery_pool
+from paper_index import ingest_recent, is_local_search_enabled
+from scheduler import StudyLetterScheduler, LeaderLease
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerWorker:
+    """리더 임대 기반 스케줄러 워커"""
+
+    def __init__(self, lease_ttl=None, sync_interval=None):
+        """
+        Args:
+            lease_ttl: 리더 임대 유효 시간 (초)
+            sync_interval: 임대 갱신 및 작업 동기화 간격 (초)
+        """
+        self.lease = LeaderLease(engine, ttl=lease_ttl or int(os.getenv('WORKER_LEASE_TTL', '60')))
+        self.sync_interval = sync_interval or int(os.getenv('WORKER_SYNC_INTERVAL', '20'))
+        self.scheduler = None
+        self._stop = threading.Event()
+
+    def _become_leader(self):
+        """리더가 되면 스케줄러를 시작하고 DB에서 작업을 일괄 재구성"""
+        logger.info(f"리더 임대 획득: {self.lease.holder}")
+        self.scheduler = StudyLetterScheduler()
+
+        if is_local_search_enabled():
+            # 로컬 논문 색인: 매일 수집 + 시작 시 최근 7일 보충 수집
+            hour = int(os.getenv('INGEST_HOUR', '6'))
+            self.scheduler.add_daily_job(ingest_recent, 'ingest_papers', hour=hour, args=[engine],
+                                         name="Daily arXiv ingestion")
+            self.scheduler.run_now(ingest_recent, 'ingest_papers_backfill', args=[engine, None, 7])
+
+        sync_dispatch_jobs(self.scheduler)
+        logger.info(f"작업 {len(self.scheduler.get_jobs())}개를 DB에서 재구성했습니다.")
+
+    def _step_down(self):
+        """임대를 잃으면 스케줄러 중지 (다른 워커가 작업을 실행)"""
+        logger.warning(f"리더 임대 상실: {self.lease.holder}")
+        self.scheduler.shutdown(wait=False)
+        self.scheduler.flush_start_records(engine)
+        self.scheduler = None
+
+    def tick(self):
+        """임대 갱신 시도 후 역할에 맞게 스케줄러 시작/중지/동기화"""
+        is_leader = self.lease.try_acquire()
+
+        if is_leader and self.scheduler is None:
+            self._become_leader()
+        elif is_leader:
+            # 웹에서 추가/삭제된 자동화 반영
+            sync_dispatch_jobs(self.scheduler)
+            self.scheduler.flush_start_records(engine)
+        elif self.scheduler is not None:
+            self._step_down()
+
+    def run(self):
+        """종료 신호를 받을 때까지 실행"""
+        # 발송 워커/단발성 발송 실행기/분산 발송 실행기는 리더 여부와 관계없이 실행
+        # METRICS_PORT / METRICS_FILE이 설정되어 있으면 지표 내보내기
+        start_exporter(self._stop)
+
+        delivery_pool = get_delivery_pool(engine, send_email)
+        instant_runner = get_instant_job_runner(engine, stream_instant_digest)
+        dispatch_runner = None
+        if is_sharded_dispatch_enabled():
+            dispatch_runner = get_dispatch_runner(engine, dispatch_work_item)
+
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"워커 오류: {e}")
+            self._stop.wait(self.sync_interval)
+
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+            self.scheduler.flush_start_records(engine)
+        # 진행 중인 발송을 마치고 모아 둔 발송 이력 저장
+        if dispatch_runner is not None:
+            dispatch_runner.stop()
+        instant_runner.stop()
+        delivery_pool.stop()
+        self.lease.release()
+        logger.info("워커가 종료되었습니다.")
+
+    def stop(self, *args):
+        """종료 요청"""
+        self._stop.set()
+
+
+def main():
+    """워커 실행"""
+    worker = SchedulerWorker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()